@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -52,6 +53,8 @@ REST_FRAMEWORK = {
         "rest_framework.filters.SearchFilter",
         "rest_framework.filters.OrderingFilter",
     ],
+    # Pagination par curseur sur (tri, id) : coût constant quelle que soit la page
+    "DEFAULT_PAGINATION_CLASS": "guge_app.pagination.KeysetPagination",
     "DEFAULT_AUTHENTICATION_CLASSES": (
         "rest_framework_simplejwt.authentication.JWTAuthentication",
         "rest_framework.authentication.SessionAuthentication",
@@ -85,8 +88,16 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Mesures par vue (requêtes SQL, temps) : inactif sauf si GUGE_PROFILING
+    'guge_app.middleware.ProfilingMiddleware',
 ]
 
+GUGE_PROFILING = os.environ.get('GUGE_PROFILING') == '1'
+# Jeton optionnel pour la collecte Prometheus sans session (en-tête Authorization: Bearer)
+GUGE_METRICS_TOKEN = os.environ.get('GUGE_METRICS_TOKEN')
+# Processus de rendu des fiches PDF en lot (rapports/pdf/ et travail fiches_pdf)
+GUGE_PDF_WORKERS = int(os.environ.get('GUGE_PDF_WORKERS', min(4, os.cpu_count() or 1)))
+
 ROOT_URLCONF = 'backend_guge.urls'
 
 TEMPLATES = [
@@ -115,6 +126,13 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Plusieurs processus écrivent en même temps (run_jobs --workers, serveur) :
+        # les transactions réservent l'écriture dès leur début et attendent le
+        # verrou au lieu d'échouer sur « database is locked » (transaction_mode : Django ≥ 5.1).
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
@@ -52,14 +52,29 @@ urlpatterns = [
         name="sync_schools_by_codes"
     ),
     path('api/me/', views.get_current_user, name='get_current_user'),
+    path('api/schools/changes/', views.school_changes, name='school_changes'),
+    path('api/schools/geo/', views.school_geo, name='school_geo'),
+    path('api/schools/nearby/', views.school_nearby, name='school_nearby'),
+    path('api/changes/', views.change_journal, name='change_journal'),
+    path('api/geo-hierarchy/', views.geo_hierarchy_api, name='geo_hierarchy'),
+    path('api/autocomplete/<str:entity>/', views.autocomplete_api, name='autocomplete'),
     path('api/schools/', views.SchoolViewSet.as_view({'get': 'list', 'post': 'create'}), name='school_api_list'),
     path('api/schools-sync/', views.SchoolSyncViewSet.as_view({'get': 'list'}), name='school_sync_api_list'),
     path('api/recoltes/', views.RecolteViewSet.as_view({'get': 'list', 'post': 'create'}), name='recolte_api_list'),
     path('api/recoltes/mine/', views.recoltes_mine, name='recoltes_mine'),
+    path('api/recoltes/bulk/', views.recolte_bulk_create, name='recolte_bulk_create'),
+    path('api/recoltes/export/', views.recolte_export, name='recolte_export'),
     path('api/recoltes/<uuid:pk>/', views.RecolteViewSet.as_view({'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'}), name='recolte_api_detail'),
+    path('api/stats/questions/<uuid:question_id>/', views.question_stats_api, name='question_stats'),
+    path('api/jobs/', views.job_create, name='job_create'),
+    path('api/jobs/<uuid:pk>/', views.job_detail, name='job_detail'),
+    path('api/jobs/<uuid:pk>/result/', views.job_result, name='job_result'),
     path('api/campaigns/', views.CampaignViewSet.as_view({'get': 'list', 'post': 'create'}), name='campaign_api_list'),
     path('api/campaigns/<uuid:pk>/', views.CampaignViewSet.as_view({'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'}), name='campaign_api_detail'),
+    path('api/campaigns/<uuid:pk>/cube/', views.campaign_cube_api, name='campaign_cube'),
     path('api/question-templates/', views.QuestionTemplateViewSet.as_view({'get': 'list'}), name='question_template_api_list'),
+    path('api/question-templates/bundle/', views.question_template_bundle, name='question_template_bundle'),
+    path('api/question-templates/<uuid:pk>/', views.QuestionTemplateViewSet.as_view({'get': 'retrieve'}), name='question_template_api_detail'),
     # TOKENS
     path("api/token/", views.MyTokenObtainPairView.as_view()),
     path("api/token/refresh/", TokenRefreshView.as_view()),
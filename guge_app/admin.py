@@ -1,8 +1,9 @@
 from django.contrib import admin
 from .models import (
     Province, Division, SubDivision, City, Territory, 
-    School, QuestionTemplate, Question, Groupe, Campaign, Recolte
+    School, QuestionTemplate, Question, Groupe, Campaign, Recolte, ChangeJournal, Job
 )
+from .search import get_search_backend
 
 @admin.register(Province)
 class ProvinceAdmin(admin.ModelAdmin):
@@ -39,6 +40,11 @@ class SchoolAdmin(admin.ModelAdmin):
     search_fields = ('name', 'adm_code')
     list_filter = ('province', 'division')
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return get_search_backend().filter(queryset, search_term), False
+
 @admin.register(QuestionTemplate)
 class QuestionTemplateAdmin(admin.ModelAdmin):
     list_display = ('name', 'type', 'created_at')
@@ -69,3 +75,15 @@ class RecolteAdmin(admin.ModelAdmin):
     list_display = ('id', 'establishment', 'date', 'collector_id', 'status')
     search_fields = ('establishment__name',)
     list_filter = ('status', 'type', 'date')
+
+@admin.register(ChangeJournal)
+class ChangeJournalAdmin(admin.ModelAdmin):
+    list_display = ('id', 'entity', 'object_id', 'action', 'created_at')
+    search_fields = ('object_id',)
+    list_filter = ('entity', 'action')
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'status', 'progress', 'worker', 'created_by', 'created_at', 'finished_at')
+    list_filter = ('status', 'kind')
+    readonly_fields = ('worker', 'started_at', 'finished_at', 'error')
@@ -0,0 +1,201 @@
+# answers.py
+"""Réponses des récoltes : table typée Answer et résolution pour l'affichage."""
+import uuid
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Answer, Question
+
+
+def answer_items(recolte):
+    """Paires (question_uuid, réponse) valides de la liste JSON d'une récolte."""
+    items = []
+    for item in recolte.answers or []:
+        if not isinstance(item, dict):
+            continue
+        try:
+            qid = uuid.UUID(str(item.get('question_uuid', item.get('question', ''))))
+        except ValueError:
+            continue
+        items.append((qid, item.get('answer', '')))
+    return items
+
+
+def typed_answer(recolte_id, question_id, kind, value):
+    """Construit les lignes Answer d'une réponse selon le type de la question."""
+    values = value if isinstance(value, list) else [value]
+    rows = []
+    for v in values:
+        if v is None or v == '':
+            continue
+        row = Answer(recolte_id=recolte_id, question_id=question_id)
+        if kind == 'number':
+            try:
+                row.numeric_value = float(str(v).replace(',', '.'))
+            except ValueError:
+                row.text_value = str(v)
+        elif kind == 'choice':
+            row.choice_value = str(v)[:255]
+        else:
+            row.text_value = str(v)
+        rows.append(row)
+    return rows
+
+
+def build_answer_rows(recoltes, question_kinds=None):
+    """Lignes Answer de plusieurs récoltes, avec une seule requête sur Question.
+
+    `question_kinds` ({question_id: kind}) peut être fourni pour éviter la
+    requête, par exemple lors d'un rattrapage en masse.
+    """
+    items_by_recolte = [(recolte, answer_items(recolte)) for recolte in recoltes]
+    if question_kinds is None:
+        ids = {qid for _, items in items_by_recolte for qid, _ in items}
+        question_kinds = dict(Question.objects.filter(pk__in=ids).values_list('id', 'kind'))
+
+    rows = []
+    for recolte, items in items_by_recolte:
+        for qid, value in items:
+            if qid in question_kinds:
+                rows.extend(typed_answer(recolte.pk, qid, question_kinds[qid], value))
+    return rows
+
+
+def sync_answers(recoltes, question_kinds=None, replace=True):
+    """Remplace les lignes Answer des récoltes données par celles de leur JSON.
+
+    `replace=False` pour des récoltes qui viennent d'être créées : aucune
+    ligne à supprimer, les nouvelles sont seulement insérées.
+    """
+    recoltes = list(recoltes)
+    if not recoltes:
+        return 0
+    rows = build_answer_rows(recoltes, question_kinds)
+    if not replace:
+        Answer.objects.bulk_create(rows, batch_size=500)
+        return len(rows)
+    with transaction.atomic():
+        Answer.objects.filter(recolte__in=[r.pk for r in recoltes]).delete()
+        Answer.objects.bulk_create(rows, batch_size=500)
+    return len(rows)
+
+
+# Résolution des réponses pour l'affichage (fiches et rapports)
+
+QuestionInfo = namedtuple('QuestionInfo', ['id', 'text', 'kind', 'options', 'groupe'])
+GroupeInfo = namedtuple('GroupeInfo', ['id', 'name', 'order'])
+
+QUESTION_MAP_CACHE_TIMEOUT = 60 * 60
+
+
+def _question_info(question):
+    groupe = question.groupe
+    return QuestionInfo(
+        id=question.id,
+        text=question.text,
+        kind=question.kind,
+        options=question.options,
+        groupe=GroupeInfo(groupe.id, groupe.name, groupe.order) if groupe else None,
+    )
+
+
+def template_question_map(template_id, version):
+    """Questions d'un questionnaire, ordonnées par groupe, en cache par version."""
+    key = f'question_map:{template_id}:{version}'
+    question_map = cache.get(key)
+    if question_map is None:
+        questions = (
+            Question.objects.filter(template_id=template_id)
+            .select_related('groupe')
+            .order_by('groupe__order', 'id')
+        )
+        question_map = {q.id: _question_info(q) for q in questions}
+        cache.set(key, question_map, QUESTION_MAP_CACHE_TIMEOUT)
+    return question_map
+
+
+def campaign_question_map(campaign):
+    """Questions de tous les questionnaires d'une campagne (une requête hors cache)."""
+    question_map = {}
+    for template_id, version in campaign.question_templates.values_list('id', 'version'):
+        question_map.update(template_question_map(template_id, version))
+    return question_map
+
+
+def recolte_question_map(recolte, items=None):
+    """Questions utiles pour afficher une récolte.
+
+    Celles de la campagne si elle existe, sinon uniquement les questions
+    référencées par les réponses, chargées avec leur groupe en une requête.
+    Les réponses à des questions hors des questionnaires de la campagne
+    (questionnaire retiré, question déplacée) sont résolues par leur id.
+    """
+    items = items if items is not None else answer_items(recolte)
+    ids = [qid for qid, _ in items]
+    if recolte.campaign_id:
+        question_map = campaign_question_map(recolte.campaign)
+        missing = [qid for qid in ids if qid not in question_map]
+        if missing:
+            question_map = {**question_map, **_questions_by_id(missing)}
+        return question_map
+    return _questions_by_id(ids)
+
+
+def _questions_by_id(ids):
+    questions = Question.objects.filter(pk__in=ids).select_related('groupe')
+    return {q.id: _question_info(q) for q in questions}
+
+
+def all_questions_map():
+    """Toutes les questions avec leur groupe, en une requête.
+
+    Sert aux traitements en lot : les récoltes sans campagne sont alors
+    résolues sans requête par récolte.
+    """
+    return {q.id: _question_info(q) for q in Question.objects.select_related('groupe')}
+
+
+def resolve_answers(recolte, question_map=None):
+    """Liste des paires {question, answer} dans l'ordre des réponses.
+
+    `question` vaut None pour une réponse dont la question n'existe plus.
+    """
+    items = answer_items(recolte)
+    if question_map is None:
+        question_map = recolte_question_map(recolte, items)
+    return [{'question': question_map.get(qid), 'question_uuid': qid, 'answer': value} for qid, value in items]
+
+
+def report_layout(question_map):
+    """Groupes de la fiche dans l'ordre d'affichage : [(groupe, nom, [questions])].
+
+    Ne dépend que des questions : un traitement en lot le calcule une fois
+    par carte de questions. Les questions sans groupe forment une dernière
+    section « Autres questions ».
+    """
+    layout = {}
+    for question in sorted(question_map.values(), key=lambda q: (q.groupe is None, q.groupe.order if q.groupe else 0)):
+        key = question.groupe.id if question.groupe else None
+        if key not in layout:
+            layout[key] = (question.groupe, question.groupe.name if question.groupe else 'Autres questions', [])
+        layout[key][2].append(question)
+    return list(layout.values())
+
+
+def report_sections(question_map, items, layout=None):
+    """Sections de la fiche : une par groupe, questions jointes à leur réponse.
+
+    Les réponses sont indexées par question_uuid, la construction est donc
+    linéaire en nombre de questions.
+    """
+    answers_by_question = dict(items)
+    sections = []
+    for groupe, name, questions in layout if layout is not None else report_layout(question_map):
+        qa = []
+        for question in questions:
+            answer = answers_by_question.get(question.id)
+            qa.append({'question': question, 'answer': answer, 'answered': answer not in (None, '', [])})
+        sections.append({'groupe': groupe, 'name': name, 'qa': qa})
+    return sections
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class GugeAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'guge_app'
+
+    def ready(self):
+        from . import signals  # noqa: F401
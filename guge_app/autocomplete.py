@@ -0,0 +1,144 @@
+# autocomplete.py
+"""Saisie semi-automatique des écoles et des entités administratives.
+
+Chaque entité est indexée en mémoire dans un arbre de préfixes (trie) des
+mots de son nom et de son code, sans accents. L'arbre est construit à la
+première requête puis reconstruit quand la version de l'entité change : les
+signaux (voir signals.py) incrémentent cette version en base (versions.py),
+chaque processus voit donc les modifications faites par les autres.
+"""
+import threading
+from collections import namedtuple
+
+from .models import Province, Division, SubDivision, City, Territory, School
+from .search import search_terms
+from .versions import bump_versions, current_version
+
+Entry = namedtuple('Entry', 'id label code parent')
+EntityConfig = namedtuple('EntityConfig', 'model parent_field')
+
+ENTITIES = {
+    'province': EntityConfig(Province, None),
+    'division': EntityConfig(Division, 'province_id'),
+    'sub_division': EntityConfig(SubDivision, 'division_id'),
+    'city': EntityConfig(City, 'province_id'),
+    'territory': EntityConfig(Territory, 'province_id'),
+    'school': EntityConfig(School, 'sub_division_id'),
+}
+MODEL_ENTITIES = {config.model: name for name, config in ENTITIES.items()}
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 200
+# Au-delà de cette profondeur, les mots sont rangés dans le même nœud et
+# départagés par startswith : la taille de l'arbre reste bornée
+TRIE_DEPTH = 6
+
+_CHILDREN, _ENTRIES = 0, 1
+
+
+class PrefixTrie:
+    def __init__(self, entries):
+        self.entries = sorted(entries, key=lambda e: (e.label or '').lower())
+        self.words = []
+        self.by_parent = {}
+        self.root = [{}, []]
+        for index, entry in enumerate(self.entries):
+            words = tuple(sorted(set(search_terms(entry.label)) | set(search_terms(entry.code))))
+            self.words.append(words)
+            self.by_parent.setdefault(entry.parent, []).append(index)
+            for word in words:
+                self._insert(word, index)
+        self._sort(self.root)
+
+    def _insert(self, word, index):
+        node = self.root
+        for char in word[:TRIE_DEPTH]:
+            node = node[_CHILDREN].setdefault(char, [{}, []])
+        node[_ENTRIES].append((word, index))
+
+    def _sort(self, root):
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            node[_ENTRIES].sort()
+            stack.extend(node[_CHILDREN].values())
+
+    def _iter_indexes(self, term):
+        """Indices des entrées ayant un mot qui commence par `term`, mots les plus courts d'abord."""
+        node = self.root
+        for char in term[:TRIE_DEPTH]:
+            node = node[_CHILDREN].get(char)
+            if node is None:
+                return
+        seen, stack = set(), [node]
+        while stack:
+            node = stack.pop()
+            for word, index in node[_ENTRIES]:
+                if index not in seen and word.startswith(term):
+                    seen.add(index)
+                    yield index
+            stack.extend(node[_CHILDREN][char] for char in sorted(node[_CHILDREN], reverse=True))
+
+    def _matches(self, index, terms):
+        return all(any(word.startswith(term) for word in self.words[index]) for term in terms)
+
+    def search(self, query, parent=None, limit=DEFAULT_LIMIT):
+        terms = search_terms(query)
+        if parent is not None:
+            # Peu d'entrées par parent : un parcours direct suffit
+            indexes = (i for i in self.by_parent.get(parent, ()) if self._matches(i, terms))
+        elif terms:
+            # Le mot le plus long est le plus sélectif ; les autres sont vérifiés sur chaque candidat
+            terms.sort(key=len, reverse=True)
+            indexes = (i for i in self._iter_indexes(terms[0]) if self._matches(i, terms[1:]))
+        else:
+            indexes = range(len(self.entries))
+
+        results = []
+        for index in indexes:
+            results.append(self.entries[index])
+            if len(results) >= limit:
+                break
+        return results
+
+
+_tries = {}
+_lock = threading.Lock()
+
+
+def _version_name(entity):
+    return f'autocomplete:{entity}'
+
+
+def invalidate_autocomplete(entity):
+    bump_versions(_version_name(entity))
+
+
+def _load_entries(entity):
+    config = ENTITIES[entity]
+    fields = ['id', 'name', 'adm_code' if config.model is School else 'code']
+    if config.parent_field:
+        fields.append(config.parent_field)
+    return [
+        Entry(row[0], row[1], row[2], row[3] if config.parent_field else None)
+        for row in config.model.objects.values_list(*fields).iterator()
+    ]
+
+
+def get_trie(entity):
+    version = current_version(_version_name(entity))
+    current = _tries.get(entity)
+    if current and current[0] == version:
+        return current[1]
+    with _lock:
+        current = _tries.get(entity)
+        if current and current[0] == version:
+            return current[1]
+        trie = PrefixTrie(_load_entries(entity))
+        _tries[entity] = (version, trie)
+        return trie
+
+
+def autocomplete(entity, query='', parent=None, limit=DEFAULT_LIMIT):
+    limit = max(1, min(int(limit), MAX_LIMIT))
+    return get_trie(entity).search(query, parent=parent, limit=limit)
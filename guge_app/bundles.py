@@ -0,0 +1,90 @@
+# bundles.py
+"""Paquet des questionnaires pour les applications mobiles.
+
+Le paquet (tous les questionnaires avec leurs questions et groupes) est
+identifié par une empreinte des versions des questionnaires : toute
+modification d'une question ou d'un groupe incrémente la version du
+questionnaire (voir signals.py) et change donc l'empreinte, qui inclut aussi
+le nombre et la dernière modification des questions de chaque questionnaire.
+Chaque version du paquet est sérialisée une seule fois puis conservée
+compressée sur disque.
+"""
+import gzip
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Count, Max
+from rest_framework.renderers import JSONRenderer
+
+from .models import ChangeJournal, QuestionTemplate
+from .serializers import QuestionTemplateSerializer
+
+BUNDLE_DIR = Path(settings.MEDIA_ROOT) / 'bundles'
+
+
+def bundle_templates(template_type=None):
+    queryset = QuestionTemplate.objects.order_by('id')
+    if template_type:
+        queryset = queryset.filter(type=template_type)
+    return queryset
+
+
+def bundle_version(template_type=None):
+    """(etag, last_modified) du paquet, calculés sans charger les questions.
+
+    La date tient compte des questionnaires supprimés (journal des
+    changements) : un client qui n'envoie que If-Modified-Since reçoit le
+    paquet sans le questionnaire disparu.
+    """
+    templates = bundle_templates(template_type).annotate(
+        nb_questions=Count('questions'), questions_updated=Max('questions__updated_at'),
+    )
+    digest = hashlib.sha256((template_type or '*').encode())
+    dates = []
+    for pk, version, updated_at, nb_questions, questions_updated in templates.values_list(
+        'id', 'version', 'updated_at', 'nb_questions', 'questions_updated'
+    ):
+        digest.update(f"{pk}:{version}:{updated_at.isoformat()}:{nb_questions}:{questions_updated};".encode())
+        dates.extend(date for date in (updated_at, questions_updated) if date)
+    deleted = ChangeJournal.objects.filter(entity='question_template', action='delete').aggregate(
+        last=Max('created_at')
+    )['last']
+    if deleted:
+        dates.append(deleted)
+    return digest.hexdigest()[:32], max(dates, default=None)
+
+
+def _bundle_path(etag, template_type=None):
+    return BUNDLE_DIR / f"questionnaires-{template_type or 'all'}-{etag}.json.gz"
+
+
+def build_bundle(template_type=None):
+    templates = bundle_templates(template_type).prefetch_related('questions__groupe')
+    return JSONRenderer().render(QuestionTemplateSerializer(templates, many=True).data)
+
+
+def bundle_content(etag, template_type=None):
+    """Paquet compressé de cette version (octets), construit s'il n'existe pas."""
+    path = _bundle_path(etag, template_type)
+    try:
+        return path.read_bytes()
+    except FileNotFoundError:
+        # Absent, ou supprimé entre-temps par un processus qui a publié une version plus récente
+        pass
+
+    BUNDLE_DIR.mkdir(parents=True, exist_ok=True)
+    content = gzip.compress(build_bundle(template_type), compresslevel=9)
+    # Écriture atomique : un autre processus ne lit jamais un fichier partiel
+    fd, tmp_path = tempfile.mkstemp(dir=BUNDLE_DIR, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as tmp:
+        tmp.write(content)
+    os.replace(tmp_path, path)
+
+    # Les versions précédentes du même paquet ne servent plus
+    for old in BUNDLE_DIR.glob(f"questionnaires-{template_type or 'all'}-*.json.gz"):
+        if old != path:
+            old.unlink(missing_ok=True)
+    return content
@@ -0,0 +1,210 @@
+# cube.py
+"""Cube d'indicateurs des campagnes : agrégats pré-calculés des récoltes validées.
+
+Une campagne est découpée en cellules province x division x régime de gestion
+x milieu x niveau (table CubeCell), avec des mesures additives par question
+nombre. Les vues cumulées (moins de dimensions) ou détaillées (plus de
+dimensions, filtres) se calculent en sommant les cellules, sans relire les
+réponses. build_campaign_cube reconstruit une campagne (commande build_cube) ;
+refresh_cube_cells ne recalcule que les cellules touchées par des récoltes.
+Les deux verrouillent la ligne CampaignStats de la campagne : les recalculs
+concurrents d'une même campagne sont sérialisés.
+"""
+import operator
+from functools import reduce
+
+from django.db import transaction
+from django.db.models import Count, Max, Min, Q, Sum
+from django.utils import timezone
+
+from .models import Answer, CampaignStats, CubeCell, Division, Province, Recolte, School
+from .stats import campaign_stats
+
+# dimension: (champ de CubeCell, chemin depuis Recolte, libellés : modèle ou choix)
+CUBE_DIMENSIONS = {
+    'province': ('province_id', 'establishment__province_id', Province),
+    'division': ('division_id', 'establishment__division_id', Division),
+    'management_regime': ('management_regime', 'establishment__management_regime', dict(School.MANAGEMENT_CHOICES)),
+    'environment': ('environment', 'establishment__environment', dict(School.ENVIRONMENT_CHOICES)),
+    'level': ('level', 'type', dict(Recolte.TYPE_CHOICES)),
+}
+CELL_FIELDS = [field for field, _, _ in CUBE_DIMENSIONS.values()]
+RECOLTE_PATHS = [path for _, path, _ in CUBE_DIMENSIONS.values()]
+# Coordonnées combinées par requête lors d'un recalcul partiel
+REFRESH_CHUNK_SIZE = 100
+
+
+def _coordinates_q(coordinates, paths):
+    return reduce(operator.or_, (Q(**dict(zip(paths, coordinate))) for coordinate in coordinates))
+
+
+def _aggregate_cells(campaign_id, coordinates=None):
+    """Cellules calculées depuis les récoltes validées (toutes, ou celles des coordonnées données)."""
+    recoltes = Recolte.objects.filter(campaign_id=campaign_id, status='valide')
+    answers = Answer.objects.filter(
+        recolte__campaign_id=campaign_id, recolte__status='valide', numeric_value__isnull=False,
+    )
+    answer_paths = [f'recolte__{path}' for path in RECOLTE_PATHS]
+    if coordinates is not None:
+        recoltes = recoltes.filter(_coordinates_q(coordinates, RECOLTE_PATHS))
+        answers = answers.filter(_coordinates_q(coordinates, answer_paths))
+
+    # Cellules sans question : nombre de récoltes validées
+    cells = [
+        CubeCell(campaign_id=campaign_id, count=count, **dict(zip(CELL_FIELDS, key)))
+        for *key, count in recoltes.values_list(*RECOLTE_PATHS).annotate(n=Count('id')).order_by()
+    ]
+    rows = answers.values_list('question_id', *answer_paths).annotate(
+        n=Count('id'), total=Sum('numeric_value'), minimum=Min('numeric_value'), maximum=Max('numeric_value'),
+    ).order_by()
+    for question_id, *key, count, total, minimum, maximum in rows:
+        cells.append(CubeCell(
+            campaign_id=campaign_id, question_id=question_id, count=count,
+            total=total, minimum=minimum, maximum=maximum, **dict(zip(CELL_FIELDS, key)),
+        ))
+    return cells
+
+
+def build_campaign_cube(campaign):
+    """Reconstruit entièrement le cube d'une campagne ; retourne le nombre de cellules."""
+    stats = campaign_stats(campaign)
+    with transaction.atomic():
+        CampaignStats.objects.select_for_update().filter(pk=stats.pk).first()
+        cells = _aggregate_cells(campaign.pk)
+        CubeCell.objects.filter(campaign=campaign).delete()
+        CubeCell.objects.bulk_create(cells, batch_size=1000)
+        CampaignStats.objects.filter(pk=stats.pk).update(cube_built_at=timezone.now())
+    return len(cells)
+
+
+def cube_built(campaign_id):
+    return CampaignStats.objects.filter(campaign_id=campaign_id, cube_built_at__isnull=False).exists()
+
+
+def school_coordinates(establishment_ids):
+    """{id d'école: (province, division, régime, milieu)} : partie école des coordonnées."""
+    return {
+        pk: tuple(rest)
+        for pk, *rest in School.objects.filter(pk__in=establishment_ids)
+        .values_list('pk', 'province_id', 'division_id', 'management_regime', 'environment')
+    }
+
+
+def refresh_cube_cells(keys):
+    """Recalcule les cellules des récoltes décrites par `keys` (voir recolte_stats_key).
+
+    Seules les campagnes dont le cube est construit sont mises à jour ; les
+    autres le seront par leur prochaine construction complète.
+    """
+    keys = [key for key in keys if key and key['campaign_id']]
+    if not keys:
+        return
+    built = set(CampaignStats.objects.filter(
+        campaign_id__in={key['campaign_id'] for key in keys}, cube_built_at__isnull=False,
+    ).values_list('campaign_id', flat=True))
+    keys = [key for key in keys if key['campaign_id'] in built]
+    if not keys:
+        return
+    schools = school_coordinates({key['establishment_id'] for key in keys})
+    by_campaign = {}
+    for key in keys:
+        if key['establishment_id'] in schools:
+            by_campaign.setdefault(key['campaign_id'], set()).add((*schools[key['establishment_id']], key['type']))
+    for campaign_id, coordinates in by_campaign.items():
+        refresh_campaign_coordinates(campaign_id, coordinates)
+
+
+def refresh_campaign_coordinates(campaign_id, coordinates):
+    """Remplace les cellules d'une campagne aux coordonnées (province, division, régime, milieu, niveau) données."""
+    coordinates = sorted(coordinates, key=str)
+    with transaction.atomic():
+        stats = CampaignStats.objects.select_for_update().filter(
+            campaign_id=campaign_id, cube_built_at__isnull=False,
+        ).first()
+        if stats is None:
+            return
+        for start in range(0, len(coordinates), REFRESH_CHUNK_SIZE):
+            chunk = coordinates[start:start + REFRESH_CHUNK_SIZE]
+            cells = _aggregate_cells(campaign_id, chunk)
+            CubeCell.objects.filter(campaign_id=campaign_id).filter(_coordinates_q(chunk, CELL_FIELDS)).delete()
+            CubeCell.objects.bulk_create(cells, batch_size=1000)
+
+
+def _dimension_labels(dimension, keys):
+    labels = CUBE_DIMENSIONS[dimension][2]
+    if isinstance(labels, dict):
+        return {key: labels.get(key, key) for key in keys}
+    return dict(labels.objects.filter(pk__in=keys).values_list('id', 'name'))
+
+
+def _measures(row, numeric):
+    measures = {'count': row['n'] or 0}
+    if numeric:
+        measures.update({
+            'sum': row['sum'],
+            'mean': round(row['sum'] / row['n'], 4) if row['n'] else None,
+            'min': row['min'],
+            'max': row['max'],
+        })
+    return measures
+
+
+def query_cube(campaign, question=None, group_by=(), filters=None):
+    """Indicateurs d'une campagne ventilés par `group_by`, lus dans le cube.
+
+    Sans question : nombre de récoltes validées ; avec une question nombre :
+    count, sum, mean, min et max de ses réponses. `filters` restreint chaque
+    dimension à une liste de valeurs ({dimension: [valeurs]}).
+    """
+    cells = CubeCell.objects.filter(campaign=campaign, question=question)
+    for dimension, values in (filters or {}).items():
+        cells = cells.filter(**{f'{CUBE_DIMENSIONS[dimension][0]}__in': values})
+    # Cumul : sommes des nombres et des totaux, extrêmes des extrêmes
+    aggregates = {'n': Sum('count')}
+    if question is not None:
+        aggregates.update(sum=Sum('total'), min=Min('minimum'), max=Max('maximum'))
+
+    totals = cells.aggregate(**aggregates)
+    result = {
+        'campaign': str(campaign.pk),
+        'question': str(question.pk) if question else None,
+        'group_by': list(group_by),
+        'total': _measures(totals, question is not None),
+    }
+    if group_by:
+        fields = [CUBE_DIMENSIONS[dimension][0] for dimension in group_by]
+        rows = list(cells.values(*fields).annotate(**aggregates).order_by(*fields))
+        labels = {
+            dimension: _dimension_labels(dimension, {row[field] for row in rows})
+            for dimension, field in zip(group_by, fields)
+        }
+        result['cells'] = [
+            {
+                **{
+                    dimension: {'key': row[field], 'label': labels[dimension].get(row[field], row[field])}
+                    for dimension, field in zip(group_by, fields)
+                },
+                **_measures(row, question is not None),
+            }
+            for row in rows
+        ]
+    return result
+
+
+def refresh_school_cells(school, previous):
+    """Les récoltes validées d'une école changent de cellule quand ses dimensions changent.
+
+    `previous` : coordonnées de l'école avant modification (school_coordinates).
+    """
+    current = (school.province_id, school.division_id, school.management_regime, school.environment)
+    if previous is None or previous == current:
+        return
+    by_campaign = {}
+    pairs = (
+        Recolte.objects.filter(establishment=school, status='valide', campaign__isnull=False)
+        .values_list('campaign_id', 'type').distinct().order_by()
+    )
+    for campaign_id, level in pairs:
+        by_campaign.setdefault(campaign_id, set()).update({(*previous, level), (*current, level)})
+    for campaign_id, coordinates in by_campaign.items():
+        refresh_campaign_coordinates(campaign_id, coordinates)
@@ -0,0 +1,276 @@
+# export.py
+"""Export tabulaire des récoltes validées, une colonne par question.
+
+Les lignes sont produites par des générateurs à partir d'un
+QuerySet.iterator() : la mémoire reste constante quel que soit le nombre de
+récoltes, et la réponse HTTP commence dès la première ligne.
+"""
+import csv
+import json
+import re
+import uuid
+import zipfile
+from collections import namedtuple
+from xml.sax.saxutils import escape
+
+from .models import Campaign, Question, Recolte
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'jsonl': ('application/x-ndjson; charset=utf-8', 'jsonl'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+}
+CHUNK_SIZE = 2000
+
+Column = namedtuple('Column', ['label', 'kind', 'value'])
+
+
+def _name(obj):
+    return obj.name if obj is not None else ''
+
+
+BASE_COLUMNS = [
+    Column('id', 'text', lambda r: str(r.pk)),
+    Column('date', 'text', lambda r: r.date.isoformat()),
+    Column('type', 'text', lambda r: r.type),
+    Column('campagne', 'text', lambda r: _name(r.campaign)),
+    Column('collecteur', 'text', lambda r: r.collector_id.get_username() if r.collector_id else ''),
+    Column('code_adm', 'text', lambda r: r.establishment.adm_code),
+    Column('ecole', 'text', lambda r: r.establishment.name),
+    Column('province', 'text', lambda r: _name(r.establishment.province)),
+    Column('division', 'text', lambda r: _name(r.establishment.division)),
+    Column('sous_division', 'text', lambda r: _name(r.establishment.sub_division)),
+    Column('ville', 'text', lambda r: _name(r.establishment.city)),
+    Column('territoire', 'text', lambda r: _name(r.establishment.territory)),
+    Column('milieu', 'text', lambda r: r.establishment.environment),
+    Column('regime_gestion', 'text', lambda r: r.establishment.management_regime),
+]
+
+
+def parse_export_params(params):
+    """(format, campagne, type) validés depuis les paramètres de la requête ou d'un Job.
+
+    Lève ValueError avec un message destiné à l'utilisateur.
+    """
+    export_format = params.get('format') or 'csv'
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Format inconnu : {export_format}.")
+    recolte_type = params.get('type') or None
+    if recolte_type and recolte_type not in dict(Recolte.TYPE_CHOICES):
+        raise ValueError(f"Type inconnu : {recolte_type}.")
+    campaign = None
+    if params.get('campaign'):
+        try:
+            campaign = Campaign.objects.get(pk=uuid.UUID(str(params['campaign'])))
+        except (ValueError, Campaign.DoesNotExist):
+            raise ValueError("Campagne introuvable.")
+    return export_format, campaign, recolte_type
+
+
+def export_filename(export_format, campaign=None, recolte_type=None):
+    name = '-'.join(filter(None, ['recoltes', str(campaign.pk) if campaign else None, recolte_type]))
+    return f"{name}.{EXPORT_FORMATS[export_format][1]}"
+
+
+def export_queryset(campaign=None, recolte_type=None):
+    queryset = Recolte.objects.filter(status='valide').select_related(
+        'campaign', 'collector_id',
+        'establishment__province', 'establishment__division', 'establishment__sub_division',
+        'establishment__city', 'establishment__territory',
+    )
+    if campaign is not None:
+        queryset = queryset.filter(campaign=campaign)
+    if recolte_type:
+        queryset = queryset.filter(type=recolte_type)
+    # Même ordre que l'index (status, -date, -id)
+    return queryset.order_by('-date', '-id')
+
+
+def export_questions(campaign=None, recolte_type=None):
+    """Questions exportées en colonnes, lues une seule fois pour tout l'export."""
+    questions = Question.objects.select_related('template', 'groupe')
+    if campaign is not None:
+        questions = questions.filter(template__campaigns=campaign)
+    if recolte_type:
+        questions = questions.filter(template__type=recolte_type)
+    return list(questions.order_by('template__type', 'template__name', 'groupe__order', 'created_at', 'id'))
+
+
+def export_columns(questions):
+    columns = list(BASE_COLUMNS)
+    seen = {}
+    for question in questions:
+        label = question.text.strip()
+        seen[label] = seen.get(label, 0) + 1
+        if seen[label] > 1:
+            label = f"{label} ({seen[label]})"
+        columns.append(Column(label, question.kind, question.id))
+    return columns
+
+
+def _answer_value(value):
+    if isinstance(value, list):
+        return '; '.join(str(v) for v in value)
+    return '' if value is None else str(value)
+
+
+# Premiers caractères qui font d'une cellule une formule dans Excel ou LibreOffice
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def neutralize_formula(value):
+    """Préfixe d'une apostrophe le texte qu'un tableur exécuterait comme formule ; les nombres sont conservés.
+
+    Utile pour le CSV seulement : les cellules XLSX sont des chaînes en ligne,
+    jamais évaluées, qui doivent garder la valeur saisie.
+    """
+    if value and value[0] in FORMULA_PREFIXES:
+        try:
+            float(value)
+        except ValueError:
+            return "'" + value
+    return value
+
+
+def _answer_position(positions, raw_id):
+    """Colonne d'une réponse ; l'uuid n'est normalisé que s'il n'est pas déjà canonique."""
+    position = positions.get(raw_id)
+    if position is None and raw_id:
+        try:
+            position = positions.get(str(uuid.UUID(str(raw_id))))
+        except ValueError:
+            pass
+    return position
+
+
+def export_rows(queryset, columns):
+    """Une liste de valeurs (chaînes) par récolte, dans l'ordre des colonnes.
+
+    Les colonnes de l'école précèdent celles des questions ; chaque ligne est
+    remplie en parcourant les réponses de la récolte, indexées par uuid.
+    """
+    base = [column.value for column in columns if callable(column.value)]
+    positions = {str(column.value): i for i, column in enumerate(columns) if not callable(column.value)}
+    blank = [''] * len(positions)
+    for recolte in queryset.iterator(chunk_size=CHUNK_SIZE):
+        row = [value(recolte) for value in base] + blank
+        for item in recolte.answers or []:
+            if isinstance(item, dict):
+                position = _answer_position(positions, item.get('question_uuid', item.get('question')))
+                if position is not None:
+                    row[position] = _answer_value(item.get('answer'))
+        yield row
+
+
+class _Echo:
+    """Pseudo-fichier : write() retourne la valeur au lieu de la stocker."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(columns, rows):
+    writer = csv.writer(_Echo())
+    # BOM : Excel reconnaît alors l'UTF-8 (accents des noms d'écoles)
+    # En-têtes (texte des questions) compris : Excel évalue toute cellule d'un CSV
+    yield '\ufeff' + writer.writerow([neutralize_formula(c.label) for c in columns])
+    for row in rows:
+        yield writer.writerow([neutralize_formula(value) for value in row])
+
+
+def stream_jsonl(columns, rows):
+    labels = [c.label for c in columns]
+    for row in rows:
+        yield json.dumps(dict(zip(labels, row)), ensure_ascii=False) + '\n'
+
+
+# XLSX minimal (chaînes en ligne, sans styles) écrit au fil de l'eau dans un zip
+
+_XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Recoltes" sheetId="1" r:id="rId1"/></sheets></workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+_XML_ILLEGAL = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+_NUMBER = re.compile(r'^-?\d+(\.\d+)?$')
+
+
+class ZipSink:
+    """Destination non positionnable de zipfile : les octets écrits sont récupérés par drain()."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _xlsx_cell(value, kind):
+    if kind == 'number' and _NUMBER.match(value):
+        return f'<c><v>{value}</v></c>'
+    if not value:
+        return '<c/>'
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{escape(_XML_ILLEGAL.sub("", value))}</t></is></c>'
+
+
+def stream_xlsx(columns, rows):
+    sink = ZipSink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in _XLSX_PARTS.items():
+            archive.writestr(name, content)
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            sheet.write(('<row>' + ''.join(_xlsx_cell(c.label, 'text') for c in columns) + '</row>').encode())
+            for row in rows:
+                cells = ''.join(_xlsx_cell(value, column.kind) for value, column in zip(row, columns))
+                sheet.write(f'<row>{cells}</row>'.encode())
+                data = sink.drain()
+                if data:
+                    yield data
+            sheet.write(b'</sheetData></worksheet>')
+    yield sink.drain()
+
+
+STREAMERS = {'csv': stream_csv, 'jsonl': stream_jsonl, 'xlsx': stream_xlsx}
+
+
+def stream_export(export_format, campaign=None, recolte_type=None):
+    columns = export_columns(export_questions(campaign, recolte_type))
+    rows = export_rows(export_queryset(campaign, recolte_type), columns)
+    return STREAMERS[export_format](columns, rows)
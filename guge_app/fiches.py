@@ -0,0 +1,203 @@
+# fiches.py
+"""Génération en lot des fiches SIGE (contenu de model.html) au format PDF.
+
+Les récoltes sont lues par lots et chaque fiche est réduite à des données à
+plat (libellés et valeurs) à partir d'une carte des questions partagée : une
+par campagne, plus une carte complète pour les récoltes hors campagne. Le
+rendu PDF, sans accès à la base, est réparti sur un pool de processus ; les
+fichiers sont assemblés dans une archive ZIP produite au fil de l'eau.
+"""
+import multiprocessing
+import time
+import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque, namedtuple
+from itertools import islice
+
+import django
+from django.utils.text import slugify
+
+from .answers import all_questions_map, answer_items, campaign_question_map, report_layout, report_sections
+from .export import ZipSink
+from .models import Campaign, Division, Recolte
+from .pdf import PDFWriter
+
+# Fiches rendues par tâche du pool (amortit le coût d'échange entre processus)
+FICHE_BATCH_SIZE = 20
+
+Fiche = namedtuple('Fiche', ['filename', 'title', 'subtitle', 'identification', 'coordinates', 'sections', 'date'])
+
+
+def parse_fiche_filters(params):
+    """(campagne, division) depuis les paramètres campaign (uuid) et division (id).
+
+    Lève ValueError avec un message destiné à l'utilisateur.
+    """
+    campaign = division = None
+    if params.get('campaign'):
+        try:
+            campaign = Campaign.objects.get(pk=uuid.UUID(str(params['campaign'])))
+        except (ValueError, Campaign.DoesNotExist):
+            raise ValueError("Campagne introuvable.")
+    if params.get('division'):
+        try:
+            division = Division.objects.get(pk=int(params['division']))
+        except (ValueError, Division.DoesNotExist):
+            raise ValueError("Division introuvable.")
+    return campaign, division
+
+
+def fiches_filename(campaign=None, division=None):
+    parts = ['fiches'] + [slugify(str(unit)) for unit in (campaign, division) if unit is not None]
+    return '-'.join(parts) + '.zip'
+
+
+def fiche_queryset(campaign=None, division=None):
+    queryset = Recolte.objects.filter(status='valide').select_related(
+        'campaign',
+        'establishment__province', 'establishment__division', 'establishment__city', 'establishment__territory',
+    )
+    if campaign is not None:
+        queryset = queryset.filter(campaign=campaign)
+    if division is not None:
+        queryset = queryset.filter(establishment__division=division)
+    return queryset.order_by('establishment__province__name', 'establishment__division__name', 'establishment__name', 'id')
+
+
+def _display(value):
+    if isinstance(value, list):
+        return ', '.join(str(v) for v in value)
+    return '' if value is None else str(value)
+
+
+def build_fiche(recolte, question_map, items, layout=None):
+    """Données à plat de la fiche d'une récolte, dans l'ordre de model.html."""
+    school = recolte.establishment
+    coord = school.geo_coord if isinstance(school.geo_coord, dict) else {}
+    sections = [
+        (section['name'], [
+            (qa['question'].text, _display(qa['answer']) if qa['answered'] else 'Non répondu')
+            for qa in section['qa']
+        ])
+        for section in report_sections(question_map, items, layout)
+    ]
+    folder = '/'.join(slugify(str(unit or '')) or 'sans-unite' for unit in (school.province, school.division))
+    return Fiche(
+        filename=f"{folder}/{slugify(school.adm_code) or school.pk}-{str(recolte.pk)[:8]}.pdf",
+        title=f"FICHE SIGE - ENSEIGNEMENT {recolte.type.upper()}",
+        subtitle=f"Campagne : {recolte.campaign.name}" if recolte.campaign_id else '',
+        identification=[
+            ("Nom", school.name),
+            ("Adresse", school.address),
+            ("Chef d’établissement", school.head_name),
+            ("Téléphone", school.head_phone),
+            ("Province", _display(school.province)),
+            ("Ville", _display(school.city)),
+            ("Territoire", _display(school.territory)),
+            ("Milieu", school.environment),
+        ],
+        coordinates=f"Lat {_display(coord.get('latitude'))} | Long {_display(coord.get('longitude'))} | Alt 0",
+        sections=sections,
+        date=recolte.date.strftime('%d/%m/%Y %H:%M'),
+    )
+
+
+def iter_fiches(queryset):
+    """Fiches des récoltes du queryset, sans requête par fiche."""
+    campaign_maps = {}
+    all_questions = None
+    for recolte in queryset.iterator(chunk_size=500):
+        items = answer_items(recolte)
+        if recolte.campaign_id:
+            if recolte.campaign_id not in campaign_maps:
+                question_map = campaign_question_map(recolte.campaign)
+                campaign_maps[recolte.campaign_id] = (question_map, report_layout(question_map))
+            question_map, layout = campaign_maps[recolte.campaign_id]
+            missing = [qid for qid, _ in items if qid not in question_map]
+            if missing:
+                # Réponses hors des questionnaires de la campagne : résolues par id
+                if all_questions is None:
+                    all_questions = all_questions_map()
+                question_map = {**question_map, **{qid: all_questions[qid] for qid in missing if qid in all_questions}}
+                layout = None
+        else:
+            if all_questions is None:
+                all_questions = all_questions_map()
+            question_map = {qid: all_questions[qid] for qid, _ in items if qid in all_questions}
+            layout = None
+        yield build_fiche(recolte, question_map, items, layout)
+
+
+def render_fiche_pdf(fiche):
+    pdf = PDFWriter(title=fiche.title)
+    pdf.text(fiche.title, size=14, bold=True)
+    if fiche.subtitle:
+        pdf.text(fiche.subtitle, size=10, space_before=2)
+    pdf.text("1. Identification de l'Établissement", size=12, bold=True, space_before=12)
+    for label, value in fiche.identification:
+        pdf.field(label, value)
+    pdf.rule()
+    pdf.field("Coordonnées", fiche.coordinates)
+    for name, questions in fiche.sections:
+        pdf.text(name, size=12, bold=True, space_before=12)
+        for text, answer in questions:
+            pdf.field(text, answer)
+    pdf.rule(space=10)
+    pdf.field("Date", fiche.date)
+    return pdf.render()
+
+
+def render_batch(fiches):
+    """(nom de fichier, PDF) d'un lot de fiches ; exécuté dans un processus du pool."""
+    return [(fiche.filename, render_fiche_pdf(fiche)) for fiche in fiches]
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def render_fiches(fiches, workers=1):
+    """(nom, PDF) de chaque fiche, dans l'ordre, rendues par lots.
+
+    Avec plusieurs workers, au plus deux lots par processus sont en attente :
+    la lecture des récoltes avance au rythme du rendu.
+    """
+    if workers <= 1:
+        for batch in _batches(fiches, FICHE_BATCH_SIZE):
+            yield from render_batch(batch)
+        return
+
+    # forkserver : l'appelant peut avoir des threads (battement de cœur des travaux,
+    # serveur web) qu'un fork copierait dans un état incohérent. Les processus
+    # chargent Django pour désérialiser les fiches, sans utiliser la base.
+    context = multiprocessing.get_context('forkserver')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=django.setup) as pool:
+        pending = deque()
+        for batch in _batches(fiches, FICHE_BATCH_SIZE):
+            pending.append(pool.submit(render_batch, batch))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def stream_zip(named_files, stats=None):
+    """Archive ZIP produite au fil de l'eau (les PDF sont déjà compressés : stockés tels quels).
+
+    `stats`, s'il est fourni, reçoit le nombre de fiches et le débit (fiches/s).
+    """
+    start = time.perf_counter()
+    count = 0
+    sink = ZipSink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for name, data in named_files:
+            archive.writestr(name, data)
+            count += 1
+            yield sink.drain()
+    yield sink.drain()
+    if stats is not None:
+        elapsed = time.perf_counter() - start
+        stats.update(count=count, seconds=elapsed, per_second=count / elapsed if elapsed else 0.0)
@@ -0,0 +1,168 @@
+# geo.py
+"""Outils géographiques : coordonnées des écoles, geohash, carte et recherche de proximité."""
+import heapq
+import math
+
+from django.db.models import Avg, Count, Min
+from django.db.models.functions import Substr
+
+GEOHASH_PRECISION = 9
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# Longueur de geohash utilisée pour regrouper les écoles selon le zoom de la carte
+ZOOM_PRECISION = [
+    (2, 1), (4, 2), (6, 3), (9, 4), (12, 5), (14, 6),
+]
+MAX_POINTS = 2000
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.32
+
+
+def coords_from_geo_coord(geo_coord):
+    """(latitude, longitude) d'un champ geo_coord, ou (None, None) s'il est invalide."""
+    if not isinstance(geo_coord, dict):
+        return None, None
+    try:
+        lat = float(geo_coord.get('latitude'))
+        lon = float(geo_coord.get('longitude'))
+    except (TypeError, ValueError):
+        return None, None
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None, None
+    return lat, lon
+
+
+def geohash_encode(lat, lon, precision=GEOHASH_PRECISION):
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, bit_count, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, value = (lon_range, lon) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            rng[0] = mid
+        else:
+            bits <<= 1
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits, bit_count = 0, 0
+    return ''.join(chars)
+
+
+def sync_school_coordinates(school):
+    """Recopie geo_coord dans les colonnes indexées latitude, longitude et geohash."""
+    lat, lon = coords_from_geo_coord(school.geo_coord)
+    school.latitude, school.longitude = lat, lon
+    school.geohash = geohash_encode(lat, lon) if lat is not None else None
+
+
+def parse_bbox(value):
+    """bbox au format Leaflet « ouest,sud,est,nord »."""
+    west, south, east, north = (float(v) for v in value.split(','))
+    if west > east or south > north:
+        raise ValueError(value)
+    return west, south, east, north
+
+
+def precision_for_zoom(zoom):
+    for max_zoom, precision in ZOOM_PRECISION:
+        if zoom <= max_zoom:
+            return precision
+    return None
+
+
+def within_bbox(queryset, bbox):
+    west, south, east, north = bbox
+    return queryset.filter(
+        latitude__gte=south, latitude__lte=north,
+        longitude__gte=west, longitude__lte=east,
+    )
+
+
+def _point(school):
+    return {
+        'type': 'Feature',
+        'geometry': {'type': 'Point', 'coordinates': [school.longitude, school.latitude]},
+        'properties': {'id': school.pk, 'name': school.name, 'address': school.address, 'adm_code': school.adm_code},
+    }
+
+
+def clustered_features(queryset, bbox, zoom):
+    """FeatureCollection GeoJSON des écoles de la bbox, regroupées par cellule de geohash.
+
+    Aux petits zooms, une requête GROUP BY sur le préfixe du geohash renvoie une
+    entité par cellule (nombre d'écoles et centre moyen) : la taille de la
+    réponse dépend de la zone affichée, pas du nombre d'écoles. Aux grands
+    zooms, les écoles sont renvoyées individuellement (au plus MAX_POINTS).
+    """
+    schools = within_bbox(queryset.filter(geohash__isnull=False), bbox)
+    precision = precision_for_zoom(zoom)
+    if precision is None:
+        points = schools.only('id', 'name', 'address', 'adm_code', 'latitude', 'longitude')[:MAX_POINTS]
+        return {'type': 'FeatureCollection', 'features': [_point(s) for s in points]}
+
+    cells = list(
+        schools.annotate(cell=Substr('geohash', 1, precision))
+        .values('cell')
+        .annotate(count=Count('id'), lat=Avg('latitude'), lon=Avg('longitude'), first_id=Min('id'))
+        .order_by()
+    )
+    singles = queryset.model.objects.in_bulk([c['first_id'] for c in cells if c['count'] == 1])
+    features = []
+    for cell in cells:
+        if cell['count'] == 1 and cell['first_id'] in singles:
+            features.append(_point(singles[cell['first_id']]))
+            continue
+        features.append({
+            'type': 'Feature',
+            'geometry': {'type': 'Point', 'coordinates': [cell['lon'], cell['lat']]},
+            'properties': {'cluster': True, 'count': cell['count'], 'geohash': cell['cell']},
+        })
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def radius_bbox(lat, lon, radius_km):
+    """bbox (ouest, sud, est, nord) englobant le cercle de rayon radius_km."""
+    dlat = radius_km / KM_PER_DEGREE
+    dlon = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6))
+    return (max(lon - dlon, -180.0), max(lat - dlat, -90.0), min(lon + dlon, 180.0), min(lat + dlat, 90.0))
+
+
+def nearest_schools(queryset, lat, lon, radius_km, limit):
+    """Les `limit` écoles les plus proches dans le rayon, triées par distance.
+
+    Le rectangle englobant le cercle est filtré par l'index (latitude,
+    longitude) ; seules les coordonnées des candidats sont lues, en gardant
+    les `limit` plus proches dans un tas borné, puis ces écoles sont chargées
+    en une requête. Chaque école retournée porte un attribut `distance_km`.
+    """
+    candidates = within_bbox(queryset.filter(latitude__isnull=False), radius_bbox(lat, lon, radius_km))
+    # Tas max (distance négative) : la racine est la plus éloignée des écoles retenues
+    heap = []
+    for pk, school_lat, school_lon in candidates.values_list('id', 'latitude', 'longitude').iterator(chunk_size=2000):
+        distance = haversine_km(lat, lon, school_lat, school_lon)
+        if distance > radius_km:
+            continue
+        entry = (-distance, -pk)
+        if len(heap) < limit:
+            heapq.heappush(heap, entry)
+        elif entry > heap[0]:
+            heapq.heapreplace(heap, entry)
+
+    schools = queryset.in_bulk([-pk for _, pk in heap])
+    nearest = []
+    for distance, pk in sorted(heap, reverse=True):
+        school = schools[-pk]
+        school.distance_km = round(-distance, 3)
+        nearest.append(school)
+    return nearest
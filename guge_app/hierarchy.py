@@ -0,0 +1,59 @@
+# hierarchy.py
+"""Arbre des entités administratives pour les formulaires et les clients hors ligne.
+
+Province → Division → SubDivision et Province → City / Territory ne changent
+presque jamais : l'arbre est sérialisé une fois par processus et resservi
+tel quel. Les signaux (voir signals.py) incrémentent sa version en base
+(versions.py) à chaque modification ; l'ETag est l'empreinte du contenu,
+identique d'un processus à l'autre.
+"""
+import hashlib
+import json
+import threading
+
+from .models import Province, Division, SubDivision, City, Territory
+from .versions import bump_versions, current_version
+
+VERSION_NAME = 'geo_hierarchy'
+
+# (clé, modèle, champ parent) ; chaque ligne est [id, code, nom] ou [id, code, nom, parent]
+LEVELS = [
+    ('provinces', Province, None),
+    ('divisions', Division, 'province_id'),
+    ('sub_divisions', SubDivision, 'division_id'),
+    ('cities', City, 'province_id'),
+    ('territories', Territory, 'province_id'),
+]
+HIERARCHY_MODELS = tuple(model for _, model, _ in LEVELS)
+
+_built = None
+_lock = threading.Lock()
+
+
+def invalidate_geo_hierarchy():
+    bump_versions(VERSION_NAME)
+
+
+def build_geo_hierarchy():
+    tree = {'columns': {}}
+    for key, model, parent_field in LEVELS:
+        fields = ['id', 'code', 'name'] + ([parent_field] if parent_field else [])
+        tree['columns'][key] = ['id', 'code', 'name'] + (['parent'] if parent_field else [])
+        tree[key] = [list(row) for row in model.objects.order_by('name', 'id').values_list(*fields)]
+    return json.dumps(tree, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def geo_hierarchy():
+    """(contenu JSON, etag) de l'arbre courant."""
+    global _built
+    version = current_version(VERSION_NAME)
+    built = _built
+    if built and built[0] == version:
+        return built[1], built[2]
+    with _lock:
+        if _built and _built[0] == version:
+            return _built[1], _built[2]
+        content = build_geo_hierarchy()
+        etag = hashlib.sha256(content).hexdigest()[:32]
+        _built = (version, content, etag)
+        return content, etag
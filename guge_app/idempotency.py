@@ -0,0 +1,113 @@
+# idempotency.py
+"""Rejeu des requêtes d'écriture portant un en-tête Idempotency-Key.
+
+Les applications mobiles renvoient la même requête quand la connexion coupe
+avant la réponse. La première réponse est mémorisée (avec une empreinte du
+contenu) et renvoyée telle quelle aux envois suivants, sans repasser par
+l'écriture ; un envoi concurrent reçoit 409 tant que la première requête
+n'a pas répondu. Une réservation restée sans réponse au-delà de
+IDEMPOTENCY_PENDING_TIMEOUT (processus arrêté pendant le traitement) est
+reprise par l'envoi suivant. La table est bornée : les entrées expirent
+après IDEMPOTENCY_TTL et seules les IDEMPOTENCY_MAX_RECORDS réponses les plus
+récentes sont gardées.
+"""
+import hashlib
+import json
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import IdempotencyRecord
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+IDEMPOTENCY_TTL = timedelta(hours=24)
+IDEMPOTENCY_MAX_RECORDS = 10000
+IDEMPOTENCY_PENDING_TIMEOUT = timedelta(minutes=2)
+
+
+def request_fingerprint(request):
+    payload = json.dumps(request.data, sort_keys=True, cls=JSONEncoder)
+    return hashlib.sha256(f"{request.method} {request.path}\n{payload}".encode()).hexdigest()
+
+
+def _replay(record):
+    response = Response(record.response, status=record.status_code)
+    response["Idempotent-Replayed"] = "true"
+    return response
+
+
+def evict_expired_records():
+    """Supprime les entrées expirées puis les réponses qui dépassent la borne.
+
+    Les réservations en cours ne comptent pas dans la borne : leur requête
+    n'a pas encore répondu.
+    """
+    IdempotencyRecord.objects.filter(created_at__lt=timezone.now() - IDEMPOTENCY_TTL).delete()
+    answered = IdempotencyRecord.objects.filter(status_code__isnull=False)
+    oldest_kept = (
+        answered.order_by("-created_at")
+        .values_list("created_at", flat=True)[IDEMPOTENCY_MAX_RECORDS:IDEMPOTENCY_MAX_RECORDS + 1]
+    )
+    if oldest_kept:
+        answered.filter(created_at__lte=oldest_kept[0]).delete()
+
+
+def idempotent(request, handler):
+    """Exécute `handler()` une seule fois par clé d'idempotence et par utilisateur.
+
+    La clé est réservée (entrée sans réponse) avant l'écriture : un renvoi
+    qui arrive pendant le traitement du premier envoi reçoit 409 au lieu de
+    rejouer l'écriture, puis la réponse mémorisée une fois celle-ci connue.
+    """
+    key = request.headers.get(IDEMPOTENCY_HEADER)
+    if not key:
+        return handler()
+
+    user = request.user if request.user.is_authenticated else None
+    fingerprint = request_fingerprint(request)
+    now = timezone.now()
+    # Entrée expirée, ou réservation abandonnée par un processus arrêté en cours de traitement
+    IdempotencyRecord.objects.filter(user=user, key=key).filter(
+        Q(created_at__lt=now - IDEMPOTENCY_TTL)
+        | Q(status_code__isnull=True, created_at__lt=now - IDEMPOTENCY_PENDING_TIMEOUT)
+    ).delete()
+    try:
+        with transaction.atomic():
+            record = IdempotencyRecord.objects.create(user=user, key=key, fingerprint=fingerprint)
+    except IntegrityError:
+        record = IdempotencyRecord.objects.filter(user=user, key=key).first()
+        if record is not None and record.fingerprint != fingerprint:
+            return Response(
+                {"error": "Cette clé d'idempotence a déjà été utilisée pour une autre requête."},
+                status=422,
+            )
+        if record is None or record.status_code is None:
+            response = Response(
+                {"error": "Une requête avec cette clé d'idempotence est en cours de traitement."},
+                status=409,
+            )
+            response["Retry-After"] = "1"
+            return response
+        return _replay(record)
+
+    try:
+        response = handler()
+    except BaseException:
+        IdempotencyRecord.objects.filter(pk=record.pk, status_code__isnull=True).delete()
+        raise
+    if response.status_code >= 500:
+        # Échec serveur : la clé est libérée pour que le client puisse réessayer
+        IdempotencyRecord.objects.filter(pk=record.pk, status_code__isnull=True).delete()
+        return response
+
+    # Sans effet si la réservation a été reprise entre-temps (traitement plus long que le délai)
+    IdempotencyRecord.objects.filter(pk=record.pk, status_code__isnull=True).update(
+        status_code=response.status_code,
+        response=json.loads(json.dumps(response.data, cls=JSONEncoder)),
+    )
+    evict_expired_records()
+    return response
@@ -0,0 +1,273 @@
+# jobs.py
+"""File de traitements longs exécutés hors requête (modèle Job, commande run_jobs).
+
+Un type de traitement est une fonction enregistrée avec @job_kind(nom) : elle
+reçoit un JobContext (progression, fichier résultat) et les paramètres du
+travail, validés à la création par la fonction `validate` du type. La
+commande run_jobs réserve les travaux en attente et les exécute dans un pool
+de processus, un travail par processus. Pendant l'exécution, le worker met à
+jour updated_at (battement de cœur) : seuls les travaux dont le worker ne
+donne plus signe de vie sont remis en attente (requeue_stale).
+"""
+import os
+import socket
+import tempfile
+import threading
+import time
+import traceback
+import uuid
+from datetime import timedelta
+from collections import namedtuple
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from .cube import build_campaign_cube
+from .export import STREAMERS, EXPORT_FORMATS, parse_export_params, export_columns, export_questions, export_queryset, export_rows
+from .fiches import parse_fiche_filters, fiche_queryset, iter_fiches, render_fiches, stream_zip
+from .models import Campaign, Job
+from .stats import rebuild_campaign_stats
+
+RESULT_DIR = 'jobs'
+# Intervalle minimal (secondes) entre deux écritures de la progression
+PROGRESS_INTERVAL = 1.0
+# Battement de cœur d'un travail en cours, et silence au-delà duquel son worker est considéré arrêté
+HEARTBEAT_INTERVAL = 30
+STALE_AFTER = timedelta(minutes=5)
+
+JobKind = namedtuple('JobKind', ['run', 'validate', 'staff_only'], defaults=[False])
+JOB_KINDS = {}
+
+
+class InvalidJobParams(ValueError):
+    pass
+
+
+class JobNotAllowed(PermissionError):
+    pass
+
+
+def job_kind(name, validate=None, staff_only=False):
+    """Enregistre une fonction run(context, **params) comme type de traitement.
+
+    `staff_only` : traitement coûteux (toutes les campagnes, volume national)
+    que seul le personnel peut mettre en file.
+    """
+    def decorator(func):
+        JOB_KINDS[name] = JobKind(func, validate or (lambda params: params), staff_only)
+        return func
+    return decorator
+
+
+def enqueue(kind, params=None, user=None):
+    """Crée un travail en attente.
+
+    Lève InvalidJobParams si le type ou les paramètres sont invalides,
+    JobNotAllowed si le type est réservé au personnel et `user` n'en fait
+    pas partie (user=None : commande ou code interne, toujours autorisé).
+    """
+    if kind not in JOB_KINDS:
+        raise InvalidJobParams(f"Traitement inconnu : {kind}.")
+    if JOB_KINDS[kind].staff_only and user is not None and not user.is_staff:
+        raise JobNotAllowed(f"Traitement réservé au personnel : {kind}.")
+    try:
+        params = JOB_KINDS[kind].validate(dict(params or {}))
+    except ValueError as exc:
+        raise InvalidJobParams(str(exc))
+    return Job.objects.create(kind=kind, params=params, created_by=user)
+
+
+def worker_id():
+    """Identifiant du processus run_jobs courant, enregistré sur les travaux qu'il réserve."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim_next_job(worker=''):
+    """Réserve pour `worker` le plus ancien travail en attente et retourne son id (None si la file est vide).
+
+    La réservation est une mise à jour conditionnelle sur le statut : deux
+    workers ne peuvent pas prendre le même travail.
+    """
+    pending = Job.objects.filter(status='en_attente').order_by('created_at').values_list('id', flat=True)
+    for job_id in pending[:10]:
+        now = timezone.now()
+        claimed = Job.objects.filter(pk=job_id, status='en_attente').update(
+            status='en_cours', worker=worker, started_at=now, updated_at=now,
+        )
+        if claimed:
+            return job_id
+    return None
+
+
+def requeue_stale(stale_after=STALE_AFTER):
+    """Remet en attente les travaux en cours sans battement de cœur depuis `stale_after` (worker arrêté)."""
+    return Job.objects.filter(status='en_cours', updated_at__lt=timezone.now() - stale_after).update(
+        status='en_attente', progress=0, message='', worker='', started_at=None, updated_at=timezone.now()
+    )
+
+
+class Heartbeat(threading.Thread):
+    """Met à jour updated_at d'un travail en cours toutes les `interval` secondes, jusqu'à stop()."""
+
+    def __init__(self, job, interval=HEARTBEAT_INTERVAL):
+        super().__init__(daemon=True)
+        self.job = job
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self._stopped.wait(self.interval):
+                Job.objects.filter(pk=self.job.pk, status='en_cours', worker=self.job.worker).update(
+                    updated_at=timezone.now()
+                )
+        finally:
+            # Connexion propre au thread
+            connection.close()
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+class JobContext:
+    """Interface d'un traitement avec son Job : progression et fichier résultat."""
+
+    def __init__(self, job):
+        self.job = job
+        self.result_name = None
+        self._last_progress = 0.0
+
+    def progress(self, done, total, message=''):
+        now = time.monotonic()
+        if now - self._last_progress < PROGRESS_INTERVAL:
+            return
+        self._last_progress = now
+        percent = min(99, 100 * done // total) if total else 0
+        Job.objects.filter(pk=self.job.pk, worker=self.job.worker).update(
+            progress=percent, message=message[:255], updated_at=timezone.now()
+        )
+
+    def track(self, items, total, message=''):
+        """Itère sur `items` en publiant la progression."""
+        for done, item in enumerate(items):
+            self.progress(done, total, message)
+            yield item
+
+    def write_result(self, chunks, extension):
+        """Écrit le résultat (itérable de str ou bytes) dans MEDIA_ROOT/jobs/<id>.<extension>."""
+        directory = Path(settings.MEDIA_ROOT) / RESULT_DIR
+        directory.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                for chunk in chunks:
+                    tmp.write(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        name = f'{RESULT_DIR}/{self.job.pk}.{extension}'
+        os.replace(tmp_path, Path(settings.MEDIA_ROOT) / name)
+        self.result_name = name
+
+
+def run_job(job_id):
+    """Exécute un travail réservé et enregistre son issue ; retourne le statut final.
+
+    L'issue n'est enregistrée que si le travail appartient encore à son worker
+    (il a pu être remis en attente et repris ailleurs entre-temps).
+    """
+    job = Job.objects.get(pk=job_id)
+    context = JobContext(job)
+    owned = Job.objects.filter(pk=job.pk, status='en_cours', worker=job.worker)
+    heartbeat = Heartbeat(job)
+    heartbeat.start()
+    try:
+        if job.kind not in JOB_KINDS:
+            raise InvalidJobParams(f"Traitement inconnu : {job.kind}.")
+        message = JOB_KINDS[job.kind].run(context, **job.params) or ''
+    except Exception as exc:
+        now = timezone.now()
+        owned.update(
+            status='echec', message=str(exc)[:255], error=traceback.format_exc(),
+            finished_at=now, updated_at=now,
+        )
+        return 'echec'
+    finally:
+        heartbeat.stop()
+    now = timezone.now()
+    owned.update(
+        status='termine', progress=100, message=message[:255], result=context.result_name or '',
+        finished_at=now, updated_at=now,
+    )
+    return 'termine'
+
+
+# Traitements
+
+def _validate_export(params):
+    export_format, campaign, recolte_type = parse_export_params(params)
+    return {'format': export_format, 'campaign': str(campaign.pk) if campaign else None, 'type': recolte_type}
+
+
+@job_kind('export_recoltes', validate=_validate_export)
+def export_recoltes(context, **params):
+    """Même contenu que GET /api/recoltes/export/, écrit dans le fichier résultat."""
+    export_format, campaign, recolte_type = parse_export_params(params)
+    columns = export_columns(export_questions(campaign, recolte_type))
+    queryset = export_queryset(campaign, recolte_type)
+    total = queryset.count()
+    rows = context.track(export_rows(queryset, columns), total, "Export des récoltes")
+    context.write_result(STREAMERS[export_format](columns, rows), EXPORT_FORMATS[export_format][1])
+    return f"{total} récoltes exportées"
+
+
+def _validate_campaign_stats(params):
+    campaign = params.get('campaign')
+    if campaign:
+        try:
+            campaign = str(Campaign.objects.get(pk=uuid.UUID(str(campaign))).pk)
+        except (ValueError, Campaign.DoesNotExist):
+            raise ValueError("Campagne introuvable.")
+    return {'campaign': campaign or None}
+
+
+@job_kind('rebuild_campaign_stats', validate=_validate_campaign_stats, staff_only=True)
+def rebuild_stats(context, campaign=None):
+    campaigns = Campaign.objects.all()
+    if campaign:
+        campaigns = campaigns.filter(pk=campaign)
+    campaigns = list(campaigns)
+    for campaign in context.track(campaigns, len(campaigns), "Statistiques des campagnes"):
+        rebuild_campaign_stats(campaign)
+    return f"{len(campaigns)} campagne(s) recalculée(s)"
+
+
+@job_kind('build_cube', validate=_validate_campaign_stats, staff_only=True)
+def build_cube(context, campaign=None):
+    """Reconstruction complète du cube d'indicateurs (une campagne ou toutes)."""
+    campaigns = Campaign.objects.all()
+    if campaign:
+        campaigns = campaigns.filter(pk=campaign)
+    campaigns = list(campaigns)
+    cells = sum(build_campaign_cube(c) for c in context.track(campaigns, len(campaigns), "Cube d'indicateurs"))
+    return f"{len(campaigns)} campagne(s), {cells} cellules"
+
+
+def _validate_fiches(params):
+    campaign, division = parse_fiche_filters(params)
+    return {'campaign': str(campaign.pk) if campaign else None, 'division': division.pk if division else None}
+
+
+@job_kind('fiches_pdf', validate=_validate_fiches, staff_only=True)
+def fiches_pdf(context, **params):
+    """Archive ZIP des fiches PDF validées (mêmes filtres que rapports/pdf/)."""
+    campaign, division = parse_fiche_filters(params)
+    queryset = fiche_queryset(campaign, division)
+    total = queryset.count()
+    fiches = context.track(iter_fiches(queryset), total, "Rendu des fiches PDF")
+    stats = {}
+    context.write_result(stream_zip(render_fiches(fiches, workers=settings.GUGE_PDF_WORKERS), stats), 'zip')
+    return f"{stats['count']} fiches ({stats['per_second']:.1f} fiches/s)"
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from guge_app.answers import sync_answers
+from guge_app.models import Question, Recolte
+
+
+class Command(BaseCommand):
+    help = "Reconstruit la table Answer à partir du JSON des récoltes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--campaign', help="Limiter à une campagne (UUID)")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        recoltes = Recolte.objects.only('id', 'answers').order_by('pk')
+        if options['campaign']:
+            recoltes = recoltes.filter(campaign_id=options['campaign'])
+
+        # Types des questions chargés une seule fois pour tout le rattrapage
+        question_kinds = dict(Question.objects.values_list('id', 'kind'))
+
+        total_recoltes = total_rows = 0
+        batch = []
+        for recolte in recoltes.iterator(chunk_size=batch_size):
+            batch.append(recolte)
+            if len(batch) >= batch_size:
+                total_rows += sync_answers(batch, question_kinds)
+                total_recoltes += len(batch)
+                batch = []
+                self.stdout.write(f"{total_recoltes} récoltes traitées...")
+        if batch:
+            total_rows += sync_answers(batch, question_kinds)
+            total_recoltes += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rattrapage terminé : {total_rows} réponses pour {total_recoltes} récoltes."
+        ))
@@ -0,0 +1,68 @@
+import time
+import uuid
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+from django.template import Context, Template
+from django.template.loader import render_to_string
+
+from guge_app.answers import GroupeInfo, QuestionInfo, report_sections
+
+# Rendu d'origine de model.html : double boucle questions x réponses par groupe
+LEGACY_GROUPS_TEMPLATE = """
+{% for grp in groups_list %}
+    {% for question in questions %}
+        {% if question.groupe.name == grp.name %}
+            {% with answer="" %}
+            {% for item in answers_list %}
+                {% if item.question_uuid == question.id %}
+                    {% with answer=item.answer %}
+                    {% endwith %}
+                {% endif %}
+            {% endfor %}
+            <p><strong>{{ question.text }} :</strong> {{ answer|default:"Non répondu" }}</p>
+            {% endwith %}
+        {% endif %}
+    {% endfor %}
+{% endfor %}
+"""
+
+
+class Command(BaseCommand):
+    help = "Mesure le temps de rendu de la fiche SIGE (model.html) avant/après le pré-regroupement"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--questions', type=int, default=500)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        groups = [GroupeInfo(uuid.uuid4(), f"Groupe {i}", i) for i in range(options['groups'])]
+        question_map = {}
+        for i in range(options['questions']):
+            qid = uuid.uuid4()
+            question_map[qid] = QuestionInfo(qid, f"Question {i}", 'number', [], groups[i % len(groups)])
+        answers = [{'question_uuid': str(qid), 'answer': str(i)} for i, qid in enumerate(question_map)]
+        items = [(uuid.UUID(a['question_uuid']), a['answer']) for a in answers]
+
+        establishment = SimpleNamespace(name="École", address="", head_name="", head_phone="",
+                                        province="", city="", territory="", environment="", geo_coord={})
+        recolte = SimpleNamespace(type='primaire', establishment=establishment, date="")
+
+        legacy = Template(LEGACY_GROUPS_TEMPLATE)
+        legacy_context = {'groups_list': groups, 'questions': list(question_map.values()), 'answers_list': answers}
+
+        def legacy_render():
+            legacy.render(Context(legacy_context))
+
+        def grouped_render():
+            render_to_string('model.html', {'recolte': recolte, 'sections': report_sections(question_map, items)})
+
+        self.stdout.write(f"Fiche de {options['questions']} questions, {options['groups']} groupes :")
+        for label, func in (("avant (double boucle)", legacy_render), ("après (sections)", grouped_render)):
+            timings = []
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                func()
+                timings.append(time.perf_counter() - start)
+            self.stdout.write(f"  {label:<24} {min(timings) * 1000:9.1f} ms (meilleur de {options['repeat']})")
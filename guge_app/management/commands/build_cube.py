@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from guge_app.cube import build_campaign_cube
+from guge_app.models import Campaign
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruit entièrement le cube d'indicateurs des campagnes ; les récoltes "
+        "le tiennent ensuite à jour, cellule par cellule"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--campaign', help="Limiter à une campagne (UUID)")
+
+    def handle(self, *args, **options):
+        campaigns = Campaign.objects.all()
+        if options['campaign']:
+            campaigns = campaigns.filter(pk=options['campaign'])
+
+        for campaign in campaigns:
+            start = time.perf_counter()
+            cells = build_campaign_cube(campaign)
+            self.stdout.write(f"{campaign.name} : {cells} cellules en {time.perf_counter() - start:.2f} s")
+        self.stdout.write(self.style.SUCCESS("Cube d'indicateurs reconstruit."))
@@ -0,0 +1,20 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+
+class Command(BaseCommand):
+    help = (
+        "Vérifie que les requêtes des vues fréquentes utilisent un index (plans SQLite) ; "
+        "exécute guge_app.tests.QueryPlanTests"
+    )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("Vérification des plans disponible uniquement sous SQLite.")
+        try:
+            call_command('test', 'guge_app.tests.QueryPlanTests', verbosity=options['verbosity'], failfast=False)
+        except SystemExit as exc:
+            if exc.code:
+                raise CommandError("Requête(s) sans index adapté.")
+        self.stdout.write(self.style.SUCCESS("Toutes les requêtes utilisent un index."))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from guge_app.models import ChangeJournal
+from guge_app.sync import compact_journal
+
+
+class Command(BaseCommand):
+    help = "Compacte le journal des changements en ne gardant que la dernière entrée de chaque objet"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--entity',
+            action='append',
+            choices=[choice for choice, _ in ChangeJournal.ENTITY_CHOICES],
+            help="Limiter la compaction à une entité (répétable)",
+        )
+
+    def handle(self, *args, **options):
+        before = ChangeJournal.objects.count()
+        deleted = compact_journal(options['entity'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Journal compacté : {deleted} entrées supprimées sur {before}."
+        ))
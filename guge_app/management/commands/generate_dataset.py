@@ -0,0 +1,294 @@
+import random
+import uuid
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from guge_app.answers import sync_answers
+from guge_app.cube import build_campaign_cube, cube_built
+from guge_app.autocomplete import ENTITIES, invalidate_autocomplete
+from guge_app.geo import sync_school_coordinates
+from guge_app.hierarchy import invalidate_geo_hierarchy
+from guge_app.models import (
+    Province, Division, SubDivision, City, Territory, School,
+    QuestionTemplate, Question, Groupe, Campaign, Recolte, Answer,
+)
+from guge_app.signals import journal_creations, journal_deletions, receivers_muted
+from guge_app.stats import invalidate_dashboard_stats, invalidate_question_stats, rebuild_campaign_stats
+
+PREFIX = 'BENCH'
+BATCH_SIZE = 2000
+
+PROVINCES = [
+    'Kinshasa', 'Kongo-Central', 'Kwango', 'Kwilu', 'Maï-Ndombe', 'Kasaï', 'Kasaï-Central',
+    'Kasaï-Oriental', 'Lomami', 'Sankuru', 'Maniema', 'Sud-Kivu', 'Nord-Kivu', 'Ituri',
+    'Haut-Uele', 'Tshopo', 'Bas-Uele', 'Nord-Ubangi', 'Mongala', 'Sud-Ubangi', 'Équateur',
+    'Tshuapa', 'Tanganyika', 'Haut-Lomami', 'Lualaba', 'Haut-Katanga',
+]
+SCHOOL_WORDS = [
+    'Saint', 'Sainte', 'Joseph', 'Thérèse', 'Lumière', 'Espoir', 'Mapendo', 'Bosangani',
+    'Kimbangu', 'Mwana', 'Lisanga', 'Elikya', 'Tuendelee', 'Umoja', 'Amani', 'Matumaini',
+]
+SCHOOL_KINDS = ['École primaire', 'Institut', 'Complexe scolaire', 'Lycée', 'Collège', 'École maternelle']
+FIRST_NAMES = ['Jean', 'Marie', 'Joseph', 'Pierre', 'Grâce', 'Esther', 'Patrick', 'Chantal', 'Daniel', 'Ruth']
+LAST_NAMES = ['Mbuyi', 'Kabila', 'Ilunga', 'Tshibanda', 'Mukendi', 'Lukusa', 'Kasongo', 'Ngalula', 'Mutombo', 'Bokele']
+CHOICE_OPTIONS = [['Oui', 'Non'], ['Bon', 'Moyen', 'Mauvais'], ['Électricité', 'Eau courante', 'Latrines', 'Clôture']]
+LEVELS = ['pre-scolaire', 'primaire', 'secondaire']
+
+# Emprise approximative de la RDC (latitude, longitude)
+LAT_RANGE = (-13.4, 5.3)
+LON_RANGE = (12.2, 31.3)
+
+
+class Command(BaseCommand):
+    help = "Génère un jeu de données synthétique à l'échelle nationale pour les mesures de performance"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=1.0,
+                            help="Facteur appliqué aux volumes (1.0 : 80 000 écoles, 500 000 récoltes)")
+        parser.add_argument('--schools', type=int, default=80000)
+        parser.add_argument('--recoltes', type=int, default=500000)
+        parser.add_argument('--campaigns', type=int, default=3)
+        parser.add_argument('--questions', type=int, default=300)
+        parser.add_argument('--divisions-per-province', type=int, default=12)
+        parser.add_argument('--sub-divisions-per-division', type=int, default=4)
+        parser.add_argument('--no-answer-table', action='store_true',
+                            help="Ne pas remplir la table Answer (génération plus rapide)")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--reset', action='store_true',
+                            help="Supprime d'abord les données générées précédemment")
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        scale = options['scale']
+        if options['reset']:
+            self.reset()
+
+        provinces = self.provinces()
+        divisions, sub_divisions, cities, territories = self.units(provinces, options)
+        schools = self.schools(max(1, int(options['schools'] * scale)), provinces, divisions,
+                               sub_divisions, cities, territories)
+        collectors = self.collectors()
+        campaigns = self.campaigns(options['campaigns'], options['questions'])
+        self.recoltes(max(1, int(options['recoltes'] * scale)), schools, campaigns, collectors,
+                      fill_answers=not options['no_answer_table'])
+
+        for campaign, _ in campaigns:
+            rebuild_campaign_stats(campaign)
+            build_campaign_cube(campaign)
+        invalidate_dashboard_stats()
+        invalidate_question_stats([campaign.pk for campaign, _ in campaigns])
+        invalidate_geo_hierarchy()
+        for entity in ENTITIES:
+            invalidate_autocomplete(entity)
+        self.stdout.write(self.style.SUCCESS("Jeu de données généré."))
+
+    def reset(self):
+        # Récepteurs suspendus : une suppression ligne par ligne (compteurs,
+        # cube, journal) prendrait des heures à 500 000 récoltes. Le journal
+        # reçoit les suppressions en lot ; les compteurs des campagnes
+        # supprimées disparaissent avec elles (cascade).
+        journaled = [
+            Campaign.objects.filter(name__startswith=PREFIX),
+            Question.objects.filter(template__name__startswith=PREFIX),
+            QuestionTemplate.objects.filter(name__startswith=PREFIX),
+            Groupe.objects.filter(name__startswith=PREFIX),
+            School.objects.filter(adm_code__startswith=PREFIX),
+        ]
+        # Campagnes réelles ayant des récoltes sur des écoles générées
+        affected = set(
+            Recolte.objects.filter(establishment__adm_code__startswith=PREFIX, campaign__isnull=False)
+            .exclude(campaign__name__startswith=PREFIX).values_list('campaign_id', flat=True).distinct()
+        )
+        with transaction.atomic():
+            for queryset in journaled:
+                journal_deletions(queryset)
+            with receivers_muted():
+                Answer.objects.filter(recolte__campaign__name__startswith=PREFIX).delete()
+                Recolte.objects.filter(campaign__name__startswith=PREFIX).only('id').delete()
+                # Récoltes d'autres campagnes sur des écoles générées
+                Answer.objects.filter(recolte__establishment__adm_code__startswith=PREFIX).delete()
+                Recolte.objects.filter(establishment__adm_code__startswith=PREFIX).only('id').delete()
+                for queryset in journaled:
+                    queryset.delete()
+                SubDivision.objects.filter(code__startswith=PREFIX).delete()
+                Division.objects.filter(code__startswith=PREFIX).delete()
+                City.objects.filter(code__startswith=PREFIX).delete()
+                Territory.objects.filter(code__startswith=PREFIX).delete()
+                User.objects.filter(username__startswith=f'{PREFIX.lower()}_').delete()
+        for campaign in Campaign.objects.filter(pk__in=affected):
+            rebuild_campaign_stats(campaign)
+            if cube_built(campaign.pk):
+                build_campaign_cube(campaign)
+        self.stdout.write("Données générées précédemment supprimées.")
+
+    def provinces(self):
+        existing = {p.name: p for p in Province.objects.filter(name__in=PROVINCES)}
+        missing = [Province(name=name, code=f'{PREFIX}-P{i:02d}') for i, name in enumerate(PROVINCES) if name not in existing]
+        Province.objects.bulk_create(missing)
+        provinces = list(Province.objects.filter(name__in=PROVINCES))
+        self.stdout.write(f"{len(provinces)} provinces ({len(missing)} créées)")
+        return provinces
+
+    def units(self, provinces, options):
+        # ignore_conflicts : une nouvelle exécution réutilise les entités déjà générées
+        divisions, cities, territories = [], [], []
+        for p in provinces:
+            for i in range(options['divisions_per_province']):
+                divisions.append(Division(province=p, code=f'{PREFIX}-D{p.pk}-{i}', name=f'{p.name} {i + 1}'))
+            for i in range(4):
+                cities.append(City(province=p, code=f'{PREFIX}-C{p.pk}-{i}', name=f'Ville {p.name} {i + 1}'))
+            for i in range(6):
+                territories.append(Territory(province=p, code=f'{PREFIX}-T{p.pk}-{i}', name=f'Territoire {p.name} {i + 1}'))
+        Division.objects.bulk_create(divisions, batch_size=BATCH_SIZE, ignore_conflicts=True)
+        City.objects.bulk_create(cities, batch_size=BATCH_SIZE, ignore_conflicts=True)
+        Territory.objects.bulk_create(territories, batch_size=BATCH_SIZE, ignore_conflicts=True)
+        divisions = list(Division.objects.filter(code__startswith=PREFIX))
+
+        sub_divisions = [
+            SubDivision(division=d, code=f'{d.code}-{i}', name=f'{d.name}-{i + 1}')
+            for d in divisions for i in range(options['sub_divisions_per_division'])
+        ]
+        SubDivision.objects.bulk_create(sub_divisions, batch_size=BATCH_SIZE, ignore_conflicts=True)
+        sub_divisions = list(SubDivision.objects.filter(code__startswith=PREFIX).select_related('division'))
+        cities = list(City.objects.filter(code__startswith=PREFIX))
+        territories = list(Territory.objects.filter(code__startswith=PREFIX))
+        self.stdout.write(
+            f"{len(divisions)} divisions, {len(sub_divisions)} sous-divisions, "
+            f"{len(cities)} villes, {len(territories)} territoires"
+        )
+        return divisions, sub_divisions, cities, territories
+
+    def _person(self):
+        return f"{self.rng.choice(FIRST_NAMES)} {self.rng.choice(LAST_NAMES)}"
+
+    def schools(self, count, provinces, divisions, sub_divisions, cities, territories):
+        rng = self.rng
+        cities_by_province, territories_by_province = {}, {}
+        for c in cities:
+            cities_by_province.setdefault(c.province_id, []).append(c)
+        for t in territories:
+            territories_by_province.setdefault(t.province_id, []).append(t)
+        now = timezone.now()
+
+        start = School.objects.filter(adm_code__startswith=PREFIX).count()
+        for offset in range(0, count, BATCH_SIZE):
+            batch = []
+            for n in range(start + offset, start + min(offset + BATCH_SIZE, count)):
+                sub = rng.choice(sub_divisions)
+                province_id = sub.division.province_id
+                urban = rng.random() < 0.3
+                school = School(
+                    name=f"{rng.choice(SCHOOL_KINDS)} {rng.choice(SCHOOL_WORDS)} {rng.choice(SCHOOL_WORDS)} {n}",
+                    address=f"Avenue {rng.choice(SCHOOL_WORDS)} n°{rng.randint(1, 300)}",
+                    level=rng.sample(LEVELS, rng.randint(1, 2)),
+                    head_name=self._person(),
+                    head_phone=f"+2438{rng.randint(10000000, 99999999)}",
+                    province_id=province_id,
+                    division_id=sub.division_id,
+                    sub_division=sub,
+                    city=rng.choice(cities_by_province[province_id]) if urban else None,
+                    territory=None if urban else rng.choice(territories_by_province[province_id]),
+                    village=None if urban else f"Village {rng.choice(SCHOOL_WORDS)}",
+                    adm_code=f"{PREFIX}-{n:07d}",
+                    legal_reference=f"ARR/{rng.randint(1, 9999)}/{rng.randint(1990, 2024)}",
+                    secope_number=str(rng.randint(100000, 999999)),
+                    management_regime=rng.choice(School.MANAGEMENT_CHOICES)[0],
+                    mechanized_status=rng.choice(School.MECHANIZED_CHOICES)[0],
+                    ownership_status=rng.choice(School.OWNERSHIP_CHOICES)[0],
+                    environment='urbain' if urban else 'rural',
+                    geo_coord={'latitude': rng.uniform(*LAT_RANGE), 'longitude': rng.uniform(*LON_RANGE)},
+                    created_at=now - timedelta(days=rng.randint(0, 3650)),
+                )
+                # bulk_create n'envoie pas pre_save : colonnes indexées calculées ici
+                sync_school_coordinates(school)
+                batch.append(school)
+            School.objects.bulk_create(batch)
+            # Les clients déjà synchronisés reçoivent les nouvelles écoles par le journal
+            journal_creations(batch)
+        self.stdout.write(f"{count} écoles")
+        return list(School.objects.filter(adm_code__startswith=PREFIX).values_list('id', 'level'))
+
+    def collectors(self):
+        users = [User(username=f'{PREFIX.lower()}_collecteur_{i}', first_name=self._person()) for i in range(50)]
+        for user in users:
+            user.set_unusable_password()
+        User.objects.bulk_create(users, ignore_conflicts=True)
+        return list(User.objects.filter(username__startswith=f'{PREFIX.lower()}_').values_list('id', flat=True))
+
+    def campaigns(self, count, questions_per_template):
+        rng = self.rng
+        groupes = [Groupe(name=f'{PREFIX} Thème {i + 1}', order=i) for i in range(20)]
+        Groupe.objects.bulk_create(groupes)
+
+        templates = []
+        for level in LEVELS:
+            template = QuestionTemplate.objects.create(name=f'{PREFIX} Questionnaire {level}', type=level)
+            questions = []
+            for i in range(questions_per_template):
+                kind = rng.choices(['number', 'choice', 'text'], weights=[5, 3, 2])[0]
+                questions.append(Question(
+                    template=template, groupe=groupes[i * len(groupes) // questions_per_template],
+                    text=f"Question {i + 1} ({kind})", kind=kind,
+                    options=rng.choice(CHOICE_OPTIONS) if kind == 'choice' else [],
+                ))
+            Question.objects.bulk_create(questions, batch_size=BATCH_SIZE)
+            templates.append((template, questions))
+
+        campaigns = []
+        today = timezone.now()
+        for i in range(count):
+            start = today - timedelta(days=365 * (count - i))
+            campaign = Campaign.objects.create(
+                name=f'{PREFIX} Campagne {start.year}', start_date=start, end_date=start + timedelta(days=90),
+            )
+            campaign.question_templates.set([t for t, _ in templates])
+            campaigns.append((campaign, templates))
+        self.stdout.write(f"{count} campagnes, {len(templates)} questionnaires de {questions_per_template} questions")
+        return campaigns
+
+    def _answers(self, questions):
+        rng = self.rng
+        answers = []
+        for q in questions:
+            if rng.random() < 0.05:
+                continue  # question sans réponse
+            if q.kind == 'number':
+                value = str(rng.randint(0, 800))
+            elif q.kind == 'choice':
+                value = rng.choice(q.options)
+            else:
+                value = rng.choice(['RAS', 'Bon état', 'À réhabiliter', 'Manque de matériel didactique'])
+            answers.append({'question_uuid': str(q.id), 'answer': value})
+        return answers
+
+    def recoltes(self, count, schools, campaigns, collectors, fill_answers=True):
+        rng = self.rng
+        # Toutes les campagnes partagent les mêmes questionnaires
+        question_kinds = {q.id: q.kind for _, questions in campaigns[0][1] for q in questions}
+        for offset in range(0, count, BATCH_SIZE):
+            batch = []
+            for _ in range(min(BATCH_SIZE, count - offset)):
+                school_id, levels = rng.choice(schools)
+                campaign, templates = rng.choice(campaigns)
+                template, questions = rng.choice([t for t in templates if t[0].type in (levels or LEVELS)] or templates)
+                batch.append(Recolte(
+                    id=uuid.uuid4(),
+                    establishment_id=school_id,
+                    campaign=campaign,
+                    date=campaign.start_date + timedelta(days=rng.randint(0, 90), minutes=rng.randint(0, 1439)),
+                    collector_id_id=rng.choice(collectors),
+                    type=template.type,
+                    answers=self._answers(questions),
+                    status=rng.choices(['valide', 'en_attente', 'rejete'], weights=[70, 25, 5])[0],
+                ))
+            with transaction.atomic():
+                Recolte.objects.bulk_create(batch)
+                if fill_answers:
+                    sync_answers(batch, question_kinds, replace=False)
+            if (offset // BATCH_SIZE) % 10 == 9:
+                self.stdout.write(f"  {offset + len(batch)}/{count} récoltes")
+        self.stdout.write(f"{count} récoltes")
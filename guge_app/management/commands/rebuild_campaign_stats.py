@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from guge_app.models import Campaign
+from guge_app.stats import rebuild_campaign_stats
+
+
+class Command(BaseCommand):
+    help = "Recalcule entièrement les statistiques d'avancement des campagnes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--campaign', help="Limiter à une campagne (UUID)")
+
+    def handle(self, *args, **options):
+        campaigns = Campaign.objects.all()
+        if options['campaign']:
+            campaigns = campaigns.filter(pk=options['campaign'])
+
+        for campaign in campaigns:
+            stats = rebuild_campaign_stats(campaign)
+            self.stdout.write(
+                f"{campaign.name} : {stats.total} récoltes, "
+                f"{stats.schools_covered}/{stats.schools_in_scope} écoles ({stats.coverage} %)"
+            )
+        self.stdout.write(self.style.SUCCESS("Statistiques des campagnes reconstruites."))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from guge_app.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Reconstruit l'index de recherche plein texte des écoles"
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Index de recherche reconstruit ({type(backend).__name__})."))
@@ -0,0 +1,37 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from guge_app.fiches import parse_fiche_filters, fiches_filename, fiche_queryset, iter_fiches, render_fiches, stream_zip
+
+
+class Command(BaseCommand):
+    help = "Génère l'archive ZIP des fiches PDF validées et mesure le débit (fiches/s)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--campaign', help="Limiter à une campagne (UUID)")
+        parser.add_argument('--division', help="Limiter à une division (id)")
+        parser.add_argument('--workers', default=str(settings.GUGE_PDF_WORKERS),
+                            help="Nombre de processus de rendu ; une liste (ex. 1,2,4) compare les débits")
+        parser.add_argument('--output', help="Fichier ZIP produit (défaut : nom dérivé des filtres)")
+
+    def handle(self, *args, **options):
+        try:
+            campaign, division = parse_fiche_filters(options)
+            worker_counts = [int(n) for n in options['workers'].split(',')]
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        output = options['output'] or fiches_filename(campaign, division)
+        for workers in worker_counts:
+            stats = {}
+            fiches = iter_fiches(fiche_queryset(campaign, division))
+            with open(output, 'wb') as archive:
+                for chunk in stream_zip(render_fiches(fiches, workers=workers), stats):
+                    archive.write(chunk)
+            self.stdout.write(
+                f"{workers} processus : {stats['count']} fiches en {stats['seconds']:.2f} s, "
+                f"{stats['per_second']:.1f} fiches/s ({os.path.getsize(output) / 1e6:.1f} Mo)"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Archive écrite : {output}"))
@@ -0,0 +1,147 @@
+import json
+import platform
+import statistics
+import subprocess
+import time
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from guge_app.models import School, Recolte, QuestionTemplate
+
+BENCHMARK_USER = 'bench_runner'
+
+
+def endpoints():
+    """(nom, url) des points d'accès mesurés."""
+    urls = [
+        ('api schools-sync', reverse('school_sync_api_list')),
+        ('api recoltes', reverse('recolte_api_list')),
+        ('api question-templates', reverse('question_template_api_list')),
+        ('api question-templates bundle', reverse('question_template_bundle')),
+        ('home', reverse('home')),
+        ('school_map', reverse('school_map')),
+        ('api schools geo (zoom 5)', reverse('school_geo') + '?bbox=12,-14,32,6&zoom=5'),
+    ]
+    recolte = Recolte.objects.filter(status='valide').order_by('-date').first()
+    if recolte is not None:
+        urls.append(('rapport_detail', reverse('rapport_detail', args=[recolte.pk])))
+    return urls
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            cwd=settings.BASE_DIR, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+class Command(BaseCommand):
+    help = "Mesure les points d'accès fréquents et enregistre les résultats en JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--warmup', type=int, default=1)
+        parser.add_argument('--cold', action='store_true', help="Vide le cache avant chaque requête")
+        parser.add_argument('--only', nargs='*', help="Noms des points d'accès à mesurer")
+        parser.add_argument('--output', help="Fichier JSON (défaut : benchmarks/<révision>.json)")
+        parser.add_argument('--compare', help="Résultats précédents (JSON) à comparer")
+
+    def handle(self, *args, **options):
+        user, _ = User.objects.get_or_create(username=BENCHMARK_USER, defaults={'is_staff': True})
+        host = next((h for h in settings.ALLOWED_HOSTS if h != '*' and not h.startswith('.')), 'localhost')
+        client = Client(HTTP_HOST=host)
+        client.force_login(user)
+
+        results = []
+        for name, url in endpoints():
+            if options['only'] and name not in options['only']:
+                continue
+            results.append(self.measure(client, name, url, options))
+
+        revision = git_revision()
+        report = {
+            'revision': revision,
+            'date': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'dataset': {
+                'schools': School.objects.count(),
+                'recoltes': Recolte.objects.count(),
+                'question_templates': QuestionTemplate.objects.count(),
+            },
+            'options': {'repeat': options['repeat'], 'cold': options['cold']},
+            'results': results,
+        }
+        output = Path(options['output'] or Path(settings.BASE_DIR) / 'benchmarks' / f"{revision or 'local'}.json")
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+        self.stdout.write(self.style.SUCCESS(f"Résultats enregistrés dans {output}"))
+
+        if options['compare']:
+            self.compare(json.loads(Path(options['compare']).read_text()), report)
+
+    def measure(self, client, name, url, options):
+        for _ in range(options['warmup']):
+            client.get(url)
+        timings, queries = [], []
+        for _ in range(options['repeat']):
+            if options['cold']:
+                cache.clear()
+            with CaptureQueriesContext(connection) as ctx:
+                start = time.perf_counter()
+                response = client.get(url)
+                size = len(b''.join(response) if response.streaming else response.content)
+                timings.append((time.perf_counter() - start) * 1000)
+            queries.append(len(ctx))
+            if response.status_code >= 400:
+                raise CommandError(f"{name} ({url}) : statut {response.status_code}")
+
+        result = {
+            'name': name,
+            'url': url,
+            'status': response.status_code,
+            'bytes': size,
+            'queries': max(queries),
+            'min_ms': round(min(timings), 2),
+            'median_ms': round(statistics.median(timings), 2),
+            'p95_ms': round(percentile(timings, 0.95), 2),
+            'mean_ms': round(statistics.mean(timings), 2),
+        }
+        self.stdout.write(
+            f"{name:<32} médiane {result['median_ms']:>9.1f} ms  p95 {result['p95_ms']:>9.1f} ms  "
+            f"{result['queries']:>4} requêtes  {result['bytes']:>10} octets"
+        )
+        return result
+
+    def compare(self, previous, current):
+        before = {r['name']: r for r in previous.get('results', [])}
+        self.stdout.write(f"\nComparaison avec {previous.get('revision')} :")
+        for result in current['results']:
+            old = before.get(result['name'])
+            if old is None:
+                continue
+            change = (result['median_ms'] - old['median_ms']) / old['median_ms'] * 100 if old['median_ms'] else 0
+            style = self.style.ERROR if change > 10 else self.style.SUCCESS if change < -10 else str
+            self.stdout.write(style(
+                f"{result['name']:<32} {old['median_ms']:>9.1f} → {result['median_ms']:>9.1f} ms ({change:+.0f} %)  "
+                f"requêtes {old['queries']} → {result['queries']}"
+            ))
@@ -0,0 +1,75 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+
+from guge_app.jobs import claim_next_job, requeue_stale, run_job, worker_id
+from guge_app.models import Job
+
+
+def _close_connections():
+    # Le processus fils ne doit pas réutiliser la connexion héritée du parent
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Exécute les travaux en attente (modèle Job) dans un pool de processus"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help="Nombre de travaux exécutés en parallèle (défaut : nombre de cœurs)")
+        parser.add_argument('--poll', type=float, default=2.0, help="Intervalle de consultation de la file (secondes)")
+        parser.add_argument('--once', action='store_true', help="S'arrêter quand la file est vide")
+        parser.add_argument('--requeue', action='store_true',
+                            help="Remettre en attente les travaux « en cours » dont le worker ne donne plus signe de vie")
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        worker = worker_id()
+        if options['requeue']:
+            self.stdout.write(f"{requeue_stale()} travail(aux) remis en attente.")
+
+        # fork : les processus fils héritent de la configuration Django déjà chargée
+        context = multiprocessing.get_context('fork')
+        running = {}
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_close_connections) as pool:
+            self.stdout.write(f"Worker {worker} démarré ({workers} processus).")
+            try:
+                while True:
+                    while len(running) < workers:
+                        job_id = claim_next_job(worker)
+                        if job_id is None:
+                            break
+                        # Pas de connexion ouverte au moment où le pool crée un processus
+                        connections.close_all()
+                        running[pool.submit(run_job, job_id)] = job_id
+                        self.stdout.write(f"{job_id} : démarré")
+
+                    if not running:
+                        if options['once']:
+                            break
+                        time.sleep(options['poll'])
+                        continue
+
+                    done, _ = wait(running, timeout=options['poll'], return_when=FIRST_COMPLETED)
+                    for future in done:
+                        self._report(running.pop(future), future)
+            except KeyboardInterrupt:
+                self.stdout.write("Arrêt : les travaux en cours seront repris avec --requeue une fois leur battement de cœur expiré.")
+
+    def _report(self, job_id, future):
+        try:
+            status = future.result()
+        except Exception as exc:
+            # Processus du pool tué (mémoire, signal) : le travail n'a pas pu enregistrer son échec
+            now = timezone.now()
+            Job.objects.filter(pk=job_id, status='en_cours', worker=worker_id()).update(
+                status='echec', message=f"Processus interrompu : {exc}"[:255], finished_at=now, updated_at=now,
+            )
+            status = 'echec'
+        style = self.style.SUCCESS if status == 'termine' else self.style.ERROR
+        self.stdout.write(style(f"{job_id} : {status}"))
@@ -0,0 +1,39 @@
+# middleware.py
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+from .perf import QueryRecorder, record, view_budget
+
+
+class ProfilingMiddleware:
+    """Mesure requêtes SQL et temps de réponse de chaque vue (réglage GUGE_PROFILING).
+
+    Les mesures sont agrégées par nom d'URL (voir perf.py) et renvoyées au
+    navigateur dans l'en-tête Server-Timing.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'GUGE_PROFILING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        if match is not None:
+            view_name = match.view_name or match._func_path
+            record(view_name, duration, recorder, response.status_code, budget=view_budget(match.func))
+
+        response['Server-Timing'] = (
+            f'db;dur={recorder.duration * 1000:.1f};desc="{recorder.count} SQL", '
+            f'total;dur={duration * 1000:.1f}'
+        )
+        return response
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:09
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def fill_missing_updated_at(apps, schema_editor):
+    # Les écoles sans horodatage reçoivent celui de la migration
+    School = apps.get_model('guge_app', 'School')
+    School.objects.filter(updated_at__isnull=True).update(updated_at=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('guge_app', '0022_alter_recolte_answers'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='school',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, null=True),
+        ),
+        migrations.RunPython(fill_missing_updated_at, migrations.RunPython.noop),
+    ]
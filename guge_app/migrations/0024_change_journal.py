@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('guge_app', '0023_school_sync_watermark'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeJournal',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('entity', models.CharField(choices=[('school', 'École'), ('question_template', 'Questionnaire'), ('question', 'Question'), ('groupe', 'Groupe'), ('campaign', 'Campagne')], max_length=30)),
+                ('object_id', models.CharField(max_length=64)),
+                ('action', models.CharField(choices=[('create', 'Création'), ('update', 'Modification'), ('delete', 'Suppression')], max_length=10)),
+                ('data', models.JSONField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='changejournal',
+            index=models.Index(fields=['entity', 'id'], name='journal_entity_seq_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='changejournal',
+            index=models.Index(fields=['entity', 'object_id'], name='journal_entity_object_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('guge_app', '0025_idempotency_record'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Answer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('numeric_value', models.FloatField(blank=True, null=True)),
+                ('text_value', models.TextField(blank=True, null=True)),
+                ('choice_value', models.CharField(blank=True, max_length=255, null=True)),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='answer_rows', to='guge_app.question')),
+                ('recolte', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='answer_rows', to='guge_app.recolte')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['question', 'recolte'], name='answer_question_recolte_idx'), models.Index(fields=['question', 'choice_value'], name='answer_question_choice_idx')],
+            },
+        ),
+    ]
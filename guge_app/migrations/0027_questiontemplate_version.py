@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('guge_app', '0026_answer'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='questiontemplate',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('guge_app', '0027_questiontemplate_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CampaignStats',
+            fields=[
+                ('campaign', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='guge_app.campaign')),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('per_status', models.JSONField(blank=True, default=dict)),
+                ('per_type', models.JSONField(blank=True, default=dict)),
+                ('per_province', models.JSONField(blank=True, default=dict)),
+                ('schools_covered', models.PositiveIntegerField(default=0)),
+                ('schools_in_scope', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
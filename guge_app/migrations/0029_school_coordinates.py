@@ -0,0 +1,88 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:19
+
+from django.db import migrations, models
+
+# Copie figée de guge_app.geo à la date de la migration : le code de
+# l'application peut évoluer, cette migration doit produire le même résultat
+GEOHASH_PRECISION = 9
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def coords_from_geo_coord(geo_coord):
+    if not isinstance(geo_coord, dict):
+        return None, None
+    try:
+        lat = float(geo_coord.get('latitude'))
+        lon = float(geo_coord.get('longitude'))
+    except (TypeError, ValueError):
+        return None, None
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None, None
+    return lat, lon
+
+
+def geohash_encode(lat, lon, precision=GEOHASH_PRECISION):
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, bit_count, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, value = (lon_range, lon) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            rng[0] = mid
+        else:
+            bits <<= 1
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits, bit_count = 0, 0
+    return ''.join(chars)
+
+
+def fill_coordinates(apps, schema_editor):
+    School = apps.get_model('guge_app', 'School')
+    schools = []
+    for school in School.objects.filter(geo_coord__isnull=False).only('id', 'geo_coord').iterator():
+        lat, lon = coords_from_geo_coord(school.geo_coord)
+        school.latitude, school.longitude = lat, lon
+        school.geohash = geohash_encode(lat, lon) if lat is not None else None
+        schools.append(school)
+    School.objects.bulk_update(schools, ['latitude', 'longitude', 'geohash'], batch_size=1000)
+    # bulk_update n'émet pas post_save : les clients synchronisés doivent recevoir les coordonnées
+    ChangeJournal = apps.get_model('guge_app', 'ChangeJournal')
+    ChangeJournal.objects.bulk_create([
+        ChangeJournal(entity='school', object_id=str(school.pk), action='update')
+        for school in schools
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('guge_app', '0028_campaign_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='school',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='school',
+            name='latitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='school',
+            name='longitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='school',
+            index=models.Index(fields=['latitude', 'longitude'], name='school_lat_lon_idx'),
+        ),
+        migrations.RunPython(fill_coordinates, migrations.RunPython.noop),
+    ]
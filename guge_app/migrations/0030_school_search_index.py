@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:02
+
+from django.db import migrations
+
+# Copie figée de guge_app.search à la date de la migration : modifier
+# SEARCH_FIELDS demande une nouvelle migration, pas la réécriture de celle-ci
+SEARCH_FIELDS = ['name', 'adm_code', 'head_name', 'village']
+FTS_TABLE = 'guge_app_school_fts'
+COLUMNS = ', '.join(SEARCH_FIELDS)
+NEW_VALUES = ', '.join(f'new.{field}' for field in SEARCH_FIELDS)
+
+
+def create_fts_index(apps, schema_editor):
+    # Index FTS5 propre à SQLite ; les autres bases utilisent LikeSchoolSearch
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            f"{COLUMNS}, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        cursor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON guge_app_school BEGIN "
+            f"INSERT INTO {FTS_TABLE}(rowid, {COLUMNS}) VALUES (new.id, {NEW_VALUES}); END"
+        )
+        cursor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON guge_app_school BEGIN "
+            f"DELETE FROM {FTS_TABLE} WHERE rowid = old.id; END"
+        )
+        cursor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF {COLUMNS} ON guge_app_school BEGIN "
+            f"DELETE FROM {FTS_TABLE} WHERE rowid = old.id; "
+            f"INSERT INTO {FTS_TABLE}(rowid, {COLUMNS}) VALUES (new.id, {NEW_VALUES}); END"
+        )
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE}(rowid, {COLUMNS}) SELECT id, {COLUMNS} FROM guge_app_school"
+        )
+
+
+def drop_fts_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for suffix in ('ai', 'ad', 'au'):
+            cursor.execute(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}")
+        cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('guge_app', '0029_school_coordinates'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_index, drop_fts_index),
+    ]
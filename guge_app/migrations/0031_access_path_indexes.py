@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('guge_app', '0030_school_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recolte',
+            index=models.Index(fields=['-date', '-id'], name='recolte_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recolte',
+            index=models.Index(fields=['type', '-date', '-id'], name='recolte_type_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recolte',
+            index=models.Index(fields=['status', '-date', '-id'], name='recolte_status_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recolte',
+            index=models.Index(fields=['collector_id', '-date', '-id'], name='recolte_collector_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recolte',
+            index=models.Index(fields=['campaign', 'status'], name='recolte_campaign_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='school',
+            index=models.Index(fields=['-created_at', '-id'], name='school_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('guge_app', '0032_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='campaignstats',
+            name='cube_built_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='CubeCell',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('management_regime', models.CharField(max_length=50)),
+                ('environment', models.CharField(max_length=20)),
+                ('level', models.CharField(max_length=50)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total', models.FloatField(default=0)),
+                ('minimum', models.FloatField(blank=True, null=True)),
+                ('maximum', models.FloatField(blank=True, null=True)),
+                ('campaign', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cube_cells', to='guge_app.campaign')),
+                ('division', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='guge_app.division')),
+                ('province', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='guge_app.province')),
+                ('question', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='guge_app.question')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['campaign', 'question'], name='cube_campaign_question_idx')],
+            },
+        ),
+    ]
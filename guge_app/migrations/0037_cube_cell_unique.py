@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('guge_app', '0036_cache_version'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='cubecell',
+            constraint=models.UniqueConstraint(condition=models.Q(('question__isnull', False)), fields=('campaign', 'question', 'province', 'division', 'management_regime', 'environment', 'level'), name='cube_question_cell_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='cubecell',
+            constraint=models.UniqueConstraint(condition=models.Q(('question__isnull', True)), fields=('campaign', 'province', 'division', 'management_regime', 'environment', 'level'), name='cube_count_cell_unique'),
+        ),
+    ]
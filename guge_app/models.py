@@ -135,10 +135,22 @@ class School(models.Model):
     environment = models.CharField(max_length=20, choices=ENVIRONMENT_CHOICES)
 
     geo_coord = models.JSONField(null=True, blank=True)
+    # Copie indexée de geo_coord, tenue à jour à chaque sauvegarde (requêtes spatiales)
+    latitude = models.FloatField(null=True, blank=True, editable=False)
+    longitude = models.FloatField(null=True, blank=True, editable=False)
+    geohash = models.CharField(max_length=12, null=True, blank=True, editable=False, db_index=True)
     regroupment_center = models.CharField(max_length=255, null=True, blank=True)
 
     created_at = models.DateTimeField(null=True, blank=True)
-    updated_at = models.DateTimeField(null=True, blank=True)
+    # Horodatage informatif ; la synchro incrémentale suit le journal des changements
+    updated_at = models.DateTimeField(auto_now=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["latitude", "longitude"], name="school_lat_lon_idx"),
+            # school_list et pagination par défaut de l'API
+            models.Index(fields=["-created_at", "-id"], name="school_created_id_idx"),
+        ]
 
     def __str__(self):
         return self.name
@@ -157,6 +169,9 @@ class QuestionTemplate(models.Model):
     type = models.CharField(max_length=50, choices=TYPE_CHOICES)
     name = models.CharField(max_length=255)
 
+    # Incrémentée à chaque modification d'une question ou d'un groupe du questionnaire
+    version = models.PositiveIntegerField(default=1)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -245,6 +260,38 @@ class Campaign(models.Model):
     #     now = timezone.now()
     #     return self.start_date <= now <= self.end_date
 
+class CampaignStats(models.Model):
+    """Compteurs d'avancement d'une campagne, tenus à jour à chaque récolte.
+
+    Les ventilations sont des dictionnaires {clé: nombre de récoltes} ;
+    `per_province` est indexé par id de province.
+    """
+
+    campaign = models.OneToOneField(Campaign, on_delete=models.CASCADE, primary_key=True, related_name="stats")
+
+    total = models.PositiveIntegerField(default=0)
+    per_status = models.JSONField(default=dict, blank=True)
+    per_type = models.JSONField(default=dict, blank=True)
+    per_province = models.JSONField(default=dict, blank=True)
+
+    schools_covered = models.PositiveIntegerField(default=0)
+    # Écoles dont le niveau correspond à un questionnaire de la campagne
+    schools_in_scope = models.PositiveIntegerField(default=0)
+    # Dernière construction complète du cube d'indicateurs (vide : cube absent)
+    cube_built_at = models.DateTimeField(null=True, blank=True)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Statistiques - {self.campaign_id}"
+
+    @property
+    def coverage(self):
+        if not self.schools_in_scope:
+            return 0.0
+        return round(100.0 * self.schools_covered / self.schools_in_scope, 1)
+
+
 class Recolte(models.Model):
 
     TYPE_CHOICES = [
@@ -289,5 +336,209 @@ class Recolte(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        # Un index par chemin d'accès des vues (filtre puis tri par date, id pour
+        # la pagination par curseur) ; vérifiés par QueryPlanTests (tests.py)
+        indexes = [
+            models.Index(fields=["-date", "-id"], name="recolte_date_id_idx"),
+            models.Index(fields=["type", "-date", "-id"], name="recolte_type_date_idx"),
+            models.Index(fields=["status", "-date", "-id"], name="recolte_status_date_idx"),
+            models.Index(fields=["collector_id", "-date", "-id"], name="recolte_collector_date_idx"),
+            models.Index(fields=["campaign", "status"], name="recolte_campaign_status_idx"),
+        ]
+
+    def __str__(self):
+        return f"Récolte - {self.establishment.name} - {self.date.date()} ({self.get_status_display()})"
+
+
+class Answer(models.Model):
+    """Réponse typée extraite de Recolte.answers, pour agréger en SQL.
+
+    Maintenue automatiquement à chaque sauvegarde de la récolte ; une question
+    à choix multiples produit une ligne par option cochée.
+    """
+
+    recolte = models.ForeignKey(Recolte, on_delete=models.CASCADE, related_name="answer_rows")
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name="answer_rows")
+
+    numeric_value = models.FloatField(null=True, blank=True)
+    text_value = models.TextField(null=True, blank=True)
+    choice_value = models.CharField(max_length=255, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["question", "recolte"], name="answer_question_recolte_idx"),
+            models.Index(fields=["question", "choice_value"], name="answer_question_choice_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.question_id} : {self.value}"
+
+    @property
+    def value(self):
+        if self.numeric_value is not None:
+            return self.numeric_value
+        if self.choice_value is not None:
+            return self.choice_value
+        return self.text_value
+
+
+class ChangeJournal(models.Model):
+    """Journal append-only des changements, lu par numéro de séquence (id)."""
+
+    ENTITY_CHOICES = [
+        ('school', 'École'),
+        ('question_template', 'Questionnaire'),
+        ('question', 'Question'),
+        ('groupe', 'Groupe'),
+        ('campaign', 'Campagne'),
+    ]
+
+    ACTION_CHOICES = [
+        ('create', 'Création'),
+        ('update', 'Modification'),
+        ('delete', 'Suppression'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+
+    entity = models.CharField(max_length=30, choices=ENTITY_CHOICES)
+    object_id = models.CharField(max_length=64)
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    # Clé naturelle de l'objet supprimé (ex. adm_code), l'objet n'existant plus
+    data = models.JSONField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=["entity", "id"], name="journal_entity_seq_idx"),
+            models.Index(fields=["entity", "object_id"], name="journal_entity_object_idx"),
+        ]
+
+    def __str__(self):
+        return f"#{self.id} {self.action} {self.entity} {self.object_id}"
+
+
+class IdempotencyRecord(models.Model):
+    """Réponse mémorisée d'une requête d'écriture identifiée par l'en-tête Idempotency-Key."""
+
+    key = models.CharField(max_length=255)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    # Empreinte de la requête : une même clé ne peut pas servir à deux contenus différents
+    fingerprint = models.CharField(max_length=64)
+
+    # Vide tant que la requête est en cours de traitement
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response = models.JSONField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        unique_together = ("user", "key")
+
+    def __str__(self):
+        return f"{self.key} ({self.status_code or 'en cours'})"
+
+
+class CacheVersion(models.Model):
+    """Version d'un contenu mis en cache par processus (arbre, index, statistiques).
+
+    Incrémentée dans la transaction qui modifie les données : tous les
+    processus voient le changement, quel que soit le cache configuré.
+    """
+
+    name = models.CharField(max_length=100, primary_key=True)
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} v{self.version}"
+
+
+class Job(models.Model):
+    """Traitement long (export, PDF, statistiques) exécuté hors requête par la commande run_jobs."""
+
+    STATUS_CHOICES = [
+        ('en_attente', 'En attente'),
+        ('en_cours', 'En cours'),
+        ('termine', 'Terminé'),
+        ('echec', 'Échec'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+
+    # Nom du traitement enregistré dans jobs.JOB_KINDS
+    kind = models.CharField(max_length=50)
+    params = models.JSONField(default=dict, blank=True)
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='en_attente')
+    progress = models.PositiveSmallIntegerField(default=0)
+    message = models.CharField(max_length=255, blank=True)
+    result = models.FileField(upload_to='jobs/', null=True, blank=True)
+    error = models.TextField(blank=True)
+    # Worker (hôte:pid de run_jobs) qui exécute le travail ; updated_at sert de battement de cœur
+    worker = models.CharField(max_length=100, blank=True)
+
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="jobs")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # File d'attente : plus ancien travail en attente d'abord
+            models.Index(fields=["status", "created_at"], name="job_status_created_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} ({self.get_status_display()}, {self.progress} %)"
+
+    @property
+    def is_finished(self):
+        return self.status in ('termine', 'echec')
+
+
+class CubeCell(models.Model):
+    """Cellule du cube d'indicateurs d'une campagne (voir cube.py).
+
+    Une cellule agrège les récoltes validées d'un croisement province x
+    division x régime de gestion x milieu x niveau. Les mesures sont
+    additives (nombre, somme, minimum, maximum) pour permettre le cumul vers
+    les niveaux supérieurs ; `question` vide : nombre de récoltes.
+    """
+
+    campaign = models.ForeignKey(Campaign, on_delete=models.CASCADE, related_name="cube_cells")
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, null=True, blank=True, db_index=False)
+
+    province = models.ForeignKey(Province, on_delete=models.CASCADE, db_index=False)
+    division = models.ForeignKey(Division, on_delete=models.CASCADE, db_index=False)
+    management_regime = models.CharField(max_length=50)
+    environment = models.CharField(max_length=20)
+    level = models.CharField(max_length=50)
+
+    count = models.PositiveIntegerField(default=0)
+    total = models.FloatField(default=0)
+    minimum = models.FloatField(null=True, blank=True)
+    maximum = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["campaign", "question"], name="cube_campaign_question_idx"),
+        ]
+        # Une seule cellule par coordonnées ; `question` vide est traité à part (NULL distincts en SQL)
+        constraints = [
+            models.UniqueConstraint(
+                fields=["campaign", "question", "province", "division", "management_regime", "environment", "level"],
+                condition=models.Q(question__isnull=False), name="cube_question_cell_unique",
+            ),
+            models.UniqueConstraint(
+                fields=["campaign", "province", "division", "management_regime", "environment", "level"],
+                condition=models.Q(question__isnull=True), name="cube_count_cell_unique",
+            ),
+        ]
+
     def __str__(self):
-        return f"Récolte - {self.establishment.name} - {self.date.date()} ({self.get_status_display()})"
\ No newline at end of file
+        return f"{self.campaign_id} / {self.question_id} / {self.province_id}-{self.division_id} ({self.count})"
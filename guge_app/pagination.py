@@ -0,0 +1,214 @@
+# pagination.py
+"""Pagination par curseur (keyset) des listes de l'API et des pages HTML.
+
+La position est la valeur des colonnes de tri de la dernière ligne lue, id
+compris : la page suivante est une requête « WHERE (tri, id) > position »
+servie par l'index, sans COUNT(*) ni OFFSET, quelle que soit sa profondeur.
+Les valeurs NULL sont traitées comme les plus petites.
+"""
+import datetime
+import decimal
+import operator
+import uuid
+from collections import namedtuple
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from .sync import encode_cursor, load_cursor, InvalidCursor
+
+DEFAULT_ORDERING = ('-created_at', '-id')
+
+OrderField = namedtuple('OrderField', 'name descending')
+
+
+def keyset_ordering(queryset, default=DEFAULT_ORDERING):
+    """Champs de tri de la requête (ou `default`), terminés par l'id pour un ordre total."""
+    ordering = [o for o in queryset.query.order_by if isinstance(o, str)] or list(default)
+    fields = [OrderField(o.lstrip('-'), o.startswith('-')) for o in ordering]
+    if not any(f.name in ('id', 'pk') for f in fields):
+        fields.append(OrderField('id', fields[-1].descending if fields else False))
+    return fields
+
+
+def _nullable(model, name):
+    try:
+        return model._meta.get_field(name).null
+    except FieldDoesNotExist:
+        # Annotation (ex. classement de la recherche)
+        return False
+
+
+def _order_by(model, fields):
+    expressions = []
+    for field in fields:
+        expression = F(field.name)
+        if _nullable(model, field.name):
+            # NULL en tête dans l'ordre croissant, en fin dans l'ordre décroissant
+            expressions.append(expression.desc(nulls_last=True) if field.descending else expression.asc(nulls_first=True))
+        else:
+            expressions.append(expression.desc() if field.descending else expression.asc())
+    return expressions
+
+
+def _beyond(field, value):
+    """Lignes situées strictement après `value` dans l'ordre de `field`."""
+    if field.descending:
+        if value is None:
+            return None
+        return Q(**{f'{field.name}__lt': value}) | Q(**{f'{field.name}__isnull': True})
+    if value is None:
+        return Q(**{f'{field.name}__isnull': False})
+    return Q(**{f'{field.name}__gt': value})
+
+
+def _equal(field, value):
+    if value is None:
+        return Q(**{f'{field.name}__isnull': True})
+    return Q(**{field.name: value})
+
+
+def after_position(queryset, fields, values):
+    """Filtre lexicographique (f1, ..., fn) > (v1, ..., vn) selon le sens de chaque champ."""
+    condition, prefix = Q(pk__in=[]), Q()
+    for field, value in zip(fields, values):
+        beyond = _beyond(field, value)
+        if beyond is not None:
+            condition |= prefix & beyond
+        prefix &= _equal(field, value)
+    return queryset.filter(condition)
+
+
+def keyset_queryset(queryset, fields, position=None, page_size=50):
+    """Requête d'une page (plus une ligne, pour savoir s'il y a une suite)."""
+    if position is not None:
+        queryset = after_position(queryset, fields, position)
+    return queryset.order_by(*_order_by(queryset.model, fields))[:page_size + 1]
+
+
+def _reverse(fields):
+    return [OrderField(f.name, not f.descending) for f in fields]
+
+
+def _cursor_value(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, (uuid.UUID, decimal.Decimal)):
+        return str(value)
+    return value
+
+
+def _position(obj, fields):
+    return [_cursor_value(operator.attrgetter(f.name.replace('__', '.'))(obj)) for f in fields]
+
+
+class KeysetPage(list):
+    """Page de résultats avec les curseurs des pages voisines."""
+    is_cursor = True
+    next_cursor = None
+    previous_cursor = None
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+def keyset_page(queryset, cursor=None, page_size=50, default_ordering=DEFAULT_ORDERING):
+    """Page de `queryset` après (ou avant) la position du curseur.
+
+    Lève InvalidCursor si le curseur est illisible ou provient d'un autre tri.
+    """
+    fields = keyset_ordering(queryset, default_ordering)
+    signature = ','.join(('-' if f.descending else '') + f.name for f in fields)
+    reverse = False
+    if cursor:
+        position = load_cursor(cursor)
+        if not isinstance(position, dict) or position.get('o') != signature \
+                or len(position.get('p') or []) != len(fields):
+            raise InvalidCursor(cursor)
+        reverse = bool(position.get('r'))
+        read_fields = _reverse(fields) if reverse else fields
+        rows = list(keyset_queryset(queryset, read_fields, position['p'], page_size))
+    else:
+        rows = list(keyset_queryset(queryset, fields, page_size=page_size))
+    more = len(rows) > page_size
+    rows = rows[:page_size]
+    if reverse:
+        rows.reverse()
+
+    page = KeysetPage(rows)
+    if rows:
+        first = encode_cursor({'o': signature, 'p': _position(rows[0], fields), 'r': 1})
+        last = encode_cursor({'o': signature, 'p': _position(rows[-1], fields)})
+        if reverse:
+            page.previous_cursor = first if more else None
+            page.next_cursor = last
+        else:
+            page.previous_cursor = first if cursor else None
+            page.next_cursor = last if more else None
+    return page
+
+
+class KeysetPagination(BasePagination):
+    """Pagination par curseur des viewsets.
+
+    Le tri est celui de la requête (OrderingFilter, classement de la
+    recherche) ou, à défaut, `keyset_ordering` de la vue, puis
+    DEFAULT_ORDERING ; il doit porter sur des colonnes indexées.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = 50
+    max_page_size = 500
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            size = self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        default = getattr(view, 'keyset_ordering', DEFAULT_ORDERING)
+        try:
+            self.page = keyset_page(
+                queryset,
+                cursor=request.query_params.get(self.cursor_query_param),
+                page_size=self.get_page_size(request),
+                default_ordering=default,
+            )
+        except InvalidCursor:
+            raise NotFound("Curseur invalide.")
+        return list(self.page)
+
+    def _link(self, cursor):
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self._link(self.page.next_cursor),
+            'previous': self._link(self.page.previous_cursor),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True},
+                'previous': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,162 @@
+# pdf.py
+"""Écriture PDF minimale en pur Python : texte sur pages A4, polices standard.
+
+Suffisant pour des documents textuels (fiches SIGE) sans dépendance
+externe : Helvetica et Helvetica-Bold, encodage WinAnsi (accents
+français), retour à la ligne automatique et flux de page compressés.
+"""
+import zlib
+from functools import lru_cache
+
+PAGE_WIDTH = 595.0
+PAGE_HEIGHT = 842.0
+MARGIN = 50.0
+
+# Largeurs Helvetica (millièmes de corps) des caractères qui s'écartent de la valeur par défaut
+_DEFAULT_WIDTH = 556
+_WIDTHS = {
+    **dict.fromkeys(' !,./:;I[\\]fijlt|', 278),
+    **dict.fromkeys('"()-`r{}', 333),
+    **dict.fromkeys("'", 191),
+    **dict.fromkeys('*^', 389),
+    **dict.fromkeys('+<=>~', 584),
+    **dict.fromkeys('cksvxyzJ', 500),
+    **dict.fromkeys('ABEKPSVXY', 667),
+    **dict.fromkeys('CDHNRUw', 722),
+    **dict.fromkeys('GOQ', 778),
+    **dict.fromkeys('FTZL', 611),
+    **dict.fromkeys('%', 889),
+    **dict.fromkeys('Mm', 833),
+    **dict.fromkeys('@', 1015),
+    'W': 944,
+}
+
+
+def _measure(text):
+    return sum(_WIDTHS.get(char, _DEFAULT_WIDTH) for char in text)
+
+
+def _scale(size, bold):
+    # Le gras est légèrement plus large : marge suffisante pour le retour à la ligne
+    return size / 1000.0 * (1.06 if bold else 1.0)
+
+
+# Les libellés des questions se répètent d'une fiche à l'autre : mesures et
+# découpages sont mémorisés pour la durée du processus
+@lru_cache(maxsize=8192)
+def text_width(text, size, bold=False):
+    return _measure(text) * _scale(size, bold)
+
+
+@lru_cache(maxsize=8192)
+def wrap(text, size, max_width, bold=False):
+    """Découpe `text` en lignes tenant dans `max_width` points (tuple)."""
+    limit = max_width / _scale(size, bold)
+    space = _WIDTHS[' ']
+    lines = []
+    for paragraph in str(text).splitlines() or ['']:
+        line, width = '', 0
+        for word in paragraph.split(' '):
+            word_width = _measure(word)
+            if not line:
+                line, width = word, word_width
+            elif width + space + word_width > limit:
+                lines.append(line)
+                line, width = word, word_width
+            else:
+                line, width = f'{line} {word}', width + space + word_width
+        lines.append(line)
+    return tuple(lines)
+
+
+@lru_cache(maxsize=8192)
+def _escape(text):
+    data = text.encode('cp1252', 'replace')
+    return data.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+
+
+class PDFWriter:
+    """Document PDF construit ligne par ligne, du haut vers le bas des pages."""
+
+    def __init__(self, title=''):
+        self.title = title
+        self.pages = []
+        self._ops = None
+        self._y = 0.0
+        self.new_page()
+
+    def new_page(self):
+        self._ops = []
+        self.pages.append(self._ops)
+        self._y = PAGE_HEIGHT - MARGIN
+
+    def _reserve(self, height):
+        if self._y - height < MARGIN:
+            self.new_page()
+        self._y -= height
+
+    def text(self, text, size=10, bold=False, indent=0.0, space_before=0.0):
+        """Paragraphe avec retour à la ligne automatique."""
+        self._y -= space_before
+        leading = size * 1.3
+        font = b'F2' if bold else b'F1'
+        for line in wrap(text, size, PAGE_WIDTH - 2 * MARGIN - indent, bold):
+            self._reserve(leading)
+            self._ops.append(b'BT /%s %.1f Tf %.2f %.2f Td (%s) Tj ET' % (
+                font, size, MARGIN + indent, self._y, _escape(line)))
+
+    def field(self, label, value, size=10):
+        """Ligne « libellé : valeur », libellé en gras, valeur en retrait si elle déborde."""
+        label = f'{label} :'
+        label_width = text_width(label + ' ', size, bold=True)
+        available = PAGE_WIDTH - 2 * MARGIN
+        if label_width > available / 2:
+            self.text(label, size, bold=True, space_before=2)
+            self.text(value, size, indent=12)
+            return
+        lines = wrap(value, size, available - label_width)
+        leading = size * 1.3
+        self._y -= 2
+        for number, line in enumerate(lines):
+            self._reserve(leading)
+            if number == 0:
+                self._ops.append(b'BT /F2 %.1f Tf %.2f %.2f Td (%s) Tj ET' % (size, MARGIN, self._y, _escape(label)))
+            self._ops.append(b'BT /F1 %.1f Tf %.2f %.2f Td (%s) Tj ET' % (
+                size, MARGIN + label_width, self._y, _escape(line)))
+
+    def rule(self, space=6.0):
+        self._reserve(space)
+        self._ops.append(b'0.6 G %.2f %.2f m %.2f %.2f l S 0 G' % (MARGIN, self._y, PAGE_WIDTH - MARGIN, self._y))
+        self._y -= space
+
+    def render(self):
+        """Octets du document."""
+        objects = [
+            b'<< /Type /Catalog /Pages 2 0 R >>',
+            None,  # arbre des pages, complété quand les numéros d'objets sont connus
+            b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>',
+            b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>',
+            b'<< /Title (%s) /Producer (GUGE) >>' % _escape(self.title),
+        ]
+        page_refs = []
+        for ops in self.pages:
+            content = zlib.compress(b'\n'.join(ops))
+            objects.append(b'<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream' % (len(content), content))
+            objects.append(
+                b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] '
+                b'/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents %d 0 R >>'
+                % (PAGE_WIDTH, PAGE_HEIGHT, len(objects))
+            )
+            page_refs.append(b'%d 0 R' % len(objects))
+        objects[1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (b' '.join(page_refs), len(page_refs))
+
+        out = bytearray(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(len(out))
+            out += b'%d 0 obj\n%s\nendobj\n' % (number, body)
+        xref = len(out)
+        out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+        out += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+        out += b'trailer\n<< /Size %d /Root 1 0 R /Info 5 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+        return bytes(out)
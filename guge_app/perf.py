@@ -0,0 +1,158 @@
+# perf.py
+"""Mesures de performance par vue : requêtes SQL, temps SQL et temps de réponse.
+
+Les mesures sont collectées par ProfilingMiddleware (activé par le réglage
+GUGE_PROFILING) et agrégées en mémoire, par processus et par nom d'URL. Une
+vue peut déclarer son budget de requêtes avec @query_budget(n) : les
+dépassements sont comptés ici et font échouer les tests (voir testing.py).
+"""
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+
+
+def query_budget(max_queries):
+    """Déclare le nombre maximal de requêtes SQL d'une vue (décorateur le plus externe).
+
+    Le budget compte aussi les requêtes de session et d'authentification.
+    """
+    def decorator(view):
+        view.query_budget = max_queries
+        return view
+    return decorator
+
+
+def view_budget(view):
+    """Budget déclaré par une vue fonction ou un viewset (attribut query_budget)."""
+    budget = getattr(view, 'query_budget', None)
+    if budget is None:
+        budget = getattr(getattr(view, 'cls', None), 'query_budget', None)
+    return budget
+
+
+class QueryRecorder:
+    """execute_wrapper qui chronomètre chaque requête et repère les doublons."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+        self.executions = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.statements[sql] += 1
+            try:
+                self.executions[(sql, repr(params))] += 1
+            except Exception:
+                pass
+
+    @property
+    def duplicates(self):
+        """Exécutions répétées à l'identique (même requête, mêmes paramètres)."""
+        return sum(n - 1 for n in self.executions.values() if n > 1)
+
+    def most_repeated(self):
+        """(requête, nombre) la plus répétée avec des paramètres différents : signe d'un N+1."""
+        if not self.statements:
+            return None, 0
+        return self.statements.most_common(1)[0]
+
+
+@dataclass
+class ViewStats:
+    requests: int = 0
+    duration: float = 0.0
+    max_duration: float = 0.0
+    queries: int = 0
+    max_queries: int = 0
+    sql_duration: float = 0.0
+    duplicates: int = 0
+    over_budget: int = 0
+    budget: int = None
+    repeated_sql: str = ''
+    repeated_count: int = 0
+    statuses: Counter = field(default_factory=Counter)
+
+    @property
+    def avg_duration_ms(self):
+        return round(1000 * self.duration / self.requests, 1) if self.requests else 0
+
+    @property
+    def max_duration_ms(self):
+        return round(1000 * self.max_duration, 1)
+
+    @property
+    def avg_queries(self):
+        return round(self.queries / self.requests, 1) if self.requests else 0
+
+    @property
+    def avg_sql_ms(self):
+        return round(1000 * self.sql_duration / self.requests, 1) if self.requests else 0
+
+
+_stats = {}
+_lock = threading.Lock()
+
+
+def record(view_name, duration, recorder, status_code, budget=None):
+    with _lock:
+        stats = _stats.setdefault(view_name, ViewStats())
+        stats.requests += 1
+        stats.duration += duration
+        stats.max_duration = max(stats.max_duration, duration)
+        stats.queries += recorder.count
+        stats.max_queries = max(stats.max_queries, recorder.count)
+        stats.sql_duration += recorder.duration
+        stats.duplicates += recorder.duplicates
+        stats.budget = budget
+        if budget is not None and recorder.count > budget:
+            stats.over_budget += 1
+        sql, count = recorder.most_repeated()
+        if count > stats.repeated_count:
+            stats.repeated_sql, stats.repeated_count = sql, count
+        stats.statuses[status_code] += 1
+
+
+def snapshot():
+    """Copie triée (vue la plus coûteuse en premier) des statistiques."""
+    with _lock:
+        items = [(name, ViewStats(**{**vars(s), 'statuses': Counter(s.statuses)})) for name, s in _stats.items()]
+    return sorted(items, key=lambda item: item[1].duration, reverse=True)
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+
+def prometheus_text():
+    """Statistiques au format texte d'exposition Prometheus."""
+    metrics = [
+        ('guge_view_requests_total', 'counter', 'Requêtes servies', lambda s: s.requests),
+        ('guge_view_duration_seconds_sum', 'counter', 'Temps de réponse cumulé', lambda s: round(s.duration, 6)),
+        ('guge_view_duration_seconds_max', 'gauge', 'Temps de réponse maximal', lambda s: round(s.max_duration, 6)),
+        ('guge_view_queries_total', 'counter', 'Requêtes SQL exécutées', lambda s: s.queries),
+        ('guge_view_queries_max', 'gauge', 'Requêtes SQL maximales pour une réponse', lambda s: s.max_queries),
+        ('guge_view_sql_seconds_sum', 'counter', 'Temps SQL cumulé', lambda s: round(s.sql_duration, 6)),
+        ('guge_view_duplicate_queries_total', 'counter', 'Requêtes SQL répétées à l\'identique', lambda s: s.duplicates),
+        ('guge_view_query_budget_exceeded_total', 'counter', 'Réponses au-delà du budget de requêtes', lambda s: s.over_budget),
+    ]
+    stats = snapshot()
+    lines = []
+    for name, kind, help_text, value in metrics:
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for view_name, view_stats in stats:
+            lines.append(f'{name}{{view="{_label(view_name)}"}} {value(view_stats)}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,52 @@
+# renderers.py
+import json
+
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.renderers import BaseRenderer
+
+
+class ExportContentNegotiation(DefaultContentNegotiation):
+    """?format= inconnu : réponse JSON, pour que la vue signale l'erreur (400) au lieu du 404 de DRF."""
+
+    def filter_renderers(self, renderers, format):
+        return (
+            [renderer for renderer in renderers if renderer.format == format]
+            or [renderer for renderer in renderers if renderer.format == 'json']
+        )
+
+
+def content_negotiation(negotiation_class):
+    """Décorateur de vue @api_view, sur le modèle de @renderer_classes."""
+    def decorator(func):
+        func.content_negotiation_class = negotiation_class
+        return func
+    return decorator
+
+
+class ExportRenderer(BaseRenderer):
+    """Déclare un format d'export accepté par ?format= (sinon ExportContentNegotiation répond en JSON).
+
+    Le contenu est produit par la vue en StreamingHttpResponse ; seules les
+    réponses d'erreur passent par render().
+    """
+
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, ensure_ascii=False).encode("utf-8")
+
+
+class CSVRenderer(ExportRenderer):
+    media_type = "text/csv"
+    format = "csv"
+
+
+class JSONLinesRenderer(ExportRenderer):
+    media_type = "application/x-ndjson"
+    format = "jsonl"
+
+
+class XLSXRenderer(ExportRenderer):
+    media_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    format = "xlsx"
+    charset = None
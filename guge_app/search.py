@@ -0,0 +1,134 @@
+# search.py
+"""Recherche plein texte des écoles.
+
+Le moteur est choisi par le réglage GUGE_SCHOOL_SEARCH_BACKEND (chemin
+pointé d'une classe) ; par défaut, FTS5 sur SQLite et une recherche LIKE sur
+les autres bases. Sous SQLite, la table virtuelle guge_app_school_fts est
+tenue à jour par des triggers (migration 0030), y compris pour les
+modifications faites par QuerySet.update().
+"""
+import re
+import unicodedata
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+from rest_framework.filters import BaseFilterBackend
+from rest_framework.settings import api_settings
+
+SEARCH_FIELDS = ['name', 'adm_code', 'head_name', 'village']
+FTS_TABLE = 'guge_app_school_fts'
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def normalize(text):
+    """Minuscules sans accents : « École Sainte-Thérèse » -> « ecole sainte-therese »."""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def search_terms(query):
+    return _TOKEN_RE.findall(normalize(query))
+
+
+class SchoolSearchBackend:
+    """Interface d'un moteur de recherche des écoles."""
+
+    def filter(self, queryset, query):
+        """Écoles correspondant à tous les mots de `query`."""
+        raise NotImplementedError
+
+    def rank(self, queryset, query):
+        """Même filtre, trié par pertinence décroissante."""
+        return self.filter(queryset, query)
+
+    def rebuild(self):
+        pass
+
+
+class LikeSchoolSearch(SchoolSearchBackend):
+    """Recherche sans index : chaque mot doit apparaître dans l'un des champs."""
+
+    def filter(self, queryset, query):
+        # Les colonnes ne sont pas normalisées : les mots sont cherchés tels quels
+        for term in _TOKEN_RE.findall(query):
+            condition = Q()
+            for field in SEARCH_FIELDS:
+                condition |= Q(**{f'{field}__icontains': term})
+            queryset = queryset.filter(condition)
+        return queryset
+
+
+class SQLiteFTSSchoolSearch(SchoolSearchBackend):
+    """Index FTS5 (tokenizer unicode61 sans diacritiques), classement bm25."""
+
+    # Poids bm25 des colonnes, dans l'ordre de SEARCH_FIELDS
+    weights = (10.0, 8.0, 2.0, 1.0)
+
+    def match_expression(self, query):
+        terms = search_terms(query)
+        if not terms:
+            return None
+        # Chaque mot est une chaîne FTS entre guillemets, en préfixe pour la saisie au fil de l'eau
+        return ' '.join(f'"{term}"*' for term in terms)
+
+    def filter(self, queryset, query):
+        match = self.match_expression(query)
+        if match is None:
+            return queryset
+        return queryset.filter(id__in=RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', (match,)
+        ))
+
+    def rank(self, queryset, query):
+        match = self.match_expression(query)
+        if match is None:
+            return queryset
+        weights = ', '.join(str(w) for w in self.weights)
+        table = queryset.model._meta.db_table
+        score = RawSQL(
+            f'SELECT bm25({FTS_TABLE}, {weights}) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = {table}.id',
+            (match,),
+        )
+        return self.filter(queryset, query).annotate(search_rank=score).order_by('search_rank', 'id')
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            rebuild_fts_index(cursor)
+
+
+def rebuild_fts_index(cursor):
+    columns = ', '.join(SEARCH_FIELDS)
+    cursor.execute(f'DELETE FROM {FTS_TABLE}')
+    cursor.execute(
+        f'INSERT INTO {FTS_TABLE}(rowid, {columns}) SELECT id, {columns} FROM guge_app_school'
+    )
+
+
+def get_search_backend():
+    path = getattr(settings, 'GUGE_SCHOOL_SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)()
+    if connection.vendor == 'sqlite':
+        return SQLiteFTSSchoolSearch()
+    return LikeSchoolSearch()
+
+
+class SchoolSearchFilter(BaseFilterBackend):
+    """Remplace SearchFilter pour les écoles : même paramètre `search`, servi par l'index.
+
+    Les résultats sont triés par pertinence, sauf si un tri explicite est demandé.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(api_settings.SEARCH_PARAM, '').strip()
+        if not query:
+            return queryset
+        backend = get_search_backend()
+        if request.query_params.get(api_settings.ORDERING_PARAM):
+            return backend.filter(queryset, query)
+        return backend.rank(queryset, query)
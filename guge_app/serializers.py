@@ -1,9 +1,55 @@
 # serializers.py
 from rest_framework import serializers
-from .models import School, Question, QuestionTemplate, Recolte, Groupe, Campaign
+from .models import School, ChangeJournal, Question, QuestionTemplate, Recolte, Groupe, Campaign, Job
+from django.urls import reverse
 from django.contrib.auth.models import User
+from .stats import campaign_stats, campaign_stats_summary, province_names
 
-class SchoolSerializer(serializers.ModelSerializer):
+def requested_fields(request, param):
+    """Valeurs d'un paramètre de liste (`?fields=a,b` ou `?fields=a&fields=b`)."""
+    if request is None:
+        return set()
+    return {f.strip() for value in request.query_params.getlist(param) for f in value.split(",") if f.strip()}
+
+
+def is_expanded(context, field):
+    """Un champ imbriqué lourd est inclus sur les vues détail ou via `?expand=`."""
+    view = context.get("view")
+    if getattr(view, "action", None) == "retrieve":
+        return True
+    expand = requested_fields(context.get("request"), "expand")
+    return field in expand or "all" in expand
+
+
+class SparseFieldsMixin:
+    """Champs à la demande pour les API : `?fields=` et `?expand=`.
+
+    `expandable_fields` associe chaque champ imbriqué lourd à sa forme
+    compacte (ou None pour l'omettre) utilisée par défaut dans les listes.
+    Sans requête dans le contexte (usage interne), toutes les données sont rendues.
+    """
+    expandable_fields = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get("request")
+        if request is None:
+            return
+
+        for name, compact in self.expandable_fields.items():
+            if name in self.fields and not is_expanded(self.context, name):
+                if compact is None:
+                    self.fields.pop(name)
+                else:
+                    self.fields[name] = compact()
+
+        only = requested_fields(request, "fields")
+        if only:
+            for name in set(self.fields) - only:
+                self.fields.pop(name)
+
+
+class SchoolSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     province_name = serializers.CharField(source="province.name", read_only=True)
     division_name = serializers.CharField(source="division.name", read_only=True)
     sub_division_name = serializers.CharField(source="sub_division.name", read_only=True)
@@ -17,6 +63,23 @@ class SchoolSyncSerializer(serializers.ModelSerializer):
         model = School
         fields = ["adm_code", "updated_at"]
 
+class SchoolTombstoneSerializer(serializers.ModelSerializer):
+    """Représente une suppression d'école du journal comme un tombstone."""
+    id = serializers.IntegerField(source="object_id")
+    adm_code = serializers.CharField(source="data.adm_code", default=None)
+    deleted_at = serializers.DateTimeField(source="created_at")
+
+    class Meta:
+        model = ChangeJournal
+        fields = ["id", "adm_code", "deleted_at"]
+
+class ChangeJournalSerializer(serializers.ModelSerializer):
+    seq = serializers.IntegerField(source="id")
+
+    class Meta:
+        model = ChangeJournal
+        fields = ["seq", "entity", "object_id", "action", "data", "created_at"]
+
 class GroupeInfoSerializer(serializers.ModelSerializer):
     """Serializer used to represent group info as a simple dict."""
     class Meta:
@@ -57,7 +120,27 @@ class GroupeSerializer(serializers.ModelSerializer):
         ]
 
 
-class QuestionTemplateSerializer(serializers.ModelSerializer):
+class QuestionTemplateSummarySerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """Questionnaire sans son arbre de questions."""
+    question_count = serializers.SerializerMethodField()
+
+    class Meta:
+        model = QuestionTemplate
+        fields = [
+            "id",
+            "name",
+            "type",
+            "version",
+            "question_count",
+        ]
+
+    def get_question_count(self, obj):
+        # annoté par la vue quand c'est possible, pour éviter une requête par questionnaire
+        count = getattr(obj, "nb_questions", None)
+        return count if count is not None else obj.questions.count()
+
+
+class QuestionTemplateSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     questions = QuestionSerializer(many=True, read_only=True)
 
@@ -67,11 +150,12 @@ class QuestionTemplateSerializer(serializers.ModelSerializer):
             "id",
             "name",
             "type",
+            "version",
             "questions",
         ]
 
-class CampaignSerializer(serializers.ModelSerializer):
-    # read nested
+class CampaignSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    # read nested (arbre complet sur le détail ou avec ?expand=question_templates)
     question_templates = QuestionTemplateSerializer(many=True, read_only=True)
     # allow writing by PK
     question_template_ids = serializers.PrimaryKeyRelatedField(
@@ -82,6 +166,11 @@ class CampaignSerializer(serializers.ModelSerializer):
         required=False,
     )
     recolte_count = serializers.SerializerMethodField()
+    stats = serializers.SerializerMethodField()
+
+    expandable_fields = {
+        "question_templates": lambda: QuestionTemplateSummarySerializer(many=True, read_only=True),
+    }
 
     class Meta:
         model = Campaign
@@ -94,19 +183,61 @@ class CampaignSerializer(serializers.ModelSerializer):
             "question_templates",
             "question_template_ids",
             "recolte_count",
+            "stats",
             "created_at",
             "updated_at",
         ]
 
     def get_recolte_count(self, obj):
-        return obj.recoltes.count()
+        return campaign_stats(obj).total
+
+    def get_stats(self, obj):
+        # Noms des provinces lus une fois pour toute la liste (contexte partagé)
+        if "province_names" not in self.context:
+            self.context["province_names"] = province_names()
+        return campaign_stats_summary(campaign_stats(obj), self.context["province_names"])
 
 
 class RecolteSerializer(serializers.ModelSerializer):
+    # l'identifiant peut être généré par le client pour rendre les envois rejouables
+    id = serializers.UUIDField(required=False)
+
     class Meta:
         model = Recolte
         fields = "__all__"
 
+    def update(self, instance, validated_data):
+        validated_data.pop("id", None)
+        return super().update(instance, validated_data)
+
+class RecolteBulkItemSerializer(serializers.Serializer):
+    """Récolte d'un envoi groupé ; les clés étrangères sont résolues en lot par la vue."""
+    id = serializers.UUIDField(required=False)
+    establishment = serializers.IntegerField()
+    campaign = serializers.UUIDField(required=False, allow_null=True)
+    collector_id = serializers.IntegerField(required=False, allow_null=True)
+    date = serializers.DateTimeField()
+    notes = serializers.CharField(required=False, allow_blank=True, default="")
+    type = serializers.ChoiceField(choices=Recolte.TYPE_CHOICES)
+    answers = serializers.JSONField(required=False, allow_null=True, default=list)
+    status = serializers.ChoiceField(choices=Recolte.STATUS_CHOICES, required=False, default="en_attente")
+
+class JobSerializer(serializers.ModelSerializer):
+    """État d'un travail ; `result_url` pointe vers le téléchargement authentifié du résultat."""
+    result_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Job
+        fields = ["id", "kind", "params", "status", "progress", "message", "result_url",
+                  "created_at", "started_at", "finished_at"]
+
+    def get_result_url(self, obj):
+        if obj.status != "termine" or not obj.result:
+            return None
+        url = reverse("job_result", args=[obj.pk])
+        request = self.context.get("request")
+        return request.build_absolute_uri(url) if request else url
+
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
@@ -0,0 +1,314 @@
+from contextlib import contextmanager
+
+from django.db.models import F
+from django.db.models.signals import pre_save, post_save, post_delete, pre_delete, m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import School, QuestionTemplate, Question, Groupe, Campaign, CampaignStats, ChangeJournal, Recolte
+from .answers import sync_answers
+from .cube import refresh_cube_cells, refresh_school_cells
+from .autocomplete import MODEL_ENTITIES, invalidate_autocomplete
+from .geo import sync_school_coordinates
+from .hierarchy import HIERARCHY_MODELS, invalidate_geo_hierarchy
+from .stats import (
+    invalidate_dashboard_stats, invalidate_question_stats, invalidate_school_question_stats, SCHOOL_GROUP_FIELDS,
+    apply_recolte_deltas, apply_recolte_changes, recolte_stats_key, STATS_KEY_FIELDS, schools_in_scope, update_school_scope, move_school_province,
+)
+
+JOURNALED_MODELS = {
+    School: 'school',
+    QuestionTemplate: 'question_template',
+    Question: 'question',
+    Groupe: 'groupe',
+    Campaign: 'campaign',
+}
+
+
+def journal_data(instance):
+    """Clé naturelle conservée avec la suppression (l'objet n'existe plus ensuite)."""
+    if isinstance(instance, School):
+        return {'adm_code': instance.adm_code}
+    return None
+
+
+def journal_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    ChangeJournal.objects.create(
+        entity=JOURNALED_MODELS[sender],
+        object_id=str(instance.pk),
+        action='create' if created else 'update',
+    )
+
+
+def journal_delete(sender, instance, **kwargs):
+    ChangeJournal.objects.create(
+        entity=JOURNALED_MODELS[sender],
+        object_id=str(instance.pk),
+        action='delete',
+        data=journal_data(instance),
+    )
+
+
+def journal_deletions(queryset):
+    """Entrées de suppression du journal pour les objets de `queryset` (avant leur suppression en masse)."""
+    entity = JOURNALED_MODELS[queryset.model]
+    fields = ['pk', 'adm_code'] if queryset.model is School else ['pk']
+    ChangeJournal.objects.bulk_create([
+        ChangeJournal(
+            entity=entity, object_id=str(row[0]), action='delete',
+            data={'adm_code': row[1]} if len(row) > 1 else None,
+        )
+        for row in queryset.values_list(*fields).iterator(chunk_size=2000)
+    ], batch_size=2000)
+
+
+def journal_creations(objects):
+    """Entrées de création du journal pour des objets insérés par bulk_create (qui n'émet pas post_save)."""
+    ChangeJournal.objects.bulk_create([
+        ChangeJournal(entity=JOURNALED_MODELS[type(obj)], object_id=str(obj.pk), action='create')
+        for obj in objects
+    ], batch_size=2000)
+
+
+@contextmanager
+def receivers_muted():
+    """Suspend tous les récepteurs de modèle le temps d'une opération en masse.
+
+    Sans récepteur, les suppressions en cascade se font par requêtes DELETE
+    groupées. L'appelant reconstruit ensuite les données dérivées (journal,
+    compteurs, cube, caches) en une fois ; réservé aux commandes.
+    """
+    signals = (pre_save, post_save, pre_delete, post_delete, m2m_changed)
+    saved = [(signal, signal.receivers) for signal in signals]
+    try:
+        for signal in signals:
+            signal.receivers = []
+            signal.sender_receivers_cache.clear()
+        yield
+    finally:
+        for signal, receivers in saved:
+            signal.receivers = receivers
+            signal.sender_receivers_cache.clear()
+
+
+# Un branchement par modèle journalisé : les autres modèles n'appellent pas ces récepteurs
+for _model in JOURNALED_MODELS:
+    post_save.connect(journal_save, sender=_model, dispatch_uid=f'journal_save_{_model.__name__}')
+    post_delete.connect(journal_delete, sender=_model, dispatch_uid=f'journal_delete_{_model.__name__}')
+
+
+@receiver(m2m_changed, sender=Campaign.question_templates.through)
+def journal_campaign_templates(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    # Côté inverse (template.campaigns.add(...)), ce sont les campagnes de pk_set qui changent
+    campaign_ids = (pk_set or []) if reverse else [instance.pk]
+    ChangeJournal.objects.bulk_create([
+        ChangeJournal(entity='campaign', object_id=str(pk), action='update')
+        for pk in campaign_ids
+    ])
+
+
+def on_recoltes_created(recoltes):
+    """Met à jour les données dérivées de nouvelles récoltes déjà en base.
+
+    Appelé par post_save à la création, et directement après un bulk_create
+    (qui n'émet pas post_save) : toute nouvelle donnée dérivée des récoltes
+    s'alimente ici. Les modifications passent par on_recolte_changed, les
+    suppressions par on_recolte_deleted.
+    """
+    recoltes = list(recoltes)
+    if not recoltes:
+        return
+    sync_answers(recoltes, replace=False)
+    invalidate_dashboard_stats()
+    unknown = {r.establishment_id for r in recoltes if not Recolte.establishment.is_cached(r)}
+    provinces = dict(School.objects.filter(pk__in=unknown).values_list('pk', 'province_id')) if unknown else {}
+    keys = [recolte_stats_key(recolte, province_id=provinces.get(recolte.establishment_id)) for recolte in recoltes]
+    apply_recolte_deltas(keys, 1)
+    validated = [key for key in keys if key['status'] == 'valide']
+    if validated:
+        invalidate_question_stats({key['campaign_id'] for key in validated})
+        refresh_cube_cells(validated)
+
+
+def on_recolte_changed(previous, recolte):
+    """Met à jour les données dérivées d'une récolte modifiée, d'après son état précédent.
+
+    Seul ce qui a changé est recalculé : réponses typées si le JSON des
+    réponses change, compteurs de campagne si la clé de statistiques change,
+    statistiques par question et cube seulement quand une récolte validée
+    (avant ou après) change de réponses ou de clé.
+    """
+    answers_changed = previous['answers'] != recolte.answers
+    if answers_changed:
+        sync_answers([recolte])
+
+    before = {field: previous[field] for field in STATS_KEY_FIELDS}
+    after = recolte_stats_key(recolte, province_id=(
+        previous['province_id'] if previous['establishment_id'] == recolte.establishment_id else None
+    ))
+    key_changed = after != before
+    if key_changed:
+        # La couverture ne change que si la récolte quitte sa campagne ou son école
+        moved = (after['campaign_id'], after['establishment_id']) != (before['campaign_id'], before['establishment_id'])
+        apply_recolte_changes([(before, -1), (after, 1)], coverage=moved)
+        invalidate_dashboard_stats()
+
+    validated = [key for key in (before, after) if key['status'] == 'valide']
+    if validated and (answers_changed or key_changed):
+        invalidate_question_stats({key['campaign_id'] for key in validated})
+        refresh_cube_cells(validated)
+
+
+def on_recolte_deleted(recolte):
+    key = recolte_stats_key(recolte)
+    apply_recolte_deltas([key], -1)
+    invalidate_dashboard_stats()
+    if key['status'] == 'valide':
+        invalidate_question_stats({key['campaign_id']})
+        refresh_cube_cells([key])
+
+
+@receiver(pre_save, sender=Recolte)
+def remember_recolte(sender, instance, raw=False, **kwargs):
+    """Mémorise l'état enregistré de la récolte (une requête) pour on_recolte_changed."""
+    instance._recolte_previous = None
+    if raw or instance._state.adding:
+        return
+    previous = (
+        Recolte.objects.filter(pk=instance.pk)
+        .values('campaign_id', 'status', 'type', 'establishment__province_id', 'establishment_id', 'answers')
+        .first()
+    )
+    if previous:
+        previous['province_id'] = previous.pop('establishment__province_id')
+        instance._recolte_previous = previous
+
+
+@receiver(post_save, sender=Recolte)
+def recolte_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_recolte_previous', None)
+    if created or previous is None:
+        on_recoltes_created([instance])
+    else:
+        on_recolte_changed(previous, instance)
+
+
+@receiver(post_delete, sender=Recolte)
+def recolte_deleted(sender, instance, **kwargs):
+    on_recolte_deleted(instance)
+
+
+def bump_template_versions(templates):
+    """Invalide les questions en cache des questionnaires concernés."""
+    templates.update(version=F('version') + 1, updated_at=timezone.now())
+
+
+@receiver(pre_save, sender=Question)
+def remember_question_template(sender, instance, raw=False, **kwargs):
+    instance._previous_template_id = None
+    if not raw and not instance._state.adding:
+        instance._previous_template_id = (
+            Question.objects.filter(pk=instance.pk).values_list('template_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def bump_question_template(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # Une question déplacée change aussi le questionnaire qu'elle quitte
+    template_ids = {instance.template_id, getattr(instance, '_previous_template_id', None)} - {None}
+    bump_template_versions(QuestionTemplate.objects.filter(pk__in=template_ids))
+
+
+@receiver(post_save, sender=Groupe)
+@receiver(pre_delete, sender=Groupe)
+def bump_groupe_templates(sender, instance, raw=False, **kwargs):
+    # pre_delete : après la suppression, les questions ne référencent plus le groupe
+    if raw:
+        return
+    bump_template_versions(QuestionTemplate.objects.filter(
+        pk__in=Question.objects.filter(groupe=instance).values('template_id')
+    ))
+
+
+@receiver(post_save, sender=School)
+@receiver(post_delete, sender=School)
+def refresh_dashboard_stats(sender, **kwargs):
+    invalidate_dashboard_stats()
+
+
+@receiver(m2m_changed, sender=Campaign.question_templates.through)
+def update_campaign_scope(sender, instance, action, reverse, pk_set, **kwargs):
+    """Les écoles concernées dépendent des types de questionnaires de la campagne."""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    campaigns = Campaign.objects.filter(pk__in=pk_set or []) if reverse else [instance]
+    for campaign in campaigns:
+        CampaignStats.objects.filter(campaign=campaign).update(schools_in_scope=schools_in_scope(campaign))
+
+
+@receiver(pre_save, sender=School)
+def update_school_coordinates(sender, instance, raw=False, **kwargs):
+    sync_school_coordinates(instance)
+
+
+# Champs de l'école dont dépendent les compteurs de campagne, le cube et les statistiques par question
+SCHOOL_DERIVED_FIELDS = ('province_id', 'division_id', 'sub_division_id', 'management_regime', 'environment', 'level')
+SCHOOL_CUBE_FIELDS = ('province_id', 'division_id', 'management_regime', 'environment')
+
+
+@receiver(pre_save, sender=School)
+def remember_school(sender, instance, raw=False, **kwargs):
+    """Mémorise l'état enregistré de l'école (une requête) pour update_school_derived_data."""
+    instance._school_previous = None
+    if not raw and not instance._state.adding:
+        instance._school_previous = School.objects.filter(pk=instance.pk).values(*SCHOOL_DERIVED_FIELDS).first()
+
+
+@receiver(post_save, sender=School)
+def update_school_derived_data(sender, instance, created, raw=False, **kwargs):
+    """Répercute la création ou le changement de niveau, de province et de dimensions d'une école."""
+    if raw:
+        return
+    if created:
+        update_school_scope(None, instance.level)
+        return
+    previous = getattr(instance, '_school_previous', None)
+    if previous is None:
+        return
+    if previous['level'] != instance.level:
+        update_school_scope(previous['level'], instance.level)
+    if previous['province_id'] != instance.province_id:
+        move_school_province(instance.pk, previous['province_id'], instance.province_id)
+    refresh_school_cells(instance, tuple(previous[field] for field in SCHOOL_CUBE_FIELDS))
+    invalidate_school_question_stats(instance, tuple(previous[field] for field in SCHOOL_GROUP_FIELDS))
+
+
+@receiver(post_delete, sender=School)
+def remove_school_from_scope(sender, instance, **kwargs):
+    update_school_scope(instance.level, None)
+
+
+def refresh_autocomplete(sender, **kwargs):
+    invalidate_autocomplete(MODEL_ENTITIES[sender])
+
+
+def refresh_geo_hierarchy(sender, **kwargs):
+    invalidate_geo_hierarchy()
+
+
+# Comme le journal : un branchement par modèle concerné plutôt qu'un récepteur appelé pour tous les modèles
+for _model in MODEL_ENTITIES:
+    post_save.connect(refresh_autocomplete, sender=_model, dispatch_uid=f'autocomplete_save_{_model.__name__}')
+    post_delete.connect(refresh_autocomplete, sender=_model, dispatch_uid=f'autocomplete_delete_{_model.__name__}')
+for _model in HIERARCHY_MODELS:
+    post_save.connect(refresh_geo_hierarchy, sender=_model, dispatch_uid=f'geo_hierarchy_save_{_model.__name__}')
+    post_delete.connect(refresh_geo_hierarchy, sender=_model, dispatch_uid=f'geo_hierarchy_delete_{_model.__name__}')
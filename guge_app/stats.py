@@ -0,0 +1,469 @@
+# stats.py
+"""Statistiques du tableau de bord, compteurs d'avancement des campagnes et
+agrégats des réponses par question."""
+import math
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Avg, Count, F, Max, Min, Q, Sum, Window
+from django.db.models.functions import RowNumber
+
+from .hierarchy import VERSION_NAME as GEO_HIERARCHY_VERSION
+from .models import Answer, Campaign, CampaignStats, Division, Province, Recolte, School, SubDivision
+from .versions import bump_versions, current_versions
+
+DASHBOARD_CACHE_KEY = 'dashboard_stats'
+DASHBOARD_CACHE_TIMEOUT = 60
+
+
+def compute_dashboard_stats():
+    # Une seule requête groupée pour toutes les ventilations des récoltes
+    per_status, per_type, per_province = {}, {}, {}
+    nbr_recolte = 0
+    rows = (
+        Recolte.objects
+        .values_list('status', 'type', 'establishment__province__name')
+        .annotate(n=Count('id'))
+        .order_by()
+    )
+    for status, type_, province, n in rows:
+        nbr_recolte += n
+        per_status[status] = per_status.get(status, 0) + n
+        per_type[type_] = per_type.get(type_, 0) + n
+        per_province[province] = per_province.get(province, 0) + n
+
+    schools_per_province = dict(
+        School.objects.values_list('province__name').annotate(n=Count('id')).order_by()
+    )
+    status_labels = dict(Recolte.STATUS_CHOICES)
+    type_labels = dict(Recolte.TYPE_CHOICES)
+
+    return {
+        'nbr_school': sum(schools_per_province.values()),
+        'nbr_recolte': nbr_recolte,
+        'nbr_divisions': Division.objects.count(),
+        'nbr_users': User.objects.count(),
+        'recoltes_per_status': [(status_labels.get(k, k), v) for k, v in sorted(per_status.items())],
+        'recoltes_per_type': [(type_labels.get(k, k), v) for k, v in sorted(per_type.items())],
+        'per_province': [
+            (name, schools_per_province.get(name, 0), per_province.get(name, 0))
+            for name in sorted(set(schools_per_province) | set(per_province), key=lambda n: n or '')
+        ],
+    }
+
+
+def dashboard_stats():
+    stats = cache.get(DASHBOARD_CACHE_KEY)
+    if stats is None:
+        stats = compute_dashboard_stats()
+        cache.set(DASHBOARD_CACHE_KEY, stats, DASHBOARD_CACHE_TIMEOUT)
+    return stats
+
+
+def invalidate_dashboard_stats():
+    cache.delete(DASHBOARD_CACHE_KEY)
+
+
+# Avancement des campagnes (table CampaignStats)
+
+def _schools_for_types(types):
+    if not types:
+        return School.objects.count()
+    scope = Q()
+    for type_ in types:
+        scope |= Q(level__icontains=f'"{type_}"')
+    return School.objects.filter(scope).count()
+
+
+def schools_in_scope(campaign):
+    """Nombre d'écoles dont un niveau correspond au type d'un questionnaire de la campagne."""
+    return _schools_for_types(frozenset(template.type for template in campaign.question_templates.all()))
+
+
+def _level_in_scope(level, types):
+    """Même règle que _schools_for_types, pour une valeur de School.level (None : école absente)."""
+    if level is None:
+        return False
+    if not types:
+        return True
+    levels = {level} if isinstance(level, str) else set(level or [])
+    return bool(levels & types)
+
+
+def update_school_scope(previous_level, level):
+    """Ajuste schools_in_scope quand une école est créée (previous_level None),
+    supprimée (level None) ou change de niveau."""
+    types = {campaign_id: set() for campaign_id in CampaignStats.objects.values_list('campaign_id', flat=True)}
+    rows = Campaign.question_templates.through.objects.filter(campaign_id__in=list(types))
+    for campaign_id, type_ in rows.values_list('campaign_id', 'questiontemplate__type'):
+        types[campaign_id].add(type_)
+    by_delta = {}
+    for campaign_id, campaign_types in types.items():
+        delta = _level_in_scope(level, campaign_types) - _level_in_scope(previous_level, campaign_types)
+        if delta:
+            by_delta.setdefault(delta, []).append(campaign_id)
+    for delta, campaign_ids in by_delta.items():
+        CampaignStats.objects.filter(campaign_id__in=campaign_ids).update(schools_in_scope=F('schools_in_scope') + delta)
+
+
+def move_school_province(school_id, previous_province_id, province_id):
+    """Reporte les récoltes d'une école sur sa nouvelle province dans per_province."""
+    rows = (
+        Recolte.objects.filter(establishment_id=school_id, campaign__isnull=False)
+        .values_list('campaign_id').annotate(n=Count('id')).order_by()
+    )
+    for campaign_id, n in rows:
+        with transaction.atomic():
+            stats = CampaignStats.objects.select_for_update().filter(campaign_id=campaign_id).first()
+            if stats is not None:
+                _bump(stats.per_province, previous_province_id, -n)
+                _bump(stats.per_province, province_id, n)
+                stats.save(update_fields=['per_province', 'updated_at'])
+
+
+def compute_campaigns_stats(campaigns):
+    """{id de campagne: CampaignStats non enregistré}, une requête groupée par compteur.
+
+    Le coût ne dépend pas du nombre de campagnes ; les écoles concernées sont
+    comptées une fois par combinaison de types de questionnaires.
+    """
+    campaigns = list(campaigns)
+    ids = [campaign.pk for campaign in campaigns]
+    recoltes = Recolte.objects.filter(campaign_id__in=ids).order_by()
+
+    # Les trois ventilations se déduisent d'un seul regroupement
+    per_status, per_type, per_province = ({pk: {} for pk in ids} for _ in range(3))
+    rows = recoltes.values_list('campaign_id', 'status', 'type', 'establishment__province_id').annotate(n=Count('id'))
+    for campaign_id, status, type_, province_id, n in rows:
+        for counts, key in ((per_status, status), (per_type, type_), (per_province, province_id)):
+            counts[campaign_id][str(key)] = counts[campaign_id].get(str(key), 0) + n
+    covered = dict(
+        recoltes.values_list('campaign_id').annotate(n=Count('establishment_id', distinct=True))
+    )
+    scopes = {}
+    result = {}
+    for campaign in campaigns:
+        types = frozenset(template.type for template in campaign.question_templates.all())
+        if types not in scopes:
+            scopes[types] = _schools_for_types(types)
+        result[campaign.pk] = CampaignStats(
+            campaign=campaign,
+            total=sum(per_status[campaign.pk].values()),
+            per_status=per_status[campaign.pk],
+            per_type=per_type[campaign.pk],
+            per_province=per_province[campaign.pk],
+            schools_covered=covered.get(campaign.pk, 0),
+            schools_in_scope=scopes[types],
+        )
+    return result
+
+
+def rebuild_campaign_stats(campaign):
+    """Recalcule entièrement les compteurs d'une campagne par requêtes groupées."""
+    computed = compute_campaigns_stats([campaign])[campaign.pk]
+    stats, _ = CampaignStats.objects.update_or_create(
+        campaign=campaign,
+        defaults={
+            field: getattr(computed, field)
+            for field in ('total', 'per_status', 'per_type', 'per_province', 'schools_covered', 'schools_in_scope')
+        },
+    )
+    return stats
+
+
+def campaign_stats(campaign):
+    """Compteurs d'une campagne, reconstruits s'ils n'existent pas encore."""
+    try:
+        return campaign.stats
+    except CampaignStats.DoesNotExist:
+        return rebuild_campaign_stats(campaign)
+
+
+def ensure_campaigns_stats(campaigns):
+    """Crée en lot les compteurs manquants d'une liste de campagnes (select_related('stats')).
+
+    Évite une reconstruction par campagne quand une liste affiche des
+    campagnes jamais comptées ; les compteurs sont rattachés aux objets.
+    """
+    missing = []
+    for campaign in campaigns:
+        try:
+            campaign.stats
+        except CampaignStats.DoesNotExist:
+            missing.append(campaign)
+    if not missing:
+        return
+    computed = compute_campaigns_stats(missing)
+    # Un autre processus peut avoir créé les mêmes compteurs entre-temps
+    CampaignStats.objects.bulk_create(computed.values(), ignore_conflicts=True)
+    for campaign in missing:
+        campaign.stats = computed[campaign.pk]
+
+
+# Champs d'une clé de statistiques (recolte_stats_key)
+STATS_KEY_FIELDS = ('campaign_id', 'status', 'type', 'province_id', 'establishment_id')
+
+
+def recolte_stats_key(recolte, province_id=None):
+    """Valeurs d'une récolte qui comptent dans les statistiques de sa campagne.
+
+    La province est lue sur l'école déjà chargée (récolte créée par l'API),
+    sinon par une requête.
+    """
+    if province_id is None and Recolte.establishment.is_cached(recolte):
+        province_id = recolte.establishment.province_id
+    if province_id is None:
+        province_id = School.objects.filter(pk=recolte.establishment_id).values_list('province_id', flat=True).first()
+    return {
+        'campaign_id': recolte.campaign_id,
+        'status': recolte.status,
+        'type': recolte.type,
+        'province_id': province_id,
+        'establishment_id': recolte.establishment_id,
+    }
+
+
+def _bump(counts, key, delta):
+    key = str(key)
+    counts[key] = counts.get(key, 0) + delta
+    if counts[key] <= 0:
+        del counts[key]
+
+
+def apply_recolte_deltas(keys, delta, coverage=True):
+    """Ajoute (delta=1) ou retire (delta=-1) des récoltes des compteurs de leur campagne."""
+    apply_recolte_changes([(key, delta) for key in keys], coverage)
+
+
+def apply_recolte_changes(changes, coverage=True):
+    """Applique des paires (clé, delta) aux compteurs des campagnes.
+
+    À appeler après l'écriture des récoltes en base : la couverture des écoles
+    se déduit du nombre de récoltes restantes pour chaque établissement.
+    `coverage=False` quand la récolte reste dans la même campagne et la même
+    école (changement de statut ou de type) : la couverture ne bouge pas.
+    Une ligne de statistiques est verrouillée et sauvegardée une fois par
+    campagne, même quand une récolte modifiée la quitte et la rejoint.
+    """
+    by_campaign = {}
+    for key, delta in changes:
+        if key and key['campaign_id']:
+            by_campaign.setdefault(key['campaign_id'], []).append((key, delta))
+
+    for campaign_id, campaign_changes in by_campaign.items():
+        with transaction.atomic():
+            stats = CampaignStats.objects.select_for_update().filter(campaign_id=campaign_id).first()
+            if stats is None:
+                # Premières récoltes comptées : la reconstruction les inclut déjà
+                campaign = Campaign.objects.filter(pk=campaign_id).first()
+                if campaign is not None:
+                    rebuild_campaign_stats(campaign)
+                continue
+
+            touched = {}
+            for key, delta in campaign_changes:
+                stats.total = max(stats.total + delta, 0)
+                _bump(stats.per_status, key['status'], delta)
+                _bump(stats.per_type, key['type'], delta)
+                _bump(stats.per_province, key['province_id'], delta)
+                touched[key['establishment_id']] = touched.get(key['establishment_id'], 0) + delta
+            touched = {establishment_id: net for establishment_id, net in touched.items() if net}
+            if not coverage or not touched:
+                stats.save()
+                continue
+
+            remaining = dict(
+                Recolte.objects.filter(campaign_id=campaign_id, establishment_id__in=list(touched))
+                .values_list('establishment_id').annotate(n=Count('id')).order_by()
+            )
+            for establishment_id, net in touched.items():
+                left = remaining.get(establishment_id, 0)
+                if net > 0 and left == net:
+                    stats.schools_covered += 1
+                elif net < 0 and left == 0:
+                    stats.schools_covered = max(stats.schools_covered - 1, 0)
+            stats.save()
+
+
+def province_names():
+    """{id de province: nom}, en cache jusqu'à la prochaine modification de l'arbre administratif."""
+    key = f'province_names:{current_versions(GEO_HIERARCHY_VERSION)[0]}'
+    names = cache.get(key)
+    if names is None:
+        names = {str(pk): name for pk, name in Province.objects.values_list('id', 'name')}
+        cache.set(key, names, 60 * 60)
+    return names
+
+
+def campaign_stats_summary(stats, names=None):
+    """Représentation des compteurs pour l'API et les gabarits.
+
+    `names` (province_names) peut être fourni pour une liste de campagnes.
+    """
+    if names is None:
+        names = province_names()
+    return {
+        'total': stats.total,
+        'per_status': stats.per_status,
+        'per_type': stats.per_type,
+        'per_province': {names.get(pk, pk): n for pk, n in stats.per_province.items()},
+        'schools_covered': stats.schools_covered,
+        'schools_in_scope': stats.schools_in_scope,
+        'coverage': stats.coverage,
+    }
+
+
+# Agrégats des réponses d'une question (table Answer), récoltes validées uniquement
+
+QUESTION_STATS_TIMEOUT = 24 * 60 * 60
+PERCENTILES = (10, 25, 50, 75, 90)
+
+# group_by -> (champ de regroupement depuis Answer, modèle ou libellés des valeurs)
+QUESTION_STATS_GROUPS = {
+    'province': ('recolte__establishment__province_id', Province),
+    'division': ('recolte__establishment__division_id', Division),
+    'sub_division': ('recolte__establishment__sub_division_id', SubDivision),
+    'environment': ('recolte__establishment__environment', dict(School.ENVIRONMENT_CHOICES)),
+    'management_regime': ('recolte__establishment__management_regime', dict(School.MANAGEMENT_CHOICES)),
+}
+# Champs de l'école dont dépend le regroupement des réponses
+SCHOOL_GROUP_FIELDS = [path.removeprefix('recolte__establishment__') for path, _ in QUESTION_STATS_GROUPS.values()]
+
+
+def _question_stats_version_name(campaign_id):
+    return f'question_stats:{campaign_id or "all"}'
+
+
+def invalidate_question_stats(campaign_ids):
+    """Périme les statistiques des campagnes données et celles toutes campagnes confondues."""
+    bump_versions(*sorted({_question_stats_version_name(campaign_id) for campaign_id in {*campaign_ids, None}}))
+
+
+def invalidate_school_question_stats(school, previous):
+    """Les réponses d'une école changent de groupe quand ses champs de regroupement changent.
+
+    `previous` : valeurs des champs SCHOOL_GROUP_FIELDS avant modification.
+    """
+    if previous is None or previous == tuple(getattr(school, field) for field in SCHOOL_GROUP_FIELDS):
+        return
+    campaign_ids = set(
+        Recolte.objects.filter(establishment=school, status='valide')
+        .values_list('campaign_id', flat=True).distinct().order_by()
+    )
+    if campaign_ids:
+        invalidate_question_stats(campaign_ids)
+
+
+def _group_labels(group_by, keys):
+    labels = QUESTION_STATS_GROUPS[group_by][1]
+    if isinstance(labels, dict):
+        return {key: labels.get(key, key) for key in keys}
+    return dict(labels.objects.filter(pk__in=[k for k in keys if k is not None]).values_list('id', 'name'))
+
+
+def _grouped(answers, field, **aggregates):
+    """{valeur de field: agrégats} ; sans field, un seul groupe None (vide s'il n'y a aucune réponse)."""
+    if field is None:
+        totals = answers.aggregate(**aggregates)
+        return {None: totals} if next(iter(totals.values())) else {}
+    return {row.pop(field): row for row in answers.values(field).annotate(**aggregates).order_by()}
+
+
+def _numeric_groups(answers, field):
+    """count, sum, mean, min, max et percentiles (rang le plus proche) par valeur de `field`."""
+    answers = answers.filter(numeric_value__isnull=False)
+    keys = [field] if field else []
+    groups = _grouped(
+        answers, field,
+        count=Count('id'), sum=Sum('numeric_value'), mean=Avg('numeric_value'),
+        min=Min('numeric_value'), max=Max('numeric_value'),
+    )
+    for group in groups.values():
+        group['mean'] = round(group['mean'], 4)
+
+    # Percentiles : seules les lignes aux rangs utiles sont lues, numérotées par groupe en SQL
+    ranks = {key: {p: max(1, math.ceil(p * g['count'] / 100)) for p in PERCENTILES} for key, g in groups.items()}
+    wanted = {rank for group_ranks in ranks.values() for rank in group_ranks.values()}
+    ranked = answers.annotate(position=Window(
+        RowNumber(), partition_by=[F(field)] if field else None, order_by=F('numeric_value').asc(),
+    )).filter(position__in=wanted)
+    values = {}
+    for row in ranked.values_list(*keys, 'position', 'numeric_value'):
+        key = row[0] if field else None
+        values[(key, row[-2])] = row[-1]
+    for key, group in groups.items():
+        group['percentiles'] = {f'p{p}': values.get((key, rank)) for p, rank in ranks[key].items()}
+    return groups
+
+
+def _choice_groups(answers, field, options):
+    """Nombre de répondants et fréquence de chaque option par valeur de `field`.
+
+    Une question à choix multiples compte une ligne par option cochée : les
+    pourcentages, rapportés aux répondants, peuvent dépasser 100 au total.
+    """
+    answers = answers.filter(choice_value__isnull=False)
+    keys = [field] if field else []
+    groups = _grouped(answers, field, respondents=Count('recolte', distinct=True))
+    for group in groups.values():
+        group['counts'] = {}
+    for row in answers.values(*keys, 'choice_value').annotate(n=Count('id')).order_by():
+        groups[row[field] if field else None]['counts'][row['choice_value']] = row['n']
+
+    order = {option: index for index, option in enumerate(options or [])}
+    for group in groups.values():
+        counts = group.pop('counts')
+        values = sorted(set(order) | set(counts), key=lambda v: (v not in order, order.get(v, 0), -counts.get(v, 0)))
+        group['frequencies'] = [
+            {'value': value, 'count': counts.get(value, 0),
+             'percent': round(100.0 * counts.get(value, 0) / group['respondents'], 1) if group['respondents'] else 0.0}
+            for value in values
+        ]
+    return groups
+
+
+def compute_question_stats(question, campaign=None, group_by=None):
+    answers = Answer.objects.filter(question=question, recolte__status='valide')
+    if campaign is not None:
+        answers = answers.filter(recolte__campaign=campaign)
+
+    if question.kind == 'number':
+        def aggregate(field):
+            return _numeric_groups(answers, field)
+    else:
+        def aggregate(field):
+            return _choice_groups(answers, field, question.options)
+
+    total = aggregate(None).get(None)
+    result = {
+        'question': {'id': str(question.pk), 'text': question.text, 'kind': question.kind},
+        'campaign': str(campaign.pk) if campaign else None,
+        'group_by': group_by,
+        'total': total,
+    }
+    if group_by:
+        groups = aggregate(QUESTION_STATS_GROUPS[group_by][0])
+        labels = _group_labels(group_by, list(groups))
+        result['groups'] = sorted(
+            ({'key': key, 'label': labels.get(key, key), **values} for key, values in groups.items()),
+            key=lambda g: str(g['label'] or ''),
+        )
+    return result
+
+
+def question_stats(question, campaign=None, group_by=None):
+    """Agrégats d'une question (nombre ou choix), en cache jusqu'aux prochaines récoltes validées.
+
+    La clé comprend la version des statistiques de la campagne et celle de
+    l'arbre administratif (libellés des groupes), lues en base.
+    """
+    version, geo_version = current_versions(
+        _question_stats_version_name(campaign.pk if campaign else None), GEO_HIERARCHY_VERSION,
+    )
+    key = f'question_stats:{question.pk}:{campaign.pk if campaign else "all"}:{group_by or "-"}:{version}:{geo_version}'
+    stats = cache.get(key)
+    if stats is None:
+        stats = compute_question_stats(question, campaign, group_by)
+        cache.set(key, stats, QUESTION_STATS_TIMEOUT)
+    return stats
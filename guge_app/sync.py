@@ -0,0 +1,161 @@
+# sync.py
+"""Synchronisation incrémentale des écoles pour les clients mobiles.
+
+Le curseur est opaque pour le client. La première synchro parcourt les écoles
+par id (instantané) ; les suivantes relisent le journal des changements à
+partir du dernier numéro de séquence lu. Le numéro de séquence, et non
+updated_at, sert de repère : il suit l'ordre de validation des transactions
+(les écritures SQLite sont sérialisées par transaction_mode IMMEDIATE), et
+une écriture faite sans passer par save() ne recule jamais derrière un
+curseur déjà distribué. Chaque page est une requête indexée, quel que soit
+le nombre total d'écoles.
+"""
+import base64
+import binascii
+import json
+
+from django.db.models import Max
+
+from .models import School, ChangeJournal
+
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 1000
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(position):
+    raw = json.dumps(position, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def load_cursor(cursor):
+    """Objet JSON encodé dans un curseur opaque."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        return json.loads(raw)
+    except (binascii.Error, ValueError):
+        raise InvalidCursor(cursor)
+
+
+def decode_cursor(cursor):
+    """Retourne la position {"t": seq, "id": dernière école de l'instantané} du curseur.
+
+    Sans curseur, ou avec un curseur de l'ancien format (repère updated_at,
+    clé "s"), la position est None : la synchro repart d'un instantané complet.
+    """
+    if not cursor:
+        return None
+    position = load_cursor(cursor)
+    if not isinstance(position, dict):
+        raise InvalidCursor(cursor)
+    if "s" in position:
+        return None
+    try:
+        last_id = position.get("id")
+        return {
+            "t": int(position["t"]),
+            "id": int(last_id) if last_id is not None else None,
+        }
+    except (KeyError, ValueError, TypeError):
+        raise InvalidCursor(cursor)
+
+
+def school_changes(cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """Retourne une page de changements postérieurs au curseur.
+
+    Le résultat contient les écoles créées ou modifiées (``schools``), les
+    écoles supprimées (``deleted``, entrées du journal), le curseur suivant
+    et ``has_more``.
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    position = decode_cursor(cursor)
+    if position is None:
+        # Le journal est lu avant les écoles : tout changement pendant
+        # l'instantané aura un numéro supérieur et sera renvoyé ensuite
+        last_seq = ChangeJournal.objects.aggregate(seq=Max("id"))["seq"] or 0
+        position = {"t": last_seq, "id": 0}
+
+    if position["id"] is not None:
+        return _snapshot_page(position, limit)
+    return _journal_page(position, limit)
+
+
+def _school_queryset():
+    return School.objects.select_related("province", "division", "sub_division")
+
+
+def _snapshot_page(position, limit):
+    schools = list(_school_queryset().filter(id__gt=position["id"]).order_by("id")[:limit + 1])
+    page = schools[:limit]
+    if len(schools) > limit:
+        next_position, has_more = {"t": position["t"], "id": page[-1].id}, True
+    else:
+        next_position = {"t": position["t"], "id": None}
+        has_more = journal_since(position["t"], entities=["school"], limit=1).exists()
+    return {
+        "schools": page,
+        "deleted": [],
+        "cursor": encode_cursor(next_position),
+        "has_more": has_more,
+    }
+
+
+def _journal_page(position, limit):
+    entries = list(journal_since(position["t"], entities=["school"], limit=limit + 1))
+    page = entries[:limit]
+
+    # Seule la dernière entrée de chaque école dans la page compte
+    latest = {}
+    for entry in page:
+        latest.pop(entry.object_id, None)
+        latest[entry.object_id] = entry
+    changed_ids = [int(entry.object_id) for entry in latest.values() if entry.action != "delete"]
+    schools = _school_queryset().in_bulk(changed_ids)
+
+    changed, deleted = [], []
+    for entry in latest.values():
+        if entry.action == "delete":
+            deleted.append(entry)
+        elif int(entry.object_id) in schools:
+            changed.append(schools[int(entry.object_id)])
+        # Sinon l'école a été supprimée depuis : sa suppression suit dans le journal
+
+    return {
+        "schools": changed,
+        "deleted": deleted,
+        "cursor": encode_cursor({"t": page[-1].id if page else position["t"], "id": None}),
+        "has_more": len(entries) > limit,
+    }
+
+
+def journal_since(seq, entities=None, actions=None, limit=DEFAULT_PAGE_SIZE):
+    """Entrées du journal de numéro de séquence strictement supérieur à `seq`."""
+    queryset = ChangeJournal.objects.filter(id__gt=seq)
+    if entities:
+        queryset = queryset.filter(entity__in=entities)
+    if actions:
+        queryset = queryset.filter(action__in=actions)
+    return queryset.order_by("id")[:limit]
+
+
+def compact_journal(entities=None):
+    """Supprime les entrées remplacées par une entrée plus récente du même objet.
+
+    Un client qui relit le journal depuis n'importe quel numéro de séquence
+    obtient toujours l'état final de chaque objet : seule la dernière entrée
+    (création, modification ou suppression) compte. Retourne le nombre
+    d'entrées supprimées.
+    """
+    queryset = ChangeJournal.objects.all()
+    if entities:
+        queryset = queryset.filter(entity__in=entities)
+    latest_ids = (
+        queryset.values("entity", "object_id")
+        .annotate(latest=Max("id"))
+        .values("latest")
+    )
+    deleted, _ = queryset.exclude(id__in=latest_ids).delete()
+    return deleted
@@ -0,0 +1,83 @@
+# testing.py
+"""Outils de test : budgets de requêtes SQL des vues et plans des requêtes fréquentes.
+
+    class RapportTests(QueryBudgetMixin, TestCase):
+        def test_rapport_detail(self):
+            self.client.force_login(self.user)
+            self.assertWithinQueryBudget(reverse('rapport_detail', args=[self.recolte.pk]))
+
+Le budget est celui déclaré sur la vue avec @query_budget(n), ou `budget`.
+"""
+from urllib.parse import urlsplit
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from django.utils import timezone
+
+from .models import School, Recolte
+from .pagination import keyset_ordering, keyset_queryset
+from .perf import view_budget
+from .views import LIST_RELATED
+
+
+def assert_query_budget(client, url, budget=None, method='get', **kwargs):
+    """Appelle `url` avec le client de test et échoue si la vue dépasse son budget.
+
+    Retourne la réponse. Le message d'échec liste les requêtes exécutées.
+    """
+    if budget is None:
+        budget = view_budget(resolve(urlsplit(url).path).func)
+        if budget is None:
+            raise AssertionError(f"Aucun budget de requêtes déclaré pour {url}")
+    with CaptureQueriesContext(connection) as ctx:
+        response = getattr(client, method)(url, **kwargs)
+    if len(ctx) > budget:
+        queries = '\n'.join(f"{i}. {q['sql']}" for i, q in enumerate(ctx.captured_queries, 1))
+        raise AssertionError(f"{url} : {len(ctx)} requêtes pour un budget de {budget}\n{queries}")
+    return response
+
+
+class QueryBudgetMixin:
+    """Mixin de TestCase : self.assertWithinQueryBudget(url)."""
+
+    def assertWithinQueryBudget(self, url, budget=None, method='get', **kwargs):
+        return assert_query_budget(self.client, url, budget=budget, method=method, **kwargs)
+
+
+# Plans des requêtes fréquentes (QueryPlanTests, commande check_query_plans)
+
+PLAN_PAGE_SIZE = 10
+
+
+def hot_queries():
+    """(nom, requête) des chemins d'accès des vues, construits comme dans les vues."""
+    now = timezone.now()
+    queries = [
+        ('school_list', School.objects.order_by('-created_at'), None),
+        ('school_list (page suivante)', School.objects.order_by('-created_at'), [now, 1]),
+        ('recolte_list', Recolte.objects.filter(type='primaire').select_related(*LIST_RELATED).order_by('-date'), None),
+        ('recolte_list (page suivante)', Recolte.objects.filter(type='primaire').select_related(*LIST_RELATED).order_by('-date'),
+         [now, '00000000-0000-0000-0000-000000000000']),
+        ('rapport_list', Recolte.objects.filter(status='valide').select_related(*LIST_RELATED).order_by('-date'), None),
+        ('recoltes_mine', Recolte.objects.filter(collector_id=1).order_by('-date'), None),
+        ('api recoltes', Recolte.objects.order_by('-date'), None),
+        ('api recoltes ?status=', Recolte.objects.filter(status='en_attente').order_by('-date'), None),
+    ]
+    for name, queryset, position in queries:
+        yield name, keyset_queryset(queryset, keyset_ordering(queryset), position, PLAN_PAGE_SIZE)
+
+    # Statistiques de campagne (stats.rebuild_campaign_stats)
+    yield 'campaign stats', Recolte.objects.filter(campaign_id='00000000-0000-0000-0000-000000000000', status='valide').values('id')
+
+
+def plan_problems(plan):
+    """Parcours complets de table et tris en mémoire dans un plan SQLite."""
+    problems = []
+    for line in plan.splitlines():
+        detail = line.split(' ', 3)[-1]
+        if detail.startswith('SCAN ') and ' USING ' not in detail:
+            problems.append(detail)
+        elif 'USE TEMP B-TREE FOR ORDER BY' in detail:
+            problems.append(detail)
+    return problems
@@ -1,3 +1,875 @@
+import io
+import tempfile
+import uuid
+import zipfile
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from . import bundles, idempotency, jobs, sync
+from .cube import build_campaign_cube
+from .fiches import fiche_queryset, iter_fiches, render_fiches
+from .answers import recolte_question_map
+from .autocomplete import autocomplete
+from .geo import nearest_schools
+from .hierarchy import geo_hierarchy
+from .stats import campaign_stats_summary, compute_campaigns_stats, invalidate_question_stats, question_stats
+from .testing import QueryBudgetMixin, hot_queries, plan_problems
+from .views import RecolteViewSet
+
+from .models import Answer, Campaign, CampaignStats, ChangeJournal, CubeCell, IdempotencyRecord, Job, CacheVersion, Division, Province, Question, QuestionTemplate, Recolte, School, SubDivision
+
+
+class GugeData:
+    """Jeu de données minimal : une province, deux écoles primaires, une campagne."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('collecteur', password='secret')
+        cls.staff = User.objects.create_user('admin', password='secret', is_staff=True)
+        cls.province = Province.objects.create(name='Kwilu', code='KWI')
+        cls.division = Division.objects.create(province=cls.province, name='Kwilu 1', code='KWI-1')
+        cls.sub_division = SubDivision.objects.create(division=cls.division, name='Kwilu 1-A', code='KWI-1-A')
+        cls.school = cls.make_school('EP Kikwit', 'ADM-1')
+        cls.other_school = cls.make_school('EP Bulungu', 'ADM-2')
+        cls.template = QuestionTemplate.objects.create(type='primaire', name='Questionnaire primaire')
+        cls.question = Question.objects.create(template=cls.template, text="Nombre d'élèves", kind='number')
+        now = timezone.now()
+        cls.campaign = Campaign.objects.create(name='Campagne 2025', start_date=now, end_date=now + timedelta(days=30))
+        cls.campaign.question_templates.add(cls.template)
+
+    @classmethod
+    def make_school(cls, name, adm_code, **fields):
+        return School.objects.create(**{
+            'name': name, 'address': 'Avenue 1', 'level': ['primaire'], 'head_name': 'Directeur',
+            'head_phone': '0800000000', 'province': cls.province, 'division': cls.division,
+            'sub_division': cls.sub_division, 'adm_code': adm_code, 'legal_reference': 'REF',
+            'secope_number': 'S-1', 'management_regime': 'Catholique', 'mechanized_status': 'mecanise_paye',
+            'ownership_status': 'proprietaire', 'environment': 'rural', **fields,
+        })
+
+    def make_recolte(self, school=None, status='en_attente', value=10, **fields):
+        return Recolte.objects.create(**{
+            'establishment': school or self.school, 'campaign': self.campaign, 'date': timezone.now(),
+            'collector_id': self.user, 'type': 'primaire', 'status': status,
+            'answers': [{'question_uuid': str(self.question.pk), 'answer': str(value)}], **fields,
+        })
+
+
+class ChangeJournalTests(GugeData, TestCase):
+
+    def test_only_journaled_models_are_recorded(self):
+        before = ChangeJournal.objects.count()
+        recolte = self.make_recolte()
+        self.assertTrue(Answer.objects.filter(recolte=recolte).exists())
+        self.assertEqual(ChangeJournal.objects.count(), before)
+
+        self.school.name = 'EP Kikwit II'
+        self.school.save()
+        entry = ChangeJournal.objects.latest('id')
+        self.assertEqual((entry.entity, entry.object_id, entry.action), ('school', str(self.school.pk), 'update'))
+
+
+    def test_derived_tables_have_no_receivers(self):
+        for model in (Answer, ChangeJournal, CubeCell, CacheVersion, IdempotencyRecord, Job):
+            for signal in (post_save, post_delete):
+                self.assertFalse(signal.has_listeners(model), (model.__name__, signal))
+
+
+class SchoolChangesTests(GugeData, TestCase):
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def changes(self, since=None, limit=1):
+        params = {'limit': limit, **({'since': since} if since else {})}
+        response = self.client.get(reverse('school_changes'), params)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        return [s['adm_code'] for s in data['schools']], [d['adm_code'] for d in data['deleted']], data
+
+    def sync_all(self):
+        schools, _, data = self.changes(limit=10)
+        self.assertEqual(schools, ['ADM-1', 'ADM-2'])
+        self.assertFalse(data['has_more'])
+        return data['cursor']
+
+    def test_snapshot_pages_then_journal(self):
+        schools, deleted, page = self.changes()
+        self.assertEqual((schools, deleted, page['has_more']), (['ADM-1'], [], True))
+        schools, deleted, page = self.changes(page['cursor'])
+        self.assertEqual((schools, deleted, page['has_more']), (['ADM-2'], [], False))
+
+        self.school.name = 'EP Kikwit II'
+        self.school.save()
+        schools, _, page = self.changes(page['cursor'])
+        self.assertEqual((schools, page['has_more']), (['ADM-1'], False))
+        # Le curseur final ne renvoie plus rien
+        schools, deleted, again = self.changes(page['cursor'])
+        self.assertEqual((schools, deleted, again['cursor']), ([], [], page['cursor']))
+
+    def test_journal_pages_keep_order_and_last_state(self):
+        cursor = self.sync_all()
+        self.school.save()
+        self.other_school.delete()
+        self.school.name = 'EP Kikwit II'
+        self.school.save()
+
+        schools, deleted, page = self.changes(cursor, limit=2)
+        self.assertEqual((schools, deleted, page['has_more']), (['ADM-1'], ['ADM-2'], True))
+        schools, deleted, page = self.changes(page['cursor'], limit=2)
+        self.assertEqual((schools, deleted, page['has_more']), (['ADM-1'], [], False))
+        self.assertEqual(self.client.get(reverse('school_changes'), {'since': page['cursor']}).json()['schools'], [])
+
+    def test_writes_without_newer_timestamp_are_not_skipped(self):
+        cursor = self.sync_all()
+        # Écriture validée avec un horodatage antérieur au dernier envoi, comme
+        # une transaction plus lente ou une migration par QuerySet.update()
+        self.school.save()
+        School.objects.filter(pk=self.school.pk).update(updated_at=timezone.now() - timedelta(days=1))
+        schools, _, _ = self.changes(cursor, limit=10)
+        self.assertEqual(schools, ['ADM-1'])
+
+    def test_old_cursor_restarts_from_snapshot(self):
+        legacy = sync.encode_cursor({'s': [timezone.now().isoformat(), self.other_school.pk], 't': None})
+        schools, _, _ = self.changes(legacy, limit=10)
+        self.assertEqual(schools, ['ADM-1', 'ADM-2'])
+        response = self.client.get(reverse('school_changes'), {'since': 'pas-un-curseur'})
+        self.assertEqual(response.status_code, 400)
+
+
+class RecolteBulkCreateTests(GugeData, TestCase):
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def item(self, **fields):
+        return {
+            'establishment': self.school.pk, 'campaign': str(self.campaign.pk), 'date': timezone.now().isoformat(),
+            'type': 'primaire', 'status': 'valide',
+            'answers': [{'question_uuid': str(self.question.pk), 'answer': '12'}], **fields,
+        }
+
+    def test_bulk_create_updates_derived_data(self):
+        response = self.client.post(
+            reverse('recolte_bulk_create'), [self.item(), self.item(establishment=self.other_school.pk)],
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Answer.objects.filter(question=self.question).count(), 2)
+        stats = CampaignStats.objects.get(campaign=self.campaign)
+        self.assertEqual((stats.total, stats.per_status, stats.schools_covered), (2, {'valide': 2}, 2))
+
+    def test_id_inserted_concurrently_is_reported_as_existing(self):
+        existing = self.make_recolte()
+        fresh_id = uuid.uuid4()
+        filter_ = Recolte.objects.filter
+
+        def filter_missing_concurrent_insert(*args, **kwargs):
+            # La vérification des identifiants passe avant l'insertion concurrente
+            if list(kwargs) == ['pk__in']:
+                return Recolte.objects.none()
+            return filter_(*args, **kwargs)
+
+        with mock.patch.object(Recolte.objects, 'filter', side_effect=filter_missing_concurrent_insert):
+            response = self.client.post(
+                reverse('recolte_bulk_create'), [self.item(id=str(existing.pk)), self.item(id=str(fresh_id))],
+                content_type='application/json',
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([r['status'] for r in response.json()['results']], ['exists', 'created'])
+        self.assertEqual(response.json()['created'], 1)
+        self.assertTrue(Recolte.objects.filter(pk=fresh_id).exists())
+
+
+class IdempotentRecolteCreateTests(GugeData, TestCase):
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.payload = {
+            'establishment': self.school.pk, 'campaign': str(self.campaign.pk),
+            'date': timezone.now().isoformat(), 'type': 'primaire', 'answers': [],
+        }
+
+    def post(self, payload, key='cle-1'):
+        return self.client.post(reverse('recolte_api_list'), payload, content_type='application/json',
+                                HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_first_response(self):
+        first = self.post(self.payload)
+        retry = self.post(self.payload)
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual((retry.status_code, retry['Idempotent-Replayed']), (201, 'true'))
+        self.assertEqual(retry.json()['id'], first.json()['id'])
+        self.assertEqual(Recolte.objects.count(), 1)
+
+    def test_retry_while_first_request_runs_is_rejected(self):
+        self.post(self.payload)
+        # Première requête encore en cours : clé réservée, sans réponse
+        IdempotencyRecord.objects.filter(key='cle-1').update(status_code=None, response=None)
+        Recolte.objects.all().delete()
+
+        response = self.post(self.payload)
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Recolte.objects.exists())
+        self.assertEqual(self.post({**self.payload, 'notes': 'autre'}).status_code, 422)
+
+    def test_abandoned_reservation_is_taken_over(self):
+        self.post(self.payload)
+        # Processus arrêté pendant le traitement : réservation restée sans réponse, écriture annulée
+        IdempotencyRecord.objects.filter(key='cle-1').update(status_code=None, response=None)
+        Recolte.objects.all().delete()
+        self.assertEqual(self.post(self.payload).status_code, 409)
+        IdempotencyRecord.objects.update(created_at=timezone.now() - idempotency.IDEMPOTENCY_PENDING_TIMEOUT - timedelta(seconds=1))
+
+        response = self.post(self.payload)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(IdempotencyRecord.objects.get(key='cle-1').status_code, 201)
+        self.assertEqual(Recolte.objects.count(), 1)
+
+    @mock.patch('guge_app.idempotency.IDEMPOTENCY_MAX_RECORDS', 1)
+    def test_size_bound_keeps_pending_reservations(self):
+        pending = IdempotencyRecord.objects.create(user=self.user, key='en-cours', fingerprint='x')
+        self.post(self.payload, key='cle-1')
+        self.post({**self.payload, 'notes': 'deux'}, key='cle-2')
+        self.assertEqual(set(IdempotencyRecord.objects.values_list('key', flat=True)), {pending.key, 'cle-2'})
+
+    def test_client_id_inserted_concurrently_returns_existing(self):
+        existing = self.make_recolte()
+        lookups = []
+
+        def existing_after_first_lookup(view, recolte_id):
+            lookups.append(recolte_id)
+            return None if len(lookups) == 1 else Recolte.objects.get(pk=recolte_id)
+
+        with mock.patch.object(RecolteViewSet, '_existing', existing_after_first_lookup):
+            response = self.client.post(reverse('recolte_api_list'), {**self.payload, 'id': str(existing.pk)},
+                                        content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['id'], str(existing.pk))
+        self.assertEqual(Recolte.objects.count(), 1)
+
+
+class CampaignStatsTests(GugeData, TestCase):
+
+    def stats(self):
+        stats = CampaignStats.objects.get(campaign=self.campaign)
+        return stats.total, stats.per_status, stats.schools_covered, stats.coverage
+
+    def test_status_changes_keep_school_coverage(self):
+        recolte = self.make_recolte()
+        self.assertEqual(self.stats(), (1, {'en_attente': 1}, 1, 50.0))
+        recolte.status = 'valide'
+        recolte.save()
+        self.assertEqual(self.stats(), (1, {'valide': 1}, 1, 50.0))
+        recolte.status = 'rejete'
+        recolte.save()
+        self.assertEqual(self.stats(), (1, {'rejete': 1}, 1, 50.0))
+
+    def test_moving_and_deleting_recoltes_updates_coverage(self):
+        recolte = self.make_recolte()
+        self.make_recolte()
+        recolte.establishment = self.other_school
+        recolte.save()
+        self.assertEqual(self.stats()[2:], (2, 100.0))
+        recolte.delete()
+        self.assertEqual(self.stats(), (1, {'en_attente': 1}, 1, 50.0))
+
+    def assertScopeMatchesRebuild(self, expected):
+        stored = CampaignStats.objects.get(campaign=self.campaign).schools_in_scope
+        self.assertEqual((stored, compute_campaigns_stats([self.campaign])[self.campaign.pk].schools_in_scope),
+                         (expected, expected))
+
+    def test_school_changes_update_scope(self):
+        self.make_recolte()
+        school = self.make_school('EP Masi', 'ADM-3')
+        self.make_school('Institut Masi', 'ADM-4', level=['secondaire'])
+        self.assertScopeMatchesRebuild(3)
+        school.level = ['secondaire']
+        school.save()
+        self.assertScopeMatchesRebuild(2)
+        self.other_school.delete()
+        self.assertScopeMatchesRebuild(1)
+
+    def test_moving_school_moves_its_province_bucket(self):
+        self.make_recolte()
+        self.make_recolte(school=self.other_school)
+        province = Province.objects.create(name='Kwango', code='KWA')
+        self.school.province = province
+        self.school.save()
+        stats = CampaignStats.objects.get(campaign=self.campaign)
+        self.assertEqual(stats.per_province, {str(self.province.pk): 1, str(province.pk): 1})
+
+        province.name = 'Kwango Nord'
+        province.save()
+        self.assertEqual(campaign_stats_summary(stats)['per_province'], {'Kwilu': 1, 'Kwango Nord': 1})
+
+
+class QuestionnaireBundleTests(GugeData, TestCase):
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        bundle_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(bundle_dir.cleanup)
+        patcher = mock.patch.object(bundles, 'BUNDLE_DIR', Path(bundle_dir.name))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get(self, **headers):
+        return self.client.get(reverse('question_template_bundle'), {'type': 'primaire'}, **headers)
+
+    def test_moving_a_question_changes_the_template_it_leaves(self):
+        other = QuestionTemplate.objects.create(type='secondaire', name='Questionnaire secondaire')
+        etag = self.get()['ETag']
+        self.question.template = other
+        self.question.save()
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]['questions'], [])
+
+    def test_deleted_template_is_not_served_as_unmodified(self):
+        doomed = QuestionTemplate.objects.create(type='primaire', name='Ancien questionnaire')
+        yesterday = timezone.now() - timedelta(days=1)
+        QuestionTemplate.objects.update(updated_at=yesterday)
+        Question.objects.update(updated_at=yesterday)
+        since = self.get()['Last-Modified']
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=since).status_code, 304)
+
+        doomed.delete()
+        response = self.get(HTTP_IF_MODIFIED_SINCE=since)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 1)
+
+    def test_bundle_removed_concurrently_is_rebuilt(self):
+        etag, _ = bundles.bundle_version('primaire')
+        content = bundles.bundle_content(etag, 'primaire')
+        for path in bundles.BUNDLE_DIR.iterdir():
+            path.unlink()
+        self.assertEqual(bundles.bundle_content(etag, 'primaire'), content)
+
+
+class NearestSchoolsTests(GugeData, TestCase):
+
+    def test_keeps_the_closest_schools_within_radius(self):
+        for i, (lat, lon) in enumerate([(-5.03, 18.81), (-5.0, 18.9), (-5.2, 18.6), (-4.3, 15.3), (-5.03, 18.811)]):
+            self.make_school(f'EP {i}', f'GEO-{i}', geo_coord={'latitude': lat, 'longitude': lon})
+        schools = nearest_schools(School.objects.all(), -5.03, 18.81, 50, 3)
+        self.assertEqual([s.name for s in schools], ['EP 0', 'EP 4', 'EP 1'])
+        self.assertEqual(schools[0].distance_km, 0.0)
+        self.assertEqual(len(nearest_schools(School.objects.all(), -5.03, 18.81, 50, 10)), 4)
+
+
+class SchoolSearchTests(GugeData, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.make_school('École Sainte-Thérèse', 'ADM-10')
+        cls.make_school('EP Kimbanseke', 'ADM-11', head_name='Thérèse Mbuyi')
+        cls.make_school('Institut Tshatshi', 'ADM-12')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def search(self, query, **params):
+        response = self.client.get(reverse('school_api_list'), {'search': query, **params})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        return [school['name'] for school in data['results']], data
+
+    def test_accents_case_and_prefixes(self):
+        self.assertEqual(self.search('ECOLE therese')[0], ['École Sainte-Thérèse'])
+        self.assertEqual(self.search('tsha')[0], ['Institut Tshatshi'])
+        self.assertEqual(self.search('adm-12')[0], ['Institut Tshatshi'])
+        self.assertEqual(self.search('introuvable')[0], [])
+
+    def test_ranked_results_page_by_cursor(self):
+        # Le nom pèse plus que le nom du directeur dans le classement bm25
+        self.assertEqual(self.search('therese')[0], ['École Sainte-Thérèse', 'EP Kimbanseke'])
+
+        names, page = self.search('therese', page_size=1)
+        self.assertEqual((names, page['previous']), (['École Sainte-Thérèse'], None))
+        page = self.client.get(page['next']).json()
+        self.assertEqual([s['name'] for s in page['results']], ['EP Kimbanseke'])
+        self.assertIsNone(page['next'])
+        page = self.client.get(page['previous']).json()
+        self.assertEqual([s['name'] for s in page['results']], ['École Sainte-Thérèse'])
+
+
+class CursorPaginationTests(GugeData, TestCase):
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def walk(self, url, key, **params):
+        """Valeurs de `key` sur toutes les pages, en suivant les liens next."""
+        page = self.client.get(url, params).json()
+        values = [item[key] for item in page['results']]
+        while page['next']:
+            page = self.client.get(page['next']).json()
+            values += [item[key] for item in page['results']]
+        return values, page
+
+    def test_school_api_pages(self):
+        for n in range(3, 6):
+            self.make_school(f'EP {n}', f'ADM-{n}', created_at=timezone.now() - timedelta(days=n))
+        codes, last = self.walk(reverse('school_api_list'), 'adm_code', page_size=2)
+        # created_at décroissant, écoles sans date (NULL) en fin, puis id décroissant
+        self.assertEqual(codes, ['ADM-3', 'ADM-4', 'ADM-5', 'ADM-2', 'ADM-1'])
+        self.assertEqual([s['adm_code'] for s in self.client.get(last['previous']).json()['results']], ['ADM-5', 'ADM-2'])
+
+        codes, _ = self.walk(reverse('school_api_list'), 'adm_code', page_size=2, ordering='name')
+        self.assertEqual(codes, ['ADM-3', 'ADM-4', 'ADM-5', 'ADM-2', 'ADM-1'])
+        response = self.client.get(reverse('school_api_list'), {'cursor': 'pas-un-curseur'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_campaign_api_pages(self):
+        now = timezone.now()
+        Campaign.objects.create(name='Campagne 2024', start_date=now - timedelta(days=365), end_date=now)
+        names, _ = self.walk(reverse('campaign_api_list'), 'name', page_size=1, ordering='-start_date')
+        self.assertEqual(names, ['Campagne 2025', 'Campagne 2024'])
+
+    def test_rapport_list_pages(self):
+        recoltes = [self.make_recolte(status='valide', date=timezone.now() - timedelta(hours=n)) for n in range(12)]
+        self.make_recolte(status='en_attente')
+        first = self.client.get(reverse('rapport_list')).context['recoltes']
+        self.assertEqual(list(first), recoltes[:10])
+        self.assertFalse(first.has_previous)
+
+        second = self.client.get(reverse('rapport_list'), {'cursor': first.next_cursor}).context['recoltes']
+        self.assertEqual((list(second), second.has_next), (recoltes[10:], False))
+        back = self.client.get(reverse('rapport_list'), {'cursor': second.previous_cursor}).context['recoltes']
+        self.assertEqual(list(back), recoltes[:10])
+        # Curseur illisible : première page plutôt qu'une erreur
+        self.assertEqual(list(self.client.get(reverse('rapport_list'), {'cursor': 'x'}).context['recoltes']), recoltes[:10])
+
+
+class QuestionStatsApiTests(GugeData, TestCase):
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        town = self.make_school('EP Kikwit-Ville', 'ADM-3', environment='urbain')
+        for value in (2, 4, 6, 8):
+            self.make_recolte(status='valide', value=value)
+        for value in (10, 20):
+            self.make_recolte(school=town, status='valide', value=value)
+        self.make_recolte(status='en_attente', value=1000)
+
+    def stats(self, **params):
+        return self.client.get(reverse('question_stats', args=[self.question.pk]), params)
+
+    def test_total_and_percentiles(self):
+        data = self.stats(campaign=str(self.campaign.pk)).json()
+        self.assertEqual(data['total'], {
+            'count': 6, 'sum': 50.0, 'mean': 8.3333, 'min': 2.0, 'max': 20.0,
+            # Rang le plus proche sur 2, 4, 6, 8, 10, 20
+            'percentiles': {'p10': 2.0, 'p25': 4.0, 'p50': 6.0, 'p75': 10.0, 'p90': 20.0},
+        })
+        self.assertNotIn('groups', data)
+
+    def test_group_by(self):
+        data = self.stats(group_by='environment').json()
+        groups = {g['label']: g for g in data['groups']}
+        self.assertEqual([g['key'] for g in data['groups']], ['rural', 'urbain'])
+        self.assertEqual((groups['Rural']['count'], groups['Rural']['percentiles']['p50']), (4, 4.0))
+        self.assertEqual((groups['Urbain']['sum'], groups['Urbain']['percentiles']['p90']), (30.0, 20.0))
+
+        data = self.stats(group_by='province').json()
+        self.assertEqual([(g['key'], g['label'], g['count']) for g in data['groups']], [(self.province.pk, 'Kwilu', 6)])
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.stats(group_by='village').json(), {'error': 'group_by inconnu : village.'})
+        self.assertEqual(self.stats(campaign='x').status_code, 400)
+        text = Question.objects.create(template=self.template, text='Remarques', kind='text')
+        response = self.client.get(reverse('question_stats', args=[text.pk]))
+        self.assertEqual(response.status_code, 400)
+
+
+class RecolteExportTests(GugeData, TestCase):
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def export(self, **params):
+        response = self.client.get(reverse('recolte_export'), params)
+        return response, b''.join(response.streaming_content).decode() if response.streaming else None
+
+    def test_unknown_format_is_rejected(self):
+        response, _ = self.export(format='pdf')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'Format inconnu : pdf.'})
+
+    def test_formulas_are_neutralized_in_csv(self):
+        self.question.text = '=Effectif'
+        self.question.save()
+        school = self.make_school('=HYPERLINK("http://x")', 'ADM-3')
+        self.make_recolte(school=school, status='valide', value='@SUM(A1)')
+        self.make_recolte(status='valide', value=-5)
+
+        response, content = self.export(format='csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(",'=Effectif", content.splitlines()[0])
+        self.assertIn('\'=HYPERLINK(""http://x"")', content)
+        self.assertIn("'@SUM(A1)", content)
+        self.assertIn(',-5', content)
+        self.assertNotIn("'-5", content)
+
+        _, content = self.export(format='jsonl')
+        self.assertIn('"=HYPERLINK(\\"http://x\\")"', content)
+
+    def test_xlsx_keeps_values_as_entered(self):
+        self.make_recolte(status='valide', value=-5)
+        self.make_recolte(school=self.other_school, status='valide', value='+243 81 234 5678')
+
+        response = self.client.get(reverse('recolte_export'), {'format': 'xlsx'})
+        with zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))) as archive:
+            sheet = archive.read('xl/worksheets/sheet1.xml').decode()
+        # Chaînes en ligne : jamais évaluées par le tableur, donc pas d'apostrophe
+        self.assertIn('<c><v>-5</v></c>', sheet)
+        self.assertIn('<t xml:space="preserve">+243 81 234 5678</t>', sheet)
+        self.assertNotIn(">'", sheet)
+
+
+class JobQueueTests(GugeData, TestCase):
+
+    def test_enqueue_validates_kind_and_params(self):
+        with self.assertRaisesMessage(jobs.InvalidJobParams, 'Traitement inconnu'):
+            jobs.enqueue('inconnu')
+        with self.assertRaisesMessage(jobs.InvalidJobParams, 'Campagne introuvable'):
+            jobs.enqueue('rebuild_campaign_stats', {'campaign': 'x'})
+        job = jobs.enqueue('rebuild_campaign_stats', {'campaign': self.campaign.pk}, user=self.staff)
+        self.assertEqual((job.status, job.params), ('en_attente', {'campaign': str(self.campaign.pk)}))
+
+    def test_claim_takes_oldest_pending_job_once(self):
+        first = jobs.enqueue('rebuild_campaign_stats')
+        second = jobs.enqueue('rebuild_campaign_stats')
+        Job.objects.filter(pk=second.pk).update(created_at=first.created_at - timedelta(minutes=1))
+
+        self.assertEqual(jobs.claim_next_job('hote:1'), second.pk)
+        self.assertEqual(jobs.claim_next_job('hote:2'), first.pk)
+        self.assertIsNone(jobs.claim_next_job('hote:3'))
+        self.assertEqual(Job.objects.get(pk=second.pk).worker, 'hote:1')
+
+    def test_run_job_records_success(self):
+        self.make_recolte(status='valide')
+        job_id = jobs.enqueue('rebuild_campaign_stats', {'campaign': self.campaign.pk}).pk
+        jobs.claim_next_job('hote:1')
+
+        self.assertEqual(jobs.run_job(job_id), 'termine')
+        job = Job.objects.get(pk=job_id)
+        self.assertEqual((job.status, job.progress, job.message), ('termine', 100, '1 campagne(s) recalculée(s)'))
+        self.assertIsNotNone(job.finished_at)
+
+    def test_run_job_records_failure(self):
+        def fail(context):
+            raise RuntimeError('panne')
+
+        with mock.patch.dict(jobs.JOB_KINDS, {'panne': jobs.JobKind(fail, dict)}):
+            job_id = jobs.enqueue('panne').pk
+            jobs.claim_next_job('hote:1')
+            self.assertEqual(jobs.run_job(job_id), 'echec')
+        job = Job.objects.get(pk=job_id)
+        self.assertEqual((job.status, job.message), ('echec', 'panne'))
+        self.assertIn('RuntimeError', job.error)
+
+    def test_national_jobs_are_reserved_to_staff(self):
+        self.client.force_login(self.user)
+        for kind in ('rebuild_campaign_stats', 'build_cube', 'fiches_pdf'):
+            response = self.client.post(reverse('job_create'), {'kind': kind}, content_type='application/json')
+            self.assertEqual(response.status_code, 403, kind)
+        response = self.client.post(reverse('job_create'), {'kind': 'export_recoltes'}, content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+
+        self.client.force_login(self.staff)
+        response = self.client.post(reverse('job_create'), {'kind': 'build_cube'}, content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(Job.objects.count(), 2)
+
+    def test_fiches_render_in_a_process_pool(self):
+        self.make_recolte(status='valide')
+        self.make_recolte(school=self.other_school, status='valide')
+        fiches = list(iter_fiches(fiche_queryset()))
+        self.assertEqual(list(render_fiches(fiches, workers=2)), list(render_fiches(fiches)))
+
+    def test_only_stale_jobs_are_requeued(self):
+        stale = jobs.enqueue('rebuild_campaign_stats')
+        alive = jobs.enqueue('rebuild_campaign_stats')
+        jobs.claim_next_job('hote:1')
+        jobs.claim_next_job('hote:2')
+        Job.objects.filter(pk=stale.pk).update(updated_at=timezone.now() - jobs.STALE_AFTER - timedelta(seconds=1))
+
+        self.assertEqual(jobs.requeue_stale(), 1)
+        self.assertEqual(
+            dict(Job.objects.values_list('pk', 'status')), {stale.pk: 'en_attente', alive.pk: 'en_cours'}
+        )
+
+    def test_requeued_job_is_not_finished_by_its_former_worker(self):
+        job_id = jobs.enqueue('rebuild_campaign_stats').pk
+        jobs.claim_next_job('hote:1')
+
+        def requeue_and_reclaim(context, **params):
+            Job.objects.filter(pk=job_id).update(status='en_attente')
+            jobs.claim_next_job('hote:2')
+
+        with mock.patch.dict(jobs.JOB_KINDS, {'rebuild_campaign_stats': jobs.JobKind(requeue_and_reclaim, dict)}):
+            jobs.run_job(job_id)
+        job = Job.objects.get(pk=job_id)
+        self.assertEqual((job.status, job.worker), ('en_cours', 'hote:2'))
+
+
+class CacheVersionTests(GugeData, TestCase):
+
+    def bump_elsewhere(self, name):
+        # Incrément fait par un autre processus : rien ne passe par le cache local
+        if not CacheVersion.objects.filter(name=name).update(version=F('version') + 1):
+            CacheVersion.objects.create(name=name, version=1)
+
+    def test_question_stats_follow_school_groups(self):
+        self.make_recolte(status='valide', value=4)
+        other = Province.objects.create(name='Kwango', code='KWA')
+        self.assertEqual([g['label'] for g in question_stats(self.question, self.campaign, 'province')['groups']], ['Kwilu'])
+
+        self.school.province = other
+        self.school.save()
+        self.assertEqual([g['label'] for g in question_stats(self.question, self.campaign, 'province')['groups']], ['Kwango'])
+
+    def test_versions_bumped_by_another_process_are_seen(self):
+        self.make_recolte(status='valide', value=4)
+        self.assertEqual(question_stats(self.question, self.campaign)['total']['count'], 1)
+        autocomplete('province', 'kw')
+        geo_hierarchy()
+
+        Province.objects.filter(pk=self.province.pk).update(name='Kwilu Nord')
+        Answer.objects.filter(question=self.question).update(numeric_value=None)
+        for name in ('geo_hierarchy', 'autocomplete:province', f'question_stats:{self.campaign.pk}'):
+            self.bump_elsewhere(name)
+
+        self.assertIsNone(question_stats(self.question, self.campaign)['total'])
+        self.assertEqual([e.label for e in autocomplete('province', 'kw')], ['Kwilu Nord'])
+        self.assertIn('Kwilu Nord', geo_hierarchy()[0].decode())
+
+
+class CubeTests(GugeData, TestCase):
+
+    def cells(self):
+        fields = ['question_id', 'province_id', 'division_id', 'management_regime', 'environment', 'level',
+                  'count', 'total', 'minimum', 'maximum']
+        return sorted(CubeCell.objects.filter(campaign=self.campaign).values_list(*fields), key=str)
+
+    def test_incremental_refresh_matches_rebuild_under_lock(self):
+        self.make_recolte(status='valide', value=3)
+        build_campaign_cube(self.campaign)
+        recolte = self.make_recolte(school=self.other_school, value=5)
+
+        with mock.patch.object(CampaignStats.objects, 'select_for_update',
+                               wraps=CampaignStats.objects.select_for_update) as lock:
+            recolte.status = 'valide'
+            recolte.save()
+        self.assertTrue(lock.called)
+        incremental = self.cells()
+        build_campaign_cube(self.campaign)
+        self.assertEqual(incremental, self.cells())
+        self.assertIn((self.question.pk, self.province.pk, self.division.pk, 'Catholique', 'rural', 'primaire',
+                       2, 8.0, 3.0, 5.0), incremental)
+
+    def test_one_cell_per_coordinates(self):
+        self.make_recolte(status='valide')
+        build_campaign_cube(self.campaign)
+        for question in (self.question, None):
+            cell = CubeCell.objects.get(campaign=self.campaign, question=question)
+            cell.pk = None
+            with self.assertRaises(IntegrityError), transaction.atomic():
+                cell.save()
+
+
+class RapportPdfBatchTests(GugeData, TestCase):
+
+    def setUp(self):
+        self.make_recolte(status='valide')
+        self.make_recolte(school=self.other_school, status='valide')
+
+    def test_small_batch_is_streamed(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('rapport_pdf_batch'))
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'PK'))
+
+    @mock.patch('guge_app.views.PDF_BATCH_MAX_FICHES', 1)
+    def test_large_batch_is_refused_or_queued(self):
+        self.client.force_login(self.user)
+        self.assertRedirects(self.client.get(reverse('rapport_pdf_batch')), reverse('rapport_list'),
+                             fetch_redirect_response=False)
+        self.assertFalse(Job.objects.exists())
+
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('rapport_pdf_batch'), {'campaign': self.campaign.pk})
+        self.assertEqual(response.status_code, 302)
+        job = Job.objects.get()
+        self.assertEqual((job.kind, job.params['campaign'], job.created_by), ('fiches_pdf', str(self.campaign.pk), self.staff))
+
+
+class RecolteQuestionMapTests(GugeData, TestCase):
+
+    def test_answers_outside_campaign_templates_are_resolved(self):
+        other = QuestionTemplate.objects.create(type='secondaire', name='Questionnaire secondaire')
+        extra = Question.objects.create(template=other, text='Nombre de classes', kind='number')
+        recolte = self.make_recolte(status='valide', answers=[
+            {'question_uuid': str(self.question.pk), 'answer': '10'},
+            {'question_uuid': str(extra.pk), 'answer': '4'},
+            {'question_uuid': str(uuid.uuid4()), 'answer': '1'},
+        ])
+
+        question_map = recolte_question_map(recolte)
+        self.assertEqual(question_map[extra.pk].text, 'Nombre de classes')
+        self.assertEqual(question_map[self.question.pk].text, "Nombre d'élèves")
+
+        fiche = next(iter_fiches(fiche_queryset(self.campaign, None)))
+        answers = dict(qa for _, questions in fiche.sections for qa in questions)
+        self.assertEqual((answers["Nombre d'élèves"], answers['Nombre de classes']), ('10', '4'))
+
+
+class QueryPlanTests(TestCase):
+    """Les requêtes des vues fréquentes passent par un index (plans SQLite)."""
+
+    def test_hot_queries_use_an_index(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest("Plans vérifiés sous SQLite uniquement.")
+        for name, queryset in hot_queries():
+            with self.subTest(name):
+                plan = queryset.explain()
+                self.assertEqual(plan_problems(plan), [], plan)
+
+
+class QueryBudgetTests(GugeData, QueryBudgetMixin, TestCase):
+    """Les vues fréquentes restent dans le budget de requêtes qu'elles déclarent."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        now = timezone.now()
+        for i in range(6):
+            campaign = Campaign.objects.create(name=f'Campagne {i}', start_date=now, end_date=now + timedelta(days=30))
+            campaign.question_templates.add(cls.template)
+        # Statistiques jamais calculées : le cas le plus coûteux
+        CampaignStats.objects.all().delete()
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+        self.recolte = self.make_recolte(status='valide')
+        self.make_recolte(school=self.other_school)
+        CampaignStats.objects.all().delete()
+
+    def test_home(self):
+        self.assertEqual(self.assertWithinQueryBudget(reverse('home')).status_code, 200)
+
+    def test_recolte_detail(self):
+        response = self.assertWithinQueryBudget(reverse('recolte_detail', args=[self.recolte.pk]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_rapport_detail(self):
+        response = self.assertWithinQueryBudget(reverse('rapport_detail', args=[self.recolte.pk]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_recolte_lists(self):
+        for _ in range(12):
+            self.make_recolte(school=self.other_school, status='valide')
+        # Une page pleine coûte autant qu'une ligne : pas de requête par récolte affichée
+        response = self.assertWithinQueryBudget(reverse('rapport_list'))
+        self.assertEqual(len(response.context['recoltes']), 10)
+        response = self.assertWithinQueryBudget(reverse('recolte_list', args=['primaire']))
+        self.assertEqual(len(response.context['recoltes']), 10)
+
+    def test_geo_hierarchy(self):
+        Province.objects.create(name='Kwango', code='KWA')
+        response = self.assertWithinQueryBudget(reverse('geo_hierarchy'))
+        self.assertIn('Kwango', response.content.decode())
+        # Arbre en mémoire : une seule lecture de la version après la session
+        response = self.assertWithinQueryBudget(
+            reverse('geo_hierarchy'), budget=3, HTTP_IF_NONE_MATCH=response['ETag'],
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_campaign_list(self):
+        response = self.assertWithinQueryBudget(reverse('campaign_list'))
+        self.assertContains(response, self.template.name)
+
+    def test_campaign_api_with_cold_stats(self):
+        response = self.assertWithinQueryBudget(reverse('campaign_api_list'))
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual(len(results), 7)
+        self.assertEqual(sorted(c['recolte_count'] for c in results), [0] * 6 + [2])
+        self.assertEqual(CampaignStats.objects.count(), 7)
+        # Statistiques en place : plus aucune reconstruction
+        self.assertWithinQueryBudget(reverse('campaign_api_list'), budget=5)
+
+
+class RecolteWriteQueryTests(GugeData, QueryBudgetMixin, TestCase):
+    """Le chemin d'écriture des récoltes ne recalcule que ce qui change."""
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.recolte = self.make_recolte()
+        # Versions des statistiques déjà créées, comme en production
+        invalidate_question_stats({self.campaign.pk})
+
+    def test_api_create_and_validate(self):
+        payload = {
+            'establishment': self.school.pk, 'campaign': str(self.campaign.pk), 'date': timezone.now().isoformat(),
+            'type': 'primaire', 'status': 'valide',
+            'answers': [{'question_uuid': str(self.question.pk), 'answer': '7'}],
+        }
+        response = self.assertWithinQueryBudget(reverse('recolte_api_list'), method='post', data=payload,
+                                                content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        response = self.assertWithinQueryBudget(reverse('recolte_api_detail', args=[self.recolte.pk]), method='patch',
+                                                data={'status': 'valide'}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(CampaignStats.objects.get(campaign=self.campaign).per_status, {'valide': 2})
+
+    def test_save_only_touches_what_changed(self):
+        with self.assertNumQueries(2):
+            self.recolte.notes = 'Revu'
+            self.recolte.save()
+        # Statut : compteurs (verrou, mise à jour), versions des statistiques, cube non construit
+        with self.assertNumQueries(8):
+            self.recolte.status = 'valide'
+            self.recolte.save()
+        # Réponses d'une récolte validée : lignes Answer, versions et cube
+        with self.assertNumQueries(9):
+            self.recolte.answers = [{'question_uuid': str(self.question.pk), 'answer': '11'}]
+            self.recolte.save()
+        self.assertEqual(list(Answer.objects.filter(recolte=self.recolte).values_list('numeric_value', flat=True)), [11.0])
+
+
+class GenerateDatasetTests(TestCase):
+
+    def generate(self, **options):
+        call_command('generate_dataset', schools=30, recoltes=60, campaigns=1, questions=4,
+                     divisions_per_province=1, sub_divisions_per_division=1, stdout=mock.MagicMock(), **options)
+
+    def test_reset_replaces_generated_data_and_rebuilds_derived_data(self):
+        self.generate()
+        old_schools = set(School.objects.values_list('adm_code', flat=True))
+        self.generate(reset=True, seed=7)
 
-# Create your tests here.
+        self.assertEqual(Campaign.objects.count(), 1)
+        self.assertEqual(Recolte.objects.count(), 60)
+        self.assertFalse(Answer.objects.exclude(recolte__in=Recolte.objects.all()).exists())
+        campaign = Campaign.objects.get()
+        stats = CampaignStats.objects.get(campaign=campaign)
+        self.assertEqual(stats.total, 60)
+        self.assertIsNotNone(stats.cube_built_at)
+        validated = Recolte.objects.filter(status='valide').count()
+        self.assertEqual(sum(CubeCell.objects.filter(campaign=campaign, question=None).values_list('count', flat=True)), validated)
+        tombstones = ChangeJournal.objects.filter(entity='school', action='delete')
+        self.assertEqual({entry.data['adm_code'] for entry in tombstones}, old_schools)
@@ -5,6 +5,8 @@ from . import views
 
 urlpatterns = [
     path('', views.home, name='home'),
+    path('perf/', views.perf_dashboard, name='perf_dashboard'),
+    path('perf/metrics/', views.perf_metrics, name='perf_metrics'),
     path('schools/', views.school_list, name='school_list'),
     path('schools/map/', views.school_map, name='school_map'),
     path('schools/add/', views.school_form, name='school_add'),
@@ -32,6 +34,7 @@ urlpatterns = [
     path('campagnes/<uuid:pk>/edit/', views.campaign_edit, name='campaign_edit'),
     path('campagnes/<uuid:pk>/delete/', views.campaign_delete, name='campaign_delete'),
     path('rapports/', views.rapport_list, name='rapport_list'),
+    path('rapports/pdf/', views.rapport_pdf_batch, name='rapport_pdf_batch'),
     path('rapports/<uuid:pk>/', views.rapport_detail, name='rapport_detail'),
     path('recoltes/<str:type_recolte>/', views.recolte_list, name='recolte_list'),
     path('recoltes/<uuid:pk>/answer/', views.recolte_answer, name='recolte_answer'),
@@ -0,0 +1,43 @@
+# versions.py
+"""Versions des contenus en cache, tenues en base (modèle CacheVersion).
+
+Le cache par défaut est propre à chaque processus : un compteur qui y serait
+stocké ne serait pas vu des autres workers. La version est donc lue en base
+(une requête sur clé primaire) et sert de suffixe aux clés de cache ou de
+repère aux structures gardées en mémoire.
+
+Une nouvelle version vaut au moins l'horloge en nanosecondes : une
+transaction annulée après une incrémentation ne rend pas son numéro
+réutilisable. Sinon un cache construit dans cette transaction (données
+jamais validées) serait resservi après la modification suivante.
+"""
+import time
+
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+
+from .models import CacheVersion
+
+
+def _next_version():
+    return Greatest(F('version') + 1, Value(time.time_ns()))
+
+
+def bump_versions(*names):
+    """Incrémente les versions données (créées au besoin) ; une requête quand elles existent toutes."""
+    names = set(names)
+    if CacheVersion.objects.filter(name__in=names).update(version=_next_version()) == len(names):
+        return
+    # Première incrémentation : les lignes manquantes sont créées à 0 puis toutes incrémentées
+    CacheVersion.objects.bulk_create([CacheVersion(name=name) for name in names], ignore_conflicts=True)
+    CacheVersion.objects.filter(name__in=names).update(version=_next_version())
+
+
+def current_versions(*names):
+    """Tuple des versions courantes, dans l'ordre des noms (0 si jamais incrémentée)."""
+    versions = dict(CacheVersion.objects.filter(name__in=names).values_list('name', 'version'))
+    return tuple(versions.get(name, 0) for name in names)
+
+
+def current_version(name):
+    return current_versions(name)[0]
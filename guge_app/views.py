@@ -1,17 +1,47 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse
-from .models import School, Province, Division, SubDivision, City, Territory, QuestionTemplate, Question, Recolte, Groupe, Campaign
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse, FileResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+import gzip
+from .models import School, Province, Division, SubDivision, City, Territory, QuestionTemplate, Question, Recolte, Groupe, Campaign, Job
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.conf import settings
+from django.utils.crypto import constant_time_compare
+from mng_users.views import staff_required
 from django.core.paginator import Paginator
 from django.contrib.auth.models import User
-from .serializers import SchoolSerializer, QuestionTemplateSerializer, SchoolSyncSerializer, RecolteSerializer, UserSerializer, CampaignSerializer
+from .serializers import is_expanded, SchoolSerializer, SchoolTombstoneSerializer, ChangeJournalSerializer, QuestionTemplateSerializer, QuestionTemplateSummarySerializer, SchoolSyncSerializer, RecolteSerializer, RecolteBulkItemSerializer, UserSerializer, CampaignSerializer, JobSerializer
+from .sync import school_changes as get_school_changes, journal_since, InvalidCursor, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 from .filters import SchoolFilter
+from .parsers import NDJSONParser
+from .renderers import CSVRenderer, JSONLinesRenderer, XLSXRenderer, ExportContentNegotiation, content_negotiation
+from .export import EXPORT_FORMATS, parse_export_params, export_filename, stream_export
+from .idempotency import idempotent
+from .jobs import enqueue, InvalidJobParams, JobNotAllowed
+from .fiches import parse_fiche_filters, fiches_filename, fiche_queryset, iter_fiches, render_fiches, stream_zip
+from .bundles import bundle_version, bundle_content
+from .geo import parse_bbox, clustered_features, nearest_schools
+from .search import SchoolSearchFilter
+from .hierarchy import geo_hierarchy
+from .pagination import keyset_page
+from .perf import query_budget, snapshot as perf_snapshot, prometheus_text, reset as perf_reset
+from .autocomplete import ENTITIES as AUTOCOMPLETE_ENTITIES, DEFAULT_LIMIT as AUTOCOMPLETE_LIMIT, autocomplete
+from .signals import on_recoltes_created
+from .stats import dashboard_stats, question_stats, QUESTION_STATS_GROUPS, campaign_stats, campaign_stats_summary, ensure_campaigns_stats
+from .cube import CUBE_DIMENSIONS, cube_built, query_cube
+from .answers import answer_items, resolve_answers, recolte_question_map, report_sections
 from rest_framework import viewsets, permissions
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
 from datetime import datetime
-from rest_framework.decorators import api_view, permission_classes
+import uuid
+from rest_framework.decorators import api_view, permission_classes, parser_classes, renderer_classes
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Prefetch
 from rest_framework.response import Response
 from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
@@ -27,6 +57,175 @@ def recoltes_mine(request):
         'recoltes': serializer.data
     })
 
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+@renderer_classes([JSONRenderer, CSVRenderer, JSONLinesRenderer, XLSXRenderer])
+@content_negotiation(ExportContentNegotiation)
+def recolte_export(request):
+    """Exporte les récoltes validées (csv, jsonl ou xlsx), une colonne par question.
+
+    Filtres optionnels : campaign (uuid) et type. Le fichier est produit au fil
+    de l'eau, sans charger les récoltes en mémoire.
+    """
+    try:
+        export_format, campaign, recolte_type = parse_export_params(request.query_params)
+    except ValueError as exc:
+        return Response({"error": str(exc)}, status=400)
+
+    response = StreamingHttpResponse(
+        stream_export(export_format, campaign, recolte_type),
+        content_type=EXPORT_FORMATS[export_format][0],
+    )
+    response['Content-Disposition'] = f'attachment; filename="{export_filename(export_format, campaign, recolte_type)}"'
+    return response
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def job_create(request):
+    """Met en file un traitement long : {"kind": ..., "params": {...}}.
+
+    Le travail est exécuté par la commande run_jobs ; son état se consulte
+    sur l'URL retournée dans l'en-tête Location. Les traitements nationaux
+    (statistiques, cube, fiches PDF) sont réservés au personnel.
+    """
+    params = request.data.get('params') or {}
+    if not isinstance(params, dict):
+        return Response({"error": "params doit être un objet."}, status=400)
+    try:
+        job = enqueue(request.data.get('kind'), params, user=request.user)
+    except InvalidJobParams as exc:
+        return Response({"error": str(exc)}, status=400)
+    except JobNotAllowed as exc:
+        return Response({"error": str(exc)}, status=403)
+    serializer = JobSerializer(job, context={'request': request})
+    return Response(serializer.data, status=202, headers={'Location': request.build_absolute_uri(reverse('job_detail', args=[job.pk]))})
+
+def _visible_job(request, pk):
+    """Un travail n'est visible que par son auteur et le personnel."""
+    jobs = Job.objects.all() if request.user.is_staff else Job.objects.filter(created_by=request.user)
+    return get_object_or_404(jobs, pk=pk)
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def job_detail(request, pk):
+    """État et progression d'un travail (à interroger périodiquement)."""
+    return Response(JobSerializer(_visible_job(request, pk), context={'request': request}).data)
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def job_result(request, pk):
+    """Télécharge le fichier produit par un travail terminé."""
+    job = _visible_job(request, pk)
+    if job.status != 'termine' or not job.result:
+        return Response({"error": "Aucun résultat disponible pour ce travail."}, status=404)
+    return FileResponse(job.result.open('rb'), as_attachment=True, filename=job.result.name.rsplit('/', 1)[-1])
+
+BULK_MAX_ITEMS = 1000
+BULK_CHUNK_SIZE = 200
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+@parser_classes([JSONParser, NDJSONParser])
+def recolte_bulk_create(request):
+    """Enregistre un lot de récoltes (liste JSON ou flux NDJSON) en une transaction.
+
+    Chaque élément reçoit son propre statut : les éléments invalides sont
+    signalés sans empêcher l'enregistrement des autres. Les récoltes dont
+    l'identifiant client existe déjà sont signalées `exists` sans être réécrites.
+    """
+    return idempotent(request, lambda: _recolte_bulk_create(request))
+
+
+def _recolte_bulk_create(request):
+    items = request.data.get('recoltes') if isinstance(request.data, dict) else request.data
+    if not isinstance(items, list):
+        return Response({"error": "Une liste de récoltes est attendue."}, status=400)
+    if len(items) > BULK_MAX_ITEMS:
+        return Response({"error": f"Maximum {BULK_MAX_ITEMS} récoltes par envoi."}, status=400)
+
+    results = [None] * len(items)
+    valid = []
+    for index, item in enumerate(items):
+        serializer = RecolteBulkItemSerializer(data=item)
+        if serializer.is_valid():
+            valid.append((index, serializer.validated_data))
+        else:
+            results[index] = {"index": index, "status": "error", "errors": serializer.errors}
+
+    # Résolution des clés étrangères : une requête IN par modèle
+    schools = School.objects.in_bulk({data['establishment'] for _, data in valid})
+    campaigns = Campaign.objects.in_bulk({data['campaign'] for _, data in valid if data.get('campaign')})
+    collectors = User.objects.in_bulk({data['collector_id'] for _, data in valid if data.get('collector_id')})
+    seen_ids = set(Recolte.objects.filter(
+        pk__in=[data['id'] for _, data in valid if data.get('id')]
+    ).values_list('pk', flat=True))
+
+    to_create = []
+    for index, data in valid:
+        if data.get('id') in seen_ids:
+            results[index] = {"index": index, "status": "exists", "id": str(data['id'])}
+            continue
+        errors = {}
+        if data['establishment'] not in schools:
+            errors['establishment'] = ["École introuvable."]
+        if data.get('campaign') and data['campaign'] not in campaigns:
+            errors['campaign'] = ["Campagne introuvable."]
+        if data.get('collector_id') and data['collector_id'] not in collectors:
+            errors['collector_id'] = ["Collecteur introuvable."]
+        if errors:
+            results[index] = {"index": index, "status": "error", "errors": errors}
+            continue
+        recolte = Recolte(
+            establishment_id=data['establishment'],
+            campaign_id=data.get('campaign'),
+            collector_id_id=data.get('collector_id') or request.user.pk,
+            date=data['date'],
+            notes=data['notes'],
+            type=data['type'],
+            answers=data['answers'],
+            status=data['status'],
+        )
+        if data.get('id'):
+            recolte.id = data['id']
+            seen_ids.add(data['id'])
+        to_create.append((index, recolte))
+
+    created = []
+    with transaction.atomic():
+        for start in range(0, len(to_create), BULK_CHUNK_SIZE):
+            chunk = to_create[start:start + BULK_CHUNK_SIZE]
+            try:
+                with transaction.atomic():
+                    Recolte.objects.bulk_create([recolte for _, recolte in chunk])
+                created.extend(chunk)
+            except IntegrityError:
+                # Identifiant client inséré entre-temps par un envoi concurrent : un par un
+                for index, recolte in chunk:
+                    try:
+                        with transaction.atomic():
+                            Recolte.objects.bulk_create([recolte])
+                        created.append((index, recolte))
+                    except IntegrityError:
+                        results[index] = {"index": index, "status": "exists", "id": str(recolte.id)}
+        # bulk_create n'émet pas post_save
+        on_recoltes_created([recolte for _, recolte in created])
+    for index, recolte in created:
+        results[index] = {"index": index, "status": "created", "id": str(recolte.id)}
+
+    failed = sum(1 for result in results if result['status'] == 'error')
+    if not failed:
+        status = 201 if created else 200
+    elif failed < len(items):
+        status = 207
+    else:
+        status = 400
+    return Response({
+        "created": len(created),
+        "failed": failed,
+        "results": results,
+    }, status=status)
+
 # APIS
 @api_view(['POST'])
 def sync_schools_by_codes(request):
@@ -40,6 +239,46 @@ def sync_schools_by_codes(request):
         "schools": serializer.data
     })
 
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def school_changes(request):
+    """Retourne les écoles créées, modifiées ou supprimées depuis le curseur `since`."""
+    try:
+        limit = int(request.query_params.get("limit", DEFAULT_PAGE_SIZE))
+        changes = get_school_changes(request.query_params.get("since"), limit)
+    except (InvalidCursor, ValueError):
+        return Response({"error": "Paramètre since ou limit invalide."}, status=400)
+
+    return Response({
+        "schools": SchoolSerializer(changes["schools"], many=True).data,
+        "deleted": SchoolTombstoneSerializer(changes["deleted"], many=True).data,
+        "cursor": changes["cursor"],
+        "has_more": changes["has_more"],
+    })
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def change_journal(request):
+    """Retourne les entrées du journal des changements après le numéro de séquence `since`.
+
+    Paramètre `entity` optionnel, répétable ou séparé par des virgules
+    (school, question_template, question, groupe, campaign).
+    """
+    try:
+        since = int(request.query_params.get("since", 0))
+        limit = max(1, min(int(request.query_params.get("limit", DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE))
+    except ValueError:
+        return Response({"error": "Paramètre since ou limit invalide."}, status=400)
+    entities = [e for value in request.query_params.getlist("entity") for e in value.split(",") if e]
+
+    entries = list(journal_since(since, entities=entities, limit=limit + 1))
+    page = entries[:limit]
+    return Response({
+        "changes": ChangeJournalSerializer(page, many=True).data,
+        "last_seq": page[-1].id if page else since,
+        "has_more": len(entries) > limit,
+    })
+
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def get_current_user(request):
@@ -59,14 +298,83 @@ class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
 class MyTokenObtainPairView(TokenObtainPairView):
     serializer_class = MyTokenObtainPairSerializer
 
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def question_template_bundle(request):
+    """Paquet complet des questionnaires (questions et groupes), compressé et versionné.
+
+    Répond 304 si l'ETag (If-None-Match) ou la date (If-Modified-Since) du
+    client correspondent à la version courante.
+    """
+    template_type = request.query_params.get('type')
+    if template_type and template_type not in dict(QuestionTemplate.TYPE_CHOICES):
+        return Response({"error": "Type de questionnaire invalide."}, status=400)
+
+    etag, last_modified = bundle_version(template_type)
+    headers = {
+        'ETag': quote_etag(etag),
+        'Cache-Control': 'private, no-cache',
+        'Vary': 'Accept-Encoding, Authorization',
+    }
+    if last_modified:
+        headers['Last-Modified'] = http_date(last_modified.timestamp())
+
+    response = get_conditional_response(
+        request._request,
+        etag=headers['ETag'],
+        last_modified=int(last_modified.timestamp()) if last_modified else None,
+    )
+    if response is None:
+        content = bundle_content(etag, template_type)
+        if 'gzip' in request.headers.get('Accept-Encoding', ''):
+            response = HttpResponse(content, content_type='application/json')
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(gzip.decompress(content), content_type='application/json')
+    for header, value in headers.items():
+        response[header] = value
+    return response
+
+# 3 requêtes quand l'arbre est à jour en mémoire, 304 compris (session, utilisateur,
+# version partagée) ; 5 de plus pour le reconstruire après une modification
+@query_budget(8)
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def geo_hierarchy_api(request):
+    """Arbre complet Province → Division → SubDivision et Province → City / Territory.
+
+    Chaque niveau est une liste de lignes décrites par `columns` ; répond 304
+    si l'ETag du client (If-None-Match) correspond à la version courante,
+    qui est lue en base (CacheVersion) à chaque requête.
+    """
+    content, etag = geo_hierarchy()
+    response = get_conditional_response(request._request, etag=quote_etag(etag))
+    if response is None:
+        response = HttpResponse(content, content_type='application/json')
+    response['ETag'] = quote_etag(etag)
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
 class QuestionTemplateViewSet(viewsets.ReadOnlyModelViewSet):
+    """Questionnaires : résumé en liste, arbre des questions sur le détail ou avec ?expand=questions."""
     permission_classes = [permissions.IsAuthenticated]
 
-    queryset = QuestionTemplate.objects.prefetch_related("questions").all()
+    queryset = QuestionTemplate.objects.all()
     serializer_class = QuestionTemplateSerializer
 
     filterset_fields = ["type"]   # pour filtrer par type
 
+    def get_serializer_class(self):
+        if is_expanded({'view': self, 'request': self.request}, 'questions'):
+            return QuestionTemplateSerializer
+        return QuestionTemplateSummarySerializer
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if is_expanded({'view': self, 'request': self.request}, 'questions'):
+            return queryset.prefetch_related("questions__groupe")
+        return queryset.annotate(nb_questions=Count("questions"))
+
 class SchoolViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
@@ -81,14 +389,8 @@ class SchoolViewSet(viewsets.ModelViewSet):
     serializer_class = SchoolSerializer
     filterset_class = SchoolFilter
 
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
-
-    search_fields = [
-        "name",
-        "adm_code",
-        "head_name",
-        "village",
-    ]
+    # Recherche servie par l'index plein texte (voir search.py)
+    filter_backends = [DjangoFilterBackend, SchoolSearchFilter, OrderingFilter]
 
     ordering_fields = [
         "name",
@@ -105,46 +407,90 @@ class SchoolSyncViewSet(viewsets.ReadOnlyModelViewSet):
 
 class RecolteViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
+    # Création ou validation : réponses typées, compteurs de campagne, versions des statistiques et cube
+    query_budget = 16
     queryset = Recolte.objects.all()
     serializer_class = RecolteSerializer
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
     filterset_fields = ["type", "status", "establishment"]
     search_fields = ["collector_name", "establishment__name"]
     ordering_fields = ["date", "created_at"]
+    keyset_ordering = ("-date", "-id")
+
+    def create(self, request, *args, **kwargs):
+        return idempotent(request, lambda: self._create_once(request, *args, **kwargs))
+
+    def _create_once(self, request, *args, **kwargs):
+        # Un renvoi avec un identifiant déjà enregistré renvoie la récolte existante
+        recolte_id = request.data.get('id') if isinstance(request.data, dict) else None
+        existing = self._existing(recolte_id)
+        if existing is not None:
+            return Response(self.get_serializer(existing).data, status=200)
+        try:
+            with transaction.atomic():
+                return super().create(request, *args, **kwargs)
+        except IntegrityError:
+            # Même identifiant inséré entre-temps par un envoi concurrent
+            existing = self._existing(recolte_id)
+            if existing is None:
+                raise
+            return Response(self.get_serializer(existing).data, status=200)
+
+    def _existing(self, recolte_id):
+        if not recolte_id:
+            return None
+        try:
+            return Recolte.objects.filter(pk=uuid.UUID(str(recolte_id))).first()
+        except ValueError:
+            return None
 
 
 class CampaignViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
-    queryset = Campaign.objects.prefetch_related("question_templates", "recoltes").all()
+    # 5 requêtes compteurs en place, 10 quand des compteurs manquent (ensure_campaigns_stats)
+    # et que les noms de provinces ne sont pas en cache
+    query_budget = 10
+    queryset = Campaign.objects.select_related("stats").all()
     serializer_class = CampaignSerializer
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
     search_fields = ["name"]
     ordering_fields = ["start_date", "end_date", "name", "created_at"]
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if is_expanded({'view': self, 'request': self.request}, 'question_templates'):
+            return queryset.prefetch_related("question_templates__questions__groupe")
+        return queryset.prefetch_related(Prefetch(
+            "question_templates",
+            queryset=QuestionTemplate.objects.annotate(nb_questions=Count("questions")),
+        ))
 
-@login_required(login_url='users/login/')
-def recolte_detail(request, pk):
-    recolte = get_object_or_404(Recolte, pk=pk)
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        # Compteurs jamais calculés : reconstruits en lot plutôt qu'une fois par campagne
+        ensure_campaigns_stats(page if page is not None else queryset)
+        return page
 
-    # Préparer les paires question -> réponse
-    answers = recolte.answers or []
-    qa_list = []
 
-    # Les réponses sont stockées comme une liste de dictionnaires
-    if isinstance(answers, list):
-        for item in answers:
-            if isinstance(item, dict):
-                qid = item.get('question_uuid', '')
-                answer = item.get('answer', '')
-                try:
-                    q = Question.objects.get(pk=qid)
-                    q_text = q.text
-                except Exception:
-                    q_text = f"Question {qid}"
-                qa_list.append({
-                    'question': q_text,
-                    'answer': answer
-                })
+@query_budget(6)
+@login_required(login_url='users/login/')
+def recolte_detail(request, pk):
+    recolte = get_object_or_404(
+        Recolte.objects.select_related(
+            'establishment__province', 'establishment__division', 'establishment__city',
+            'establishment__territory', 'campaign'
+        ),
+        pk=pk
+    )
+
+    # Préparer les paires question -> réponse (questions résolues en lot)
+    qa_list = [
+        {
+            'question': item['question'].text if item['question'] else f"Question {item['question_uuid']}",
+            'answer': item['answer'],
+        }
+        for item in resolve_answers(recolte)
+    ]
 
     return render(request, 'recolte_detail.html', {
         'recolte': recolte,
@@ -152,36 +498,154 @@ def recolte_detail(request, pk):
     })
 
 # Create your views here.
+@query_budget(6)
 @login_required(login_url='users/login/')
 def home(request):
-    divisions = Division.objects.all()
-    nbr_divisions = len(divisions)
-    nbr_users = len(User.objects.all())
-    nbr_recolte =  len(Recolte.objects.all())
-    nbr_school = len(School.objects.all())
-    context = {
-        'divisions': divisions,
-        'nbr_divisions': nbr_divisions,
-        'nbr_users': nbr_users,
-        'nbr_recolte': nbr_recolte,
-        'nbr_school': nbr_school
-    }
-    return render(request, 'home.html', context)
+    # compteurs et ventilations par agrégats SQL, en cache quelques secondes
+    return render(request, 'home.html', dashboard_stats())
 
-def get_paginated_queryset(request, queryset, count=10):
+def get_paginated_queryset(request, queryset, count=10, cursor=False):
+    """Page courante de `queryset`.
+
+    Avec cursor=True, la page est lue par curseur (?cursor=) sur le tri de la
+    requête : ni COUNT(*) ni OFFSET, pour les grandes tables.
+    """
+    if cursor:
+        try:
+            return keyset_page(queryset, request.GET.get('cursor'), page_size=count)
+        except InvalidCursor:
+            return keyset_page(queryset, page_size=count)
     paginator = Paginator(queryset, count)
     page_number = request.GET.get('page')
     return paginator.get_page(page_number)
 
 @login_required(login_url='users/login/')
 def school_map(request):
-    schools = School.objects.filter(geo_coord__isnull=False)
-    return render(request, 'school_map.html', {'schools': schools})
+    # les écoles sont chargées par la carte via l'API school_geo, selon la zone affichée
+    return render(request, 'school_map.html')
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def school_geo(request):
+    """GeoJSON des écoles de la bbox (ouest,sud,est,nord), regroupées selon le zoom."""
+    try:
+        bbox = parse_bbox(request.query_params.get('bbox', '-180,-90,180,90'))
+        zoom = int(request.query_params.get('zoom', 5))
+    except ValueError:
+        return Response({"error": "Paramètre bbox ou zoom invalide."}, status=400)
+    return Response(clustered_features(School.objects.all(), bbox, zoom))
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def autocomplete_api(request, entity):
+    """Suggestions pour une entité (province, division, sub_division, city, territory, school)."""
+    if entity not in AUTOCOMPLETE_ENTITIES:
+        return Response({"error": f"Entité inconnue : {entity}."}, status=404)
+    try:
+        parent = request.query_params.get('parent')
+        parent = int(parent) if parent else None
+        limit = int(request.query_params.get('limit', AUTOCOMPLETE_LIMIT))
+    except ValueError:
+        return Response({"error": "Paramètres parent ou limit invalides."}, status=400)
+
+    entries = autocomplete(entity, request.query_params.get('q', ''), parent=parent, limit=limit)
+    return Response({"results": [
+        {"id": e.id, "label": e.label, "code": e.code, "parent": e.parent} for e in entries
+    ]})
+
+NEARBY_DEFAULT_RADIUS_KM = 10
+NEARBY_MAX_RADIUS_KM = 200
+NEARBY_MAX_RESULTS = 100
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def question_stats_api(request, question_id):
+    """Agrégats des réponses validées d'une question, au total et par niveau.
+
+    Questions nombre : count, sum, mean, min, max et percentiles ; questions
+    à choix : répondants et fréquence de chaque option. Paramètres : group_by
+    (province, division, sub_division, environment, management_regime) et
+    campaign (uuid).
+    """
+    question = get_object_or_404(Question, pk=question_id)
+    if question.kind not in ('number', 'choice'):
+        return Response({"error": "Statistiques disponibles pour les questions nombre ou choix uniquement."}, status=400)
+    group_by = request.query_params.get('group_by') or None
+    if group_by and group_by not in QUESTION_STATS_GROUPS:
+        return Response({"error": f"group_by inconnu : {group_by}."}, status=400)
+    campaign = None
+    if request.query_params.get('campaign'):
+        try:
+            campaign = Campaign.objects.get(pk=uuid.UUID(request.query_params['campaign']))
+        except (ValueError, Campaign.DoesNotExist):
+            return Response({"error": "Campagne introuvable."}, status=400)
+    return Response(question_stats(question, campaign, group_by))
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def campaign_cube_api(request, pk):
+    """Indicateurs d'une campagne lus dans le cube pré-agrégé, en cumul ou en détail.
+
+    Paramètres : group_by (dimensions séparées par des virgules parmi province,
+    division, management_regime, environment, level), question (uuid d'une
+    question nombre ; absent : nombre de récoltes validées) et un filtre par
+    dimension (valeurs séparées par des virgules), ex. province=3&group_by=division.
+    """
+    campaign = get_object_or_404(Campaign, pk=pk)
+    if not cube_built(campaign.pk):
+        return Response({"error": "Cube non construit pour cette campagne (commande build_cube)."}, status=404)
+    params = request.query_params
+    group_by = [d for d in params.get('group_by', '').split(',') if d]
+    unknown = [d for d in group_by if d not in CUBE_DIMENSIONS]
+    if unknown or len(set(group_by)) != len(group_by):
+        return Response({"error": f"group_by invalide : {params.get('group_by')}."}, status=400)
+    filters = {}
+    for dimension in CUBE_DIMENSIONS:
+        if params.get(dimension):
+            values = params[dimension].split(',')
+            if dimension in ('province', 'division'):
+                if not all(v.isdigit() for v in values):
+                    return Response({"error": f"Filtre {dimension} invalide."}, status=400)
+                values = [int(v) for v in values]
+            filters[dimension] = values
+    question = None
+    if params.get('question'):
+        try:
+            question = Question.objects.get(pk=uuid.UUID(params['question']))
+        except (ValueError, Question.DoesNotExist):
+            return Response({"error": "Question introuvable."}, status=400)
+        if question.kind != 'number':
+            return Response({"error": "Le cube ne porte que sur les questions nombre."}, status=400)
+    return Response(query_cube(campaign, question, group_by, filters))
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def school_nearby(request):
+    """Écoles les plus proches de (lat, lon) dans un rayon en km, triées par distance."""
+    try:
+        lat = float(request.query_params['lat'])
+        lon = float(request.query_params['lon'])
+        radius = float(request.query_params.get('radius', NEARBY_DEFAULT_RADIUS_KM))
+        limit = int(request.query_params.get('limit', 20))
+    except (KeyError, ValueError):
+        return Response({"error": "Paramètres lat, lon, radius ou limit invalides."}, status=400)
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180) or radius <= 0:
+        return Response({"error": "Paramètres lat, lon, radius ou limit invalides."}, status=400)
+    radius = min(radius, NEARBY_MAX_RADIUS_KM)
+    limit = max(1, min(limit, NEARBY_MAX_RESULTS))
+
+    schools = nearest_schools(
+        School.objects.select_related("province", "division", "sub_division"), lat, lon, radius, limit
+    )
+    data = SchoolSerializer(schools, many=True, context={'request': request}).data
+    for item, school in zip(data, schools):
+        item['distance_km'] = school.distance_km
+    return Response({"results": data})
 
 @login_required(login_url='users/login/')
 def school_list(request):
     schools_qs = School.objects.all().order_by('-created_at')
-    schools = get_paginated_queryset(request, schools_qs)
+    schools = get_paginated_queryset(request, schools_qs, cursor=True)
     return render(request, 'school_list.html', {'schools': schools})
 
 @login_required(login_url='users/login/')
@@ -229,19 +693,9 @@ def school_edit(request, pk):
         messages.success(request, "École mise à jour avec succès.")
         return redirect('school_list')
 
-    provinces = Province.objects.all()
-    divisions = Division.objects.all()
-    sub_divisions = SubDivision.objects.all()
-    cities = City.objects.all()
-    territories = Territory.objects.all()
-
+    # Les listes des entités administratives sont chargées par le formulaire (api/autocomplete)
     context = {
         'school': school,
-        'provinces': provinces,
-        'divisions': divisions,
-        'sub_divisions': sub_divisions,
-        'cities': cities,
-        'territories': territories,
         'management_choices': School.MANAGEMENT_CHOICES,
         'mechanized_choices': School.MECHANIZED_CHOICES,
         'ownership_choices': School.OWNERSHIP_CHOICES,
@@ -303,18 +757,8 @@ def school_form(request):
         messages.success(request, "École ajoutée avec succès.")
         return redirect('school_list')
 
-    provinces = Province.objects.all()
-    divisions = Division.objects.all()
-    sub_divisions = SubDivision.objects.all()
-    cities = City.objects.all()
-    territories = Territory.objects.all()
-
+    # Les listes des entités administratives sont chargées par le formulaire (api/autocomplete)
     context = {
-        'provinces': provinces,
-        'divisions': divisions,
-        'sub_divisions': sub_divisions,
-        'cities': cities,
-        'territories': territories,
         'management_choices': School.MANAGEMENT_CHOICES,
         'mechanized_choices': School.MECHANIZED_CHOICES,
         'ownership_choices': School.OWNERSHIP_CHOICES,
@@ -656,57 +1100,88 @@ def groupe_delete(request, pk):
     return render(request, 'groupe_confirm_delete.html', {'groupe': groupe})
 
 
+# École, province, division et collecteur de chaque ligne lus avec la page
+LIST_RELATED = ('establishment__province', 'establishment__division', 'collector_id')
+
+
+@query_budget(8)
 @login_required(login_url='users/login/')
 def rapport_list(request):
     """Liste des rapports (fiches de récolte validées)."""
-    qs = Recolte.objects.filter(status='valide').order_by('-date')
-    rapports = get_paginated_queryset(request, qs)
-    return render(request, 'rapport_list.html', {'recoltes': rapports, 'title': 'Rapports'})
+    qs = Recolte.objects.filter(status='valide').select_related(*LIST_RELATED).order_by('-date')
+    rapports = get_paginated_queryset(request, qs, cursor=True)
+    campaigns = Campaign.objects.order_by('-start_date')
+    return render(request, 'rapport_list.html', {'recoltes': rapports, 'campaigns': campaigns, 'title': 'Rapports'})
+
 
+# Au-delà, les fiches passent par le travail fiches_pdf (hors requête web)
+PDF_BATCH_MAX_FICHES = 200
 
+
+@login_required(login_url='users/login/')
+def rapport_pdf_batch(request):
+    """Archive ZIP des fiches PDF validées, filtrées par campagne et/ou division.
+
+    Les fiches sont rendues dans le processus web, sans pool, et l'archive
+    est envoyée au fil de l'eau. Au-delà de PDF_BATCH_MAX_FICHES fiches, le
+    personnel obtient un travail fiches_pdf en file ; les autres utilisateurs
+    doivent restreindre les filtres.
+    """
+    try:
+        campaign, division = parse_fiche_filters(request.GET)
+    except ValueError as exc:
+        messages.error(request, str(exc))
+        return redirect('rapport_list')
+
+    queryset = fiche_queryset(campaign, division)
+    count = queryset.count()
+    if count > PDF_BATCH_MAX_FICHES:
+        if not request.user.is_staff:
+            messages.error(request, f"{count} fiches : choisissez une campagne ou une division "
+                                    f"(au plus {PDF_BATCH_MAX_FICHES} fiches).")
+            return redirect('rapport_list')
+        job = enqueue('fiches_pdf', {'campaign': campaign.pk if campaign else None,
+                                     'division': division.pk if division else None}, user=request.user)
+        messages.success(request, f"{count} fiches : l'archive est préparée par le travail {job.pk} "
+                                  f"({reverse('job_detail', args=[job.pk])}).")
+        return redirect('rapport_list')
+
+    response = StreamingHttpResponse(
+        stream_zip(render_fiches(iter_fiches(queryset))),
+        content_type='application/zip',
+    )
+    response['Content-Disposition'] = f'attachment; filename="{fiches_filename(campaign, division)}"'
+    return response
+
+
+@query_budget(6)
 @login_required(login_url='users/login/')
 def rapport_detail(request, pk):
     """Affiche la fiche de récolte formatée via model.html."""
-    recolte = get_object_or_404(Recolte, pk=pk, status='valide')
+    recolte = get_object_or_404(
+        Recolte.objects.select_related('establishment__province', 'establishment__city', 'establishment__territory', 'campaign'),
+        pk=pk, status='valide'
+    )
     rapport = recolte.answers or []
-    answer_dict = {item.get('question_uuid', item.get('question', '')): item.get('answer', '') for item in rapport if isinstance(item, dict)}
 
     # extra lists that model.html iterates over
     themes = []
     effectifs = []
 
-    # build question groups from answers and Question model
-    groups_dict = {}
-    for item in rapport:
-        if not isinstance(item, dict):
-            continue
-        qid = item.get('question_uuid', item.get('question', ''))
-        ans = item.get('answer', '')
-        try:
-            q = Question.objects.get(pk=qid)
-        except Exception:
-            continue
-        grp = q.groupe  # may be None
-        key = grp.id if grp else 'nogroup'
-        if key not in groups_dict:
-            groups_dict[key] = {'group': grp, 'qa': []}
-        groups_dict[key]['qa'].append({'question': q.text, 'answer': ans})
-    # convert to list preserving order (group.order or None at end)
-    questions = Question.objects.filter(template__in=recolte.campaign.question_templates.all())
-    groups_with_questions = set(q.groupe for q in questions if q.groupe)
-    groups_list = sorted([grp for grp in groups_with_questions], key=lambda g: g.order)
+    # questions de la campagne (en cache par version de questionnaire) jointes aux réponses
+    items = answer_items(recolte)
+    question_map = recolte_question_map(recolte, items)
+    sections = report_sections(question_map, items)
 
     return render(request, 'model.html', {
         'rapport': rapport,
         'recolte': recolte,
         'themes': themes,
         'effectifs': effectifs,
-        'groups_list': groups_list,
-        'questions': questions,
-        'answers_list': rapport
-
+        'sections': sections,
     })
 
+@query_budget(8)
 @login_required(login_url='users/login/')
 def campaign_list(request):
     if request.method == 'POST':
@@ -729,7 +1204,7 @@ def campaign_list(request):
         messages.success(request, "Campagne créée avec succès.")
         return redirect('campaign_list')
 
-    campaigns_qs = Campaign.objects.all().order_by('-start_date')
+    campaigns_qs = Campaign.objects.prefetch_related('question_templates').order_by('-start_date')
     campaigns = get_paginated_queryset(request, campaigns_qs)
     templates = QuestionTemplate.objects.all()
     return render(request, 'campaign_list.html', {
@@ -737,10 +1212,35 @@ def campaign_list(request):
         'templates': templates
     })
 
+@login_required(login_url='users/login/')
+@staff_required
+def perf_dashboard(request):
+    """Mesures par vue collectées par ProfilingMiddleware (processus courant)."""
+    if request.method == 'POST':
+        perf_reset()
+        messages.success(request, "Mesures réinitialisées.")
+        return redirect('perf_dashboard')
+    return render(request, 'perf.html', {
+        'stats': perf_snapshot(),
+        'enabled': getattr(settings, 'GUGE_PROFILING', False),
+    })
+
+def perf_metrics(request):
+    """Mesures au format Prometheus : session staff ou jeton GUGE_METRICS_TOKEN."""
+    token = getattr(settings, 'GUGE_METRICS_TOKEN', None)
+    authorization = request.headers.get('Authorization', '')
+    authorized = request.user.is_authenticated and request.user.is_staff
+    if not authorized and token and authorization.startswith('Bearer '):
+        authorized = constant_time_compare(authorization[len('Bearer '):], token)
+    if not authorized:
+        return HttpResponse(status=403)
+    return HttpResponse(prometheus_text(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @login_required(login_url='users/login/')
 def campaign_detail(request, pk):
     campaign = get_object_or_404(Campaign, pk=pk)
-    return render(request, 'campaign_detail.html', {'campaign': campaign})
+    stats = campaign_stats_summary(campaign_stats(campaign))
+    return render(request, 'campaign_detail.html', {'campaign': campaign, 'stats': stats})
 
 @login_required(login_url='users/login/')
 def campaign_edit(request, pk):
@@ -850,11 +1350,12 @@ def recolte_answer(request, pk):
     })
 
 
+@query_budget(8)
 @login_required(login_url='users/login/')
 def recolte_list(request, type_recolte):
     # type_recolte sera 'pre-scolaire', 'primaire' ou 'secondaire'
-    recoltes_qs = Recolte.objects.filter(type=type_recolte).order_by('-date')
-    recoltes = get_paginated_queryset(request, recoltes_qs)
+    recoltes_qs = Recolte.objects.filter(type=type_recolte).select_related(*LIST_RELATED).order_by('-date')
+    recoltes = get_paginated_queryset(request, recoltes_qs, cursor=True)
     
     context = {
         'recoltes': recoltes,